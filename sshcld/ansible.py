@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""Ansible dynamic inventory (--list and --host output) built from the list of instances"""
+
+import re
+
+DEFAULT_ANSIBLE_HOST_PROPERTY = 'private_ip_address'
+HOST_VARIABLES_PREFIX = 'sshcld_'
+
+
+def get_group_name(*parts):
+    """Get Ansible group name (only letters, digits and underscores are allowed)"""
+
+    return re.sub(r'\W', '_', '_'.join(str(part) for part in parts))
+
+
+def get_host_variables(instance=None, host_property=DEFAULT_ANSIBLE_HOST_PROPERTY):
+    """Get variables of one host: ansible_host and all instance properties with sshcld_ prefix"""
+
+    host_variables = {f'{HOST_VARIABLES_PREFIX}{key}': value for key, value in instance.items()}
+
+    address = instance.get(host_property) or instance.get('public_ip_address') or instance.get('private_ip_address')
+    if address:
+        host_variables['ansible_host'] = address
+
+    return host_variables
+
+
+def build_inventory(instances=None, printable_tags=None, host_property=DEFAULT_ANSIBLE_HOST_PROPERTY):
+    """Build inventory for "--list": groups by region, state and printable tags, and hostvars of all hosts
+
+    Hosts are named by instance ID, so hosts with the same name don't override each other.
+    """
+
+    groups = {}
+    hostvars = {}
+
+    for instance in instances or []:
+        host = instance['instance_id']
+        hostvars[host] = get_host_variables(instance=instance, host_property=host_property)
+
+        group_names = [get_group_name('region', instance.get('region')),
+                       get_group_name('state', instance.get('instance_state'))]
+        for tag in printable_tags or []:
+            tag_value = (instance.get('tags') or {}).get(tag)
+            if tag_value:
+                group_names.append(get_group_name('tag', tag, tag_value))
+
+        for group_name in group_names:
+            groups.setdefault(group_name, []).append(host)
+
+    inventory = {group_name: {'hosts': hosts} for group_name, hosts in sorted(groups.items())}
+    inventory['all'] = {'children': sorted(groups)}
+    inventory['_meta'] = {'hostvars': hostvars}
+
+    return inventory
+
+
+def get_host(instances=None, host=None, host_property=DEFAULT_ANSIBLE_HOST_PROPERTY):
+    """Get variables of the host for "--host" (empty dictionary if the host is not found)"""
+
+    for instance in instances or []:
+        if instance['instance_id'] == host:
+            return get_host_variables(instance=instance, host_property=host_property)
+
+    return {}
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""Selection of the fastest jump host (bastion) for SSH connections"""
+
+import os
+
+from sshcld import cache
+from sshcld import probe
+from sshcld.errors import ConfigurationError
+
+DEFAULT_PROXY_JUMP_CACHE_TTL = 300
+DEFAULT_JUMP_HOST_PORT = 22
+
+
+def parse_jump_host(jump_host=None):
+    """Get address and port from jump host in [user@]host[:port] format. Raises ConfigurationError if it's invalid"""
+
+    address = str(jump_host).rsplit('@', 1)[-1]
+    port = DEFAULT_JUMP_HOST_PORT
+
+    try:
+        if address.startswith('['):
+            address, _, port_part = address[1:].partition(']')
+            if port_part.startswith(':'):
+                port = int(port_part[1:])
+        elif address.count(':') == 1:
+            address, port_part = address.split(':')
+            port = int(port_part)
+    except ValueError as error:
+        raise ConfigurationError(f'Invalid jump host in proxy_jump_hosts: {jump_host}') from error
+
+    if not address or not 0 < port < 65536:
+        raise ConfigurationError(f'Invalid jump host in proxy_jump_hosts: {jump_host}')
+
+    return address, port
+
+
+def group_matches_instance(group=None, instance=None):
+    """Check if region and tags of jump hosts group match the instance"""
+
+    regions = group.get('region')
+    if regions is not None:
+        if isinstance(regions, str):
+            regions = [region.strip() for region in regions.split(',')]
+        if instance.get('region') not in regions:
+            return False
+
+    tags = instance.get('tags') or {}
+    return all(tags.get(tag) == str(value) for tag, value in (group.get('tags') or {}).items())
+
+
+def get_candidates(instance=None, app_config=None):
+    """Get candidate jump hosts of the first group matching the instance"""
+
+    for group in app_config.get('proxy_jump_hosts') or []:
+        if group_matches_instance(group=group, instance=instance):
+            return list(group.get('hosts') or [])
+
+    return []
+
+
+def measure_jump_hosts(jump_hosts=None, app_config=None):
+    """Get connection latency of jump hosts (None if not reachable)
+
+    Only hosts without fresh cached measurement are checked, concurrently.
+    """
+
+    latency_cache = cache.LatencyCache(path=os.path.join(cache.get_cache_dir(app_config), 'bastions.json'),
+                                       ttl=app_config.get('proxy_jump_cache_ttl', DEFAULT_PROXY_JUMP_CACHE_TTL))
+
+    jump_hosts_latencies = {}
+    stale_jump_hosts = {}
+    for jump_host in set(jump_hosts):
+        measurement = latency_cache.get(host=jump_host)
+        if measurement is None:
+            stale_jump_hosts[jump_host] = parse_jump_host(jump_host)
+        else:
+            jump_hosts_latencies[jump_host] = measurement['latency']
+
+    if stale_jump_hosts:
+        latencies = probe.probe_endpoints(
+            endpoints=stale_jump_hosts.values(),
+            timeout=float(app_config.get('probe_timeout', probe.DEFAULT_PROBE_TIMEOUT)),
+            concurrency=int(app_config.get('probe_concurrency', probe.DEFAULT_PROBE_CONCURRENCY)))
+        for jump_host, endpoint in stale_jump_hosts.items():
+            jump_hosts_latencies[jump_host] = latencies.get(endpoint)
+            latency_cache.update(host=jump_host, latency=latencies.get(endpoint))
+        latency_cache.save()
+
+    return jump_hosts_latencies
+
+
+def select_jump_host(candidates=None, latencies=None):
+    """Get the fastest reachable jump host or None if none of them is reachable"""
+
+    reachable_candidates = [jump_host for jump_host in candidates if latencies.get(jump_host) is not None]
+    if not reachable_candidates:
+        return None
+
+    return min(reachable_candidates, key=lambda jump_host: latencies[jump_host])
+
+
+def add_proxy_jumps(instances=None, app_config=None):
+    """Add proxy_jump property with the fastest reachable jump host to each instance
+
+    Raises ConfigurationError if no jump host can be used for any of instances, so SSH never silently connects
+    directly to the cloud server instead of going through the jump host.
+    """
+
+    instances_candidates = [get_candidates(instance=instance, app_config=app_config) for instance in instances]
+    latencies = measure_jump_hosts(jump_hosts=[jump_host for candidates in instances_candidates
+                                               for jump_host in candidates], app_config=app_config)
+
+    for instance, candidates in zip(instances, instances_candidates):
+        if not candidates:
+            raise ConfigurationError(f'No group of proxy_jump_hosts matches cloud server {instance.get("instance_id")} '
+                                     f'in {instance.get("region")}')
+        instance['proxy_jump'] = select_jump_host(candidates=candidates, latencies=latencies)
+        if instance['proxy_jump'] is None:
+            raise ConfigurationError(f'None of jump hosts of cloud server {instance.get("instance_id")} is reachable: '
+                                     f'{", ".join(candidates)}')
+
+    return instances
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""Batch of named queries evaluated locally over one shared fetch of cloud servers"""
+
+import re
+
+from sshcld import cache
+
+
+def parse_query(text=None):
+    """Parse "NAME:FILTERS" query definition. Raises ValueError if the name is missing"""
+
+    name, separator, filters = str(text).partition(':')
+    if not separator or not name.strip():
+        raise ValueError(f'query should be defined as NAME:FILTERS, e.g. web:application=nginx ({text})')
+
+    return name.strip(), filters.strip() or None
+
+
+def parse_conditions(filters=None):
+    """Parse filters string (the same syntax as "-f") into list of (tag, value) conditions
+
+    Malformed filters give empty list (all cloud servers), the same way as cloud API filters are parsed.
+    """
+
+    if not isinstance(filters, str) or not filters.strip():
+        return []
+
+    conditions = []
+    for condition in filters.strip().split(','):
+        try:
+            tag, value = condition.strip().split('=')
+        except ValueError:
+            return []
+        conditions.append((tag, value))
+
+    return conditions
+
+
+def is_batch_supported(filters=None):
+    """Check if query can be evaluated locally (tag filters only, not server IDs or IP addresses in any condition)"""
+
+    conditions_keys = [condition.split('=')[0].strip() for condition in str(filters or '').split(',')]
+
+    return not any(key in ('FILTER_INSTANCE_ID', 'FILTER_IP_ADDRESS') for key in conditions_keys)
+
+
+def check_queries(queries=None, output_names=False):
+    """Check that all queries can be evaluated in batch. Raises ValueError describing the first invalid query
+
+    Filters of each query should be a string (or None for all cloud servers). If output_names is enabled,
+    names should stay unique after converting them to file names.
+    """
+
+    file_names = {}
+    for name, filters in queries.items():
+        if filters is not None and not isinstance(filters, str):
+            raise ValueError(f'filters of query {name} should be a string, e.g. environment=production')
+        if not is_batch_supported(filters=filters):
+            raise ValueError(f'queries by server ID or IP address are not supported in batch ({name})')
+
+        if output_names:
+            file_name = cache.get_safe_name(name)
+            if file_name in file_names:
+                raise ValueError(f'queries {file_names[file_name]} and {name} have the same output file name')
+            file_names[file_name] = name
+
+
+def value_matches(pattern=None, value=None):
+    """Check if tag value matches filter value with cloud API wildcards ("*" and "?")"""
+
+    if value is None:
+        return False
+
+    regex = re.escape(pattern).replace(r'\*', '.*').replace(r'\?', '.')
+
+    return re.fullmatch(regex, value, flags=re.DOTALL) is not None
+
+
+def instance_matches(instance=None, conditions=None):
+    """Check if cloud server matches all conditions"""
+
+    tags = instance.get('tags') or {}
+
+    return all(value_matches(pattern=value, value=tags.get(tag)) for tag, value in conditions)
+
+
+def get_union_filters(queries=None):
+    """Get filters matching cloud servers of any query: tags used in every query with all their values
+
+    Returns dictionary tag -> list of values (cloud API filters with several values match any of them) or None
+    if some query has no conditions, so all cloud servers should be requested.
+    """
+
+    queries_conditions = [parse_conditions(filters=filters) for filters in queries]
+    if not queries_conditions or not all(queries_conditions):
+        return None
+
+    common_tags = set.intersection(*({tag for tag, _ in conditions} for conditions in queries_conditions))
+    union_filters = {}
+    for conditions in queries_conditions:
+        for tag, value in conditions:
+            if tag in common_tags and value not in union_filters.setdefault(tag, []):
+                union_filters[tag].append(value)
+
+    return union_filters or None
+
+
+def split_instances(instances=None, queries=None):
+    """Evaluate queries locally. Returns dictionary query name -> list of matching cloud servers
+
+    Each query gets its own copy of the records, so they can be enriched separately.
+    """
+
+    queries_conditions = {name: parse_conditions(filters=filters) for name, filters in queries.items()}
+    results = {name: [] for name in queries}
+
+    for instance in instances:
+        for name, conditions in queries_conditions.items():
+            if instance_matches(instance=instance, conditions=conditions):
+                results[name].append({**instance, 'tags': dict(instance.get('tags') or {})})
+
+    return results
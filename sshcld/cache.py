@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+
+"""Local cache directory shared by sshcld features"""
+
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import time
+
+import botocore.utils
+
+
+def get_cache_dir(app_config=None):
+    """Get (and create if needed) directory for sshcld cache files"""
+
+    cache_dir = None
+    if app_config is not None:
+        cache_dir = app_config.get('cache_dir')
+
+    if not cache_dir:
+        cache_dir = os.path.join(Path.home(), '.cache', 'sshcld')
+
+    cache_dir = os.path.expanduser(cache_dir)
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+
+    return cache_dir
+
+
+def get_query_key(app_config=None, filters=None, options=None):
+    """Get short stable key identifying the inventory query (cloud, profile, region and filters)
+
+    Values of configuration options listed in options are added to the key too.
+    """
+
+    if app_config is None:
+        app_config = {}
+
+    if filters is None:
+        filters = app_config.get('filters')
+
+    query = [app_config.get('default_cloud'), app_config.get('cloud_profile'), app_config.get('cloud_region'),
+             filters]
+    if options:
+        query.append([app_config.get(option) for option in options])
+
+    return hashlib.sha1(json.dumps(query).encode('utf-8')).hexdigest()[:16]
+
+
+def write_file_atomically(path=None, content=b'', mode=0o600):
+    """Write file content so concurrent readers never see partially written file
+
+    The file is readable only by the current user unless other mode is specified.
+    """
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    file_descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(file_descriptor, 'wb') as temp_file:
+        temp_file.write(content)
+    os.replace(temp_path, path)
+
+
+def get_safe_name(name=None):
+    """Replace characters that cannot be used in file names"""
+
+    return re.sub(r'[^\w.-]', '_', str(name))
+
+
+class JsonFileCache:
+    """Dictionary stored in a JSON file, loaded on first use and saved only if changed"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.data = None
+        self.changed = False
+
+    def load(self):
+        """Load cache from file (once)"""
+
+        if self.data is not None:
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as cache_file:
+                self.data = json.load(cache_file)
+        except (OSError, ValueError):
+            self.data = {}
+
+        if not isinstance(self.data, dict):
+            self.data = {}
+
+    def save(self):
+        """Save cache to file if it was changed"""
+
+        if not self.changed:
+            return
+
+        try:
+            write_file_atomically(path=self.path, content=json.dumps(self.data).encode('utf-8'))
+            self.changed = False
+        except OSError:
+            pass
+
+
+class LocationCache(JsonFileCache):
+    """Last known location (cloud profile and region) of cloud servers
+
+    The last seen instance record is stored too, so recently seen instances can be returned without API calls.
+    """
+
+    def __init__(self, path=None, ttl=0):
+        super().__init__(path=path)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, instance_id=None, profile_name=None):
+        """Get last known location of the instance"""
+
+        self.load()
+
+        location = self.data.get(f'{profile_name or ""}/{instance_id}')
+        if location is None:
+            self.misses += 1
+
+        return location
+
+    def update(self, instance=None, profile_name=None):
+        """Remember location of the found instance"""
+
+        self.load()
+
+        self.data[f'{profile_name or ""}/{instance["instance_id"]}'] = {
+            'region': instance.get('region'),
+            'seen_at': time.time(),
+            'instance': instance,
+        }
+        self.changed = True
+
+    def is_fresh(self, location=None):
+        """Check if cached instance record is not older than TTL (in seconds)"""
+
+        fresh = bool(self.ttl) and time.time() - location.get('seen_at', 0) < self.ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return fresh
+
+    @staticmethod
+    def get_instance(location=None):
+        """Get copy of cached instance record"""
+
+        instance = dict(location['instance'])
+        instance['tags'] = dict(instance.get('tags') or {})
+
+        return instance
+
+
+class LatencyCache(JsonFileCache):
+    """Last measured connection latency of hosts (None for unreachable hosts)"""
+
+    def __init__(self, path=None, ttl=0):
+        super().__init__(path=path)
+        self.ttl = ttl
+
+    def get(self, host=None):
+        """Get measurement of the host if it's not older than TTL (in seconds)"""
+
+        self.load()
+
+        measurement = self.data.get(host)
+        if not isinstance(measurement, dict) or time.time() - measurement.get('checked_at', 0) >= self.ttl:
+            return None
+
+        return measurement
+
+    def update(self, host=None, latency=None):
+        """Remember latency of the host"""
+
+        self.load()
+
+        self.data[host] = {'latency': latency, 'checked_at': time.time()}
+        self.changed = True
+
+
+# Hits of a region lose half of their weight in a week, so the order follows recent lookups
+REGION_HITS_HALF_LIFE = 7 * 24 * 3600
+
+
+class RegionHitsCache(JsonFileCache):
+    """Decaying number of lookups that found cloud servers in each region (per cloud profile)
+
+    Regions where servers were found recently are requested first, so limited lookups stop earlier.
+    """
+
+    def __init__(self, path=None, half_life=REGION_HITS_HALF_LIFE):
+        super().__init__(path=path)
+        self.half_life = half_life
+
+    def get_score(self, region_hits=None, now=None):
+        """Get number of hits of the region decayed to the current time"""
+
+        if not isinstance(region_hits, dict):
+            return 0
+
+        age = max(0, (now or time.time()) - region_hits.get('hit_at', 0))
+
+        return region_hits.get('score', 0) * 0.5 ** (age / self.half_life)
+
+    def get_hits(self, profile_name=None):
+        """Get region hits dictionary of the profile"""
+
+        self.load()
+
+        hits = self.data.get(profile_name or '')
+
+        return hits if isinstance(hits, dict) else {}
+
+    def order_regions(self, regions=None, profile_name=None):
+        """Sort regions by decayed number of hits (regions without hits keep their original order)"""
+
+        hits = self.get_hits(profile_name=profile_name)
+        now = time.time()
+
+        return sorted(regions, key=lambda region: -self.get_score(region_hits=hits.get(region), now=now))
+
+    def update(self, regions=None, profile_name=None):
+        """Count a hit for each region where cloud servers were found"""
+
+        if not regions:
+            return
+
+        self.load()
+
+        hits = self.data.setdefault(profile_name or '', {})
+        now = time.time()
+        for region in set(regions):
+            hits[region] = {'score': self.get_score(region_hits=hits.get(region), now=now) + 1, 'hit_at': now}
+        self.changed = True
+
+
+class CredentialCache:
+    """Dictionary-like cache of temporary cloud credentials stored in separate files (one per profile and key)
+
+    Files are readable only by the current user and written atomically, so the cache can be shared by concurrent
+    sshcld processes. Expired credentials are never returned.
+    """
+
+    def __init__(self, directory=None, profile_name=None):
+        self.directory = os.path.expanduser(directory)
+        self.profile_name = get_safe_name(profile_name or 'default')
+
+    def get_path(self, key=None):
+        """Get path of the file with cached credentials"""
+
+        return os.path.join(self.directory, f'{self.profile_name}--{get_safe_name(key)}.json')
+
+    @staticmethod
+    def is_expired(value=None):
+        """Check if cached credentials are expired (credentials without expiration are never expired)"""
+
+        try:
+            expiration = value['Credentials']['Expiration']
+        except (KeyError, TypeError):
+            return False
+
+        try:
+            expiration_time = botocore.utils.parse_timestamp(expiration)
+        except (ValueError, TypeError):
+            return True
+
+        if expiration_time.tzinfo is None:
+            expiration_time = expiration_time.replace(tzinfo=timezone.utc)
+
+        return expiration_time <= datetime.now(timezone.utc)
+
+    def __getitem__(self, key):
+        try:
+            with open(self.get_path(key), 'r', encoding='utf-8') as cache_file:
+                value = json.load(cache_file)
+        except (OSError, ValueError) as error:
+            raise KeyError(key) from error
+
+        if self.is_expired(value):
+            raise KeyError(key)
+
+        return value
+
+    def __contains__(self, key):
+        try:
+            self[key]  # pylint: disable=W0104
+        except KeyError:
+            return False
+
+        return True
+
+    def __setitem__(self, key, value):
+        def serialize(item):
+            if isinstance(item, datetime):
+                return item.isoformat()
+            raise TypeError(f'{type(item).__name__} cannot be cached')
+
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        try:
+            write_file_atomically(path=self.get_path(key), content=json.dumps(value, default=serialize).encode('utf-8'))
+        except OSError:
+            pass
+
+    def __delitem__(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except FileNotFoundError as error:
+            raise KeyError(key) from error
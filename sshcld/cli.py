@@ -3,14 +3,40 @@
 """sshcld: get cloud servers list for your SSH client"""
 
 import argparse
+import ipaddress
+import json
 import os
 from pathlib import Path
+import re
+import shlex
+import shutil
 import sys
+import time
 from tabulate import tabulate
 import yaml
 
-from sshcld.plugins import aws
-from sshcld.errors import AwsApiError
+from sshcld.errors import AwsApiError, CloudNotSupportedError, ConfigurationError
+from sshcld import ansible
+from sshcld import batch
+from sshcld import bastion
+from sshcld import cache
+from sshcld import connection
+from sshcld import executor
+from sshcld import inventory
+from sshcld import ipindex
+from sshcld import metrics
+from sshcld import pager
+from sshcld import probe
+from sshcld import resolver
+from sshcld import singleflight
+from sshcld import snapshot
+from sshcld import summary
+from sshcld import watch
+
+# Columns with cloud server properties and computed values, other columns are tag names
+PROPERTY_COLUMNS = frozenset(['change', 'instance_id', 'instance_name', 'instance_state', 'region',
+                              'private_ip_address', 'public_ip_address', 'launch_time', 'reachable', 'latency',
+                              'ssh_string', 'native_client_string'])
 
 
 def open_yaml_file(path=None):
@@ -60,7 +86,7 @@ def load_configs(default_config_path=None, user_config_path=None):
 def replace_variables(string=None, instance=None, app_config=None):
     """Replace variables with real values"""
 
-    variables_to_replace = ['instance_id', 'instance_name', 'private_ip_address', 'public_ip_address']
+    variables_to_replace = ['instance_id', 'instance_name', 'private_ip_address', 'public_ip_address', 'proxy_jump']
     config_variables_to_replace = ['cloud_region', 'cloud_profile']
 
     if string is None or instance is None:
@@ -72,7 +98,7 @@ def replace_variables(string=None, instance=None, app_config=None):
         else:
             string = string.replace(f'%{variable}%', '')
 
-    if instance.get('tags', None):
+    if instance.get('tags', None) and '%tag_' in string:
         for tag in instance['tags']:
             string = string.replace(f'%tag_{tag}%', instance['tags'][tag])
 
@@ -86,10 +112,18 @@ def replace_variables(string=None, instance=None, app_config=None):
     return string
 
 
-def get_cli_args(argv=None):
-    """Get CLI arguments"""
+def positive_int(value=None):
+    """Parse argument which should be a positive integer"""
 
-    arg_parser = argparse.ArgumentParser(description='Get cloud servers list for your SSH client')
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'{value} should be a positive number')
+
+    return number
+
+
+def add_inventory_arguments(arg_parser=None):
+    """Add CLI arguments used for getting cloud servers list (shared by the main command and subcommands)"""
 
     arg_parser.add_argument('-r', '--region', help='One cloud region or comma-separated list. '
                                                    'Use "all" for checking all cloud regions')
@@ -98,14 +132,102 @@ def get_cli_args(argv=None):
     filter_type = arg_parser.add_mutually_exclusive_group()
     filter_type.add_argument('-f', '--filter', help='Filter cloud servers by tags')
     filter_type.add_argument('-n', '--name', help='Filter cloud servers by name')
-    filter_type.add_argument('-i', '--id', help='Filter cloud servers by server ID')
+    filter_type.add_argument('-i', '--id', help='Filter cloud servers by server ID or comma-separated list of IDs. '
+                                                'Use "-" for reading IDs from standard input')
+    filter_type.add_argument('--ip', help='Filter cloud servers by IP address or network (CIDR). '
+                                          'Use comma to separate several addresses')
 
     cloud_group = arg_parser.add_mutually_exclusive_group()
-    cloud_group.add_argument('--aws', action='store_true', default=False, help='Use AWS cloud')
-    cloud_group.add_argument('--azure', action='store_true', default=False, help='Use Azure cloud')  # For future usage
+    cloud_group.add_argument('--aws', action='store_true', help='Use AWS cloud')
+    cloud_group.add_argument('--azure', action='store_true', help='Use Azure cloud')  # For future usage
+
+    arg_parser.add_argument('--ssm', action='store_true', help='Use AWS SSM connection string')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='Always request cloud API instead of using cached inventory')
+
+
+def get_cli_args(argv=None):
+    """Get CLI arguments"""
+
+    arg_parser = argparse.ArgumentParser(description='Get cloud servers list for your SSH client')
+
+    add_inventory_arguments(arg_parser=arg_parser)
 
     arg_parser.add_argument('--ssh', action='store_true', default=False, help='Show SSH connection string')
-    arg_parser.add_argument('--ssm', action='store_true', default=False, help='Show AWS SSM connection string')
+    arg_parser.add_argument('--pager', action='store_true', default=False,
+                            help='Show cloud servers list in the built-in interactive pager')
+
+    arg_parser.add_argument('--columns', help='Comma-separated list of columns to show (properties, tag names, '
+                                              'ssh_string, native_client_string). Other values are not computed')
+    arg_parser.add_argument('--sort', help='Sort cloud servers by property or tag. Use "-" prefix for descending order')
+    arg_parser.add_argument('--limit', type=int, help='Show only first N cloud servers. Without --sort, cloud API '
+                                                      'requests stop as soon as N cloud servers are found')
+    arg_parser.add_argument('--first', action='store_true', default=False,
+                            help='Show only the first found cloud server (the same as --limit 1)')
+    arg_parser.add_argument('--group-by', help='Show number of cloud servers per property or tag (or '
+                                               'comma-separated list of them)')
+    arg_parser.add_argument('--count', action='store_true', default=False, help='Show number of cloud servers only')
+
+    arg_parser.add_argument('--probe', action='store_true', default=False,
+                            help='Check if cloud servers are reachable via TCP and show connection latency')
+    arg_parser.add_argument('--probe-port', type=int, help='TCP port for reachability check (default: 22)')
+
+    arg_parser.add_argument('--watch', type=float, metavar='INTERVAL',
+                            help='Refresh cloud servers list every INTERVAL seconds and redraw only changed rows')
+
+    arg_parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                            help='Time budget for cloud API requests. Regions that did not respond in time are '
+                                 'skipped and shown in the footer')
+
+    arg_parser.add_argument('--metrics', metavar='FILE',
+                            help='Write inventory and cloud API metrics in OpenMetrics format to the file '
+                                 '("-" for standard output) instead of cloud servers list')
+    arg_parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                            help='Serve inventory and cloud API metrics in OpenMetrics format on HTTP port')
+
+    arg_parser.add_argument('--query', action='append', metavar='NAME:FILTERS',
+                            help='Named query with the same filters as -f (can be repeated). All queries are '
+                                 'evaluated over one fetch of cloud servers and shown in separate sections')
+    arg_parser.add_argument('--query-file', metavar='FILE', help='YAML file with named queries (name: filters)')
+    arg_parser.add_argument('--query-output', metavar='DIR',
+                            help='Write result of each query to DIR/<name>.txt instead of standard output')
+
+    arg_parser.add_argument('--dns-port', type=int, metavar='PORT',
+                            help='Serve DNS A and PTR records of cloud servers on local UDP port')
+
+    arg_parser.add_argument('--ansible', action='store_true', default=False,
+                            help='Print Ansible dynamic inventory in JSON instead of cloud servers list')
+    arg_parser.add_argument('--list', action='store_true', default=False,
+                            help='Print all groups and hosts (Ansible dynamic inventory, default for --ansible)')
+    arg_parser.add_argument('--host', help='Print variables of the host (Ansible dynamic inventory)')
+
+    arg_parser.add_argument('--record', help='Save raw cloud API responses to the directory')
+    arg_parser.add_argument('--replay', help='Use cloud API responses saved with --record instead of cloud API')
+
+    arg_parser.add_argument('--diff', action='store_true', default=False,
+                            help='Show only cloud servers changed since the previous snapshot')
+    arg_parser.add_argument('--snapshot', help='Snapshot file path (by default, snapshot is stored in the cache '
+                                               'directory separately for each region, profile and filter)')
+
+    # Arguments of subcommands are not set if they are not defined, so they don't override the main arguments
+    subparsers = arg_parser.add_subparsers(dest='command')
+
+    connect_parser = subparsers.add_parser('connect', argument_default=argparse.SUPPRESS,
+                                           help='Connect to the cloud server found by name or ID')
+    add_inventory_arguments(arg_parser=connect_parser)
+    connect_parser.add_argument('target', nargs='?', help='Cloud server name or ID')
+    connect_parser.add_argument('--print', action='store_true', dest='print_only',
+                                help='Print connection command instead of running it')
+
+    exec_parser = subparsers.add_parser('exec', argument_default=argparse.SUPPRESS,
+                                        help='Run command on all found cloud servers in parallel')
+    add_inventory_arguments(arg_parser=exec_parser)
+    exec_parser.add_argument('--parallel', type=positive_int,
+                             help=f'Maximum number of hosts to run the command on at once (default: '
+                                  f'{executor.DEFAULT_PARALLEL})')
+    exec_parser.add_argument('--timeout', type=float, help='Command timeout for each host in seconds '
+                                                           f'(default: {executor.DEFAULT_TIMEOUT:g})')
+    exec_parser.add_argument('remote_command', nargs=argparse.REMAINDER, help='Command to run (after "--")')
 
     args = vars(arg_parser.parse_args(argv))
 
@@ -138,82 +260,231 @@ def enrich_config(cli_args=None, yaml_config=None):
     yaml_config['aws_ssm_connection_string_enabled'] = (cli_args.get('ssm')
                                                         or yaml_config.get('aws_ssm_connection_string_enabled'))
 
-    if cli_args.get('filter'):
-        yaml_config['filters'] = cli_args.get('filter')
-    elif cli_args.get('name'):
-        yaml_config['filters'] = f'Name={cli_args.get("name")}'
-    elif cli_args.get('id'):
-        yaml_config['filters'] = f'FILTER_INSTANCE_ID={cli_args.get("id")}'
-    elif not yaml_config.get('filters') or yaml_config.get('filters') == '':
-        yaml_config['filters'] = None
+    if cli_args.get('record'):
+        yaml_config['aws_record_dir'] = cli_args.get('record')
+    if cli_args.get('replay'):
+        yaml_config['aws_replay_dir'] = cli_args.get('replay')
+
+    if cli_args.get('probe_port'):
+        yaml_config['probe_port'] = cli_args.get('probe_port')
+
+    if cli_args.get('deadline'):
+        yaml_config['fetch_deadline'] = cli_args.get('deadline')
+
+    columns = cli_args.get('columns') or yaml_config.get('columns')
+    if isinstance(columns, str):
+        yaml_config['columns'] = [column.strip() for column in columns.split(',') if column.strip()]
+
+    yaml_config['filters'] = get_filters(cli_args=cli_args, yaml_config=yaml_config)
 
     return yaml_config
 
 
-def get_cloud_instances(app_config=None):
-    """Get list of cloud servers"""
+def get_filters(cli_args=None, yaml_config=None):
+    """Get filters string from CLI arguments or YAML configuration"""
 
-    if app_config is None:
-        print('Configuration cannot be empty')
-        sys.exit(1)
+    if cli_args.get('filter'):
+        return cli_args.get('filter')
 
-    if app_config.get('default_cloud') == 'aws':
+    if cli_args.get('name'):
+        return f'Name={cli_args.get("name")}'
+
+    if cli_args.get('id') == '-':
+        instance_ids = sys.stdin.read().replace(',', ' ').split()
+        return f'FILTER_INSTANCE_ID={",".join(instance_ids)}'
+
+    if cli_args.get('id'):
+        return f'FILTER_INSTANCE_ID={cli_args.get("id")}'
+
+    if cli_args.get('ip'):
         try:
-            instances_list = aws.get_instances(region_name=app_config.get('cloud_region'),
-                                               filters=app_config.get('filters'),
-                                               profile_name=app_config.get('cloud_profile'))
-        except AwsApiError as error:
-            print(error)
+            ipindex.parse_networks(cli_args.get('ip'))
+        except ValueError as error:
+            print(f'Invalid IP address or network: {error}')
             sys.exit(1)
-    else:
-        print('You specified cloud that is not supported at the moment')
+        return f'FILTER_IP_ADDRESS={cli_args.get("ip")}'
+
+    return yaml_config.get('filters') or None
+
+
+def iter_cloud_instances(app_config=None, session=None, limit=None, statuses=None):
+    """Yield cloud servers one by one
+
+    If statuses dictionary is specified, failed regions are recorded there instead of exiting.
+    """
+
+    try:
+        yield from inventory.iter_instances(config=app_config, session=session, limit=limit, statuses=statuses)
+    except (AwsApiError, ConfigurationError, CloudNotSupportedError) as error:
+        print(error)
         sys.exit(1)
 
+
+def get_cloud_instances(app_config=None, session=None, limit=None, statuses=None):
+    """Get list of cloud servers
+
+    If single_flight_enabled is True, full inventory fetches are coalesced with the same fetches of concurrent
+    sshcld processes (limited lookups and recording of cloud API responses are never coalesced).
+    Shared fetches always record failed regions, so if statuses is not specified (all regions are required),
+    the process exits when any region failed.
+    """
+
+    if limit is not None or not app_config.get('single_flight_enabled') or app_config.get('aws_record_dir'):
+        return list(iter_cloud_instances(app_config=app_config, session=session, limit=limit, statuses=statuses))
+
+    def fetch():
+        fetch_statuses = {}
+        instances = list(iter_cloud_instances(app_config=app_config, session=session, statuses=fetch_statuses))
+        return {'instances': instances, 'statuses': fetch_statuses}
+
+    result = singleflight.run_single_flight(app_config=app_config, fetch=fetch)
+    shared_statuses = result.get('statuses') or {}
+    if statuses is not None:
+        statuses.update(shared_statuses)
+    else:
+        failed_statuses = {region: status for region, status in shared_statuses.items() if status['status'] != 'ok'}
+        for region, status in sorted(failed_statuses.items()):
+            print(f'{region}: {status["message"]}')
+        if failed_statuses:
+            sys.exit(1)
+
+    return result['instances']
+
+
+def get_snapshot_instances(app_config=None, snapshot_path=None, show_diff=False):
+    """Get cloud servers and save them as a new snapshot
+
+    If show_diff is enabled, only instances changed since the previous snapshot are returned.
+    """
+
+    if snapshot_path is None:
+        snapshot_path = snapshot.get_snapshot_path(app_config=app_config)
+
+    current_snapshot = snapshot.build_snapshot(instances=iter_cloud_instances(app_config=app_config))
+
+    if show_diff:
+        previous_snapshot = snapshot.load_snapshot(path=snapshot_path)
+        instances_list = snapshot.diff_snapshots(previous=previous_snapshot, current=current_snapshot)
+    else:
+        instances_list = [instance for _, instance in current_snapshot.values()]
+
+    try:
+        snapshot.save_snapshot(path=snapshot_path, snapshot=current_snapshot)
+        ipindex.save_cached_index(app_config=app_config, snapshot_path=snapshot_path,
+                                  instances=[instance for _, instance in current_snapshot.values()])
+    except OSError as error:
+        print(f'Snapshot cannot be saved ({snapshot_path}): {error}')
+
     return instances_list
 
 
+def get_tag_columns(app_config=None):
+    """Get list of tag columns: printable tags or tags selected with columns parameter"""
+
+    if app_config.get('columns'):
+        return [column for column in app_config['columns'] if column not in PROPERTY_COLUMNS]
+
+    return list(dict.fromkeys(app_config.get('printable_tags') or []))
+
+
+def is_column_displayed(app_config=None, column=None, enabled=True):
+    """Check if column is displayed: it's selected with columns parameter or enabled if columns are not selected"""
+
+    if app_config.get('columns'):
+        return column in app_config['columns']
+
+    return bool(enabled)
+
+
+def add_proxy_jumps(app_config=None, instances=None, templates=None):
+    """Select the fastest jump host for each instance if any of connection string templates uses %proxy_jump%"""
+
+    if any('%proxy_jump%' in template for template in templates if template):
+        try:
+            bastion.add_proxy_jumps(instances=instances, app_config=app_config)
+        except ConfigurationError as error:
+            print(error)
+            sys.exit(1)
+
+
 def enrich_instances_metadata(app_config=None, instances=None):
-    """Add more metadata for each instance"""
+    """Add more metadata for each instance
+
+    Only displayed columns are computed: connection strings are rendered only if their columns are shown, and
+    tags dictionary is replaced with displayed tag columns (list of them is prepared once for all instances).
+    If columns are selected, only they are kept in the specified order.
+    """
 
     if app_config is None:
         print('Configuration cannot be empty')
         sys.exit(1)
 
-    printable_tags = app_config.get('printable_tags', [])
-
     if app_config.get('default_cloud') == 'aws':
         native_client_string_param = 'aws_ssm_connection_string'
     else:
         native_client_string_param = None
 
-    for instance in instances:
-        ssh_string = replace_variables(string=app_config.get('ssh_connection_string', ''), instance=instance,
-                                       app_config=app_config)
-        native_client_string = replace_variables(string=app_config.get(native_client_string_param, ''),
-                                                 instance=instance, app_config=app_config)
-
-        for tag in list(instance['tags'].keys()):
-            if tag not in printable_tags:
-                del instance['tags'][tag]
+    tag_columns = get_tag_columns(app_config=app_config)
+    ssh_string_template = None
+    if is_column_displayed(app_config=app_config, column='ssh_string',
+                           enabled=app_config.get('ssh_connection_string_enabled')):
+        ssh_string_template = app_config.get('ssh_connection_string', '')
+    native_client_string_template = None
+    if is_column_displayed(app_config=app_config, column='native_client_string',
+                           enabled=app_config.get('aws_ssm_connection_string_enabled')):
+        native_client_string_template = app_config.get(native_client_string_param, '')
 
-        for printable_tag in printable_tags:
-            if printable_tag not in instance['tags']:
-                instance['tags'][printable_tag] = ''
+    add_proxy_jumps(app_config=app_config, instances=instances,
+                    templates=[ssh_string_template, native_client_string_template])
 
-        for converted_tag in instance['tags']:
-            instance[converted_tag] = instance['tags'][converted_tag]
-
-        if app_config.get('ssh_connection_string_enabled'):
+    for instance in instances:
+        if ssh_string_template is not None:
+            ssh_string = replace_variables(string=ssh_string_template, instance=instance, app_config=app_config)
+        if native_client_string_template is not None:
+            native_client_string = replace_variables(string=native_client_string_template, instance=instance,
+                                                     app_config=app_config)
+
+        instance.pop('proxy_jump', None)
+        tags = instance.pop('tags', None) or {}
+        for tag in tag_columns:
+            instance[tag] = tags.get(tag, '')
+
+        if ssh_string_template is not None:
             instance['ssh_string'] = ssh_string
 
-        if app_config.get('aws_ssm_connection_string_enabled'):
+        if native_client_string_template is not None:
             instance['native_client_string'] = native_client_string
 
-        del instance['tags']
+    if app_config.get('columns'):
+        return [{column: instance.get(column) for column in app_config['columns']} for instance in instances]
 
     return instances
 
 
+def get_table_headers(app_config=None):
+    """Get table column names"""
+
+    if app_config.get('default_cloud') == 'aws':
+        native_connection_name = 'SSM Connection'
+    else:
+        native_connection_name = 'Native Cloud Connection'
+
+    table_headers = {'change': 'Change', 'instance_id': 'Instance ID', 'instance_name': 'Instance Name',
+                     'instance_state': 'State', 'region': 'Region', 'private_ip_address': 'Private IP',
+                     'public_ip_address': 'Public IP', 'launch_time': 'Launch Time', 'reachable': 'Reachable',
+                     'latency': 'Latency'}
+
+    if is_column_displayed(app_config=app_config, column='ssh_string',
+                           enabled=app_config.get('ssh_connection_string_enabled')):
+        table_headers['ssh_string'] = 'SSH Connection'
+
+    if is_column_displayed(app_config=app_config, column='native_client_string',
+                           enabled=app_config.get('aws_ssm_connection_string_enabled')):
+        table_headers['native_client_string'] = native_connection_name
+
+    return table_headers
+
+
 def generate_table(app_config=None, instances=None):
     """Generate table with list of instances"""
 
@@ -224,23 +495,454 @@ def generate_table(app_config=None, instances=None):
     if instances is None or not instances:
         return 'No servers found matching your filter'
 
-    if app_config.get('default_cloud') == 'aws':
-        native_connection_name = 'SSM Connection'
+    table_headers = get_table_headers(app_config=app_config)
+    table = tabulate(instances, headers=table_headers)
+
+    return table
+
+
+def generate_summary(instances=None, group_by=None):
+    """Generate table with number of instances per group (total number of instances if group_by is empty)"""
+
+    groups = summary.group_instances(instances=instances, group_by=group_by)
+
+    if not groups and group_by:
+        return 'No servers found matching your filter'
+
+    return tabulate(groups or [{'count': 0}], headers='keys')
+
+
+def get_target_filters(target=None):
+    """Get filters string for cloud server name, ID or IP address"""
+
+    if re.fullmatch(r'i-[0-9a-f]{8,17}', target):
+        return f'FILTER_INSTANCE_ID={target}'
+
+    try:
+        ipaddress.ip_address(target)
+    except ValueError:
+        return f'Name={target}'
+
+    return f'FILTER_IP_ADDRESS={target}'
+
+
+def find_single_instance(app_config=None):
+    """Find exactly one cloud server (running one is preferred if several servers match the filter)"""
+
+    instances_list = get_cloud_instances(app_config=app_config)
+
+    if len(instances_list) > 1:
+        running_instances_list = [instance for instance in instances_list if instance['instance_state'] == 'running']
+        if len(running_instances_list) == 1:
+            instances_list = running_instances_list
+
+    if len(instances_list) != 1:
+        enriched_instances_list = enrich_instances_metadata(app_config=app_config, instances=instances_list)
+        print(f'\n{generate_table(app_config=app_config, instances=enriched_instances_list)}\n')
+        if instances_list:
+            print('Several servers found matching your filter. Please specify server ID')
+        sys.exit(1)
+
+    return instances_list[0]
+
+
+def connect_to_instance(cli_args=None, app_config=None):
+    """Connect to one cloud server using SSH (or native cloud) connection string"""
+
+    if cli_args.get('target'):
+        app_config['filters'] = get_target_filters(target=cli_args.get('target'))
+
+    instance = find_single_instance(app_config=app_config)
+
+    if cli_args.get('ssm') and app_config.get('default_cloud') == 'aws':
+        connection_string = app_config.get('aws_ssm_connection_string', '')
     else:
-        native_connection_name = 'Native Cloud Connection'
+        connection_string = app_config.get('ssh_connection_string', '')
 
-    table_headers = {'instance_id': 'Instance ID', 'instance_name': 'Instance Name', 'instance_state': 'State',
-                     'region': 'Region', 'private_ip_address': 'Private IP', 'public_ip_address': 'Public IP'}
+    add_proxy_jumps(app_config=app_config, instances=[instance], templates=[connection_string])
+    command = connection.build_command(
+        connection_string=replace_variables(string=connection_string, instance=instance, app_config=app_config),
+        app_config=app_config)
 
-    if app_config.get('ssh_connection_string_enabled'):
-        table_headers['ssh_string'] = 'SSH Connection'
+    if not command:
+        print('Connection string cannot be empty')
+        sys.exit(1)
 
-    if app_config.get('aws_ssm_connection_string_enabled'):
-        table_headers['native_client_string'] = native_connection_name
+    if cli_args.get('print_only'):
+        print(' '.join(shlex.quote(argument) for argument in command))
+        return
 
-    table = tabulate(instances, headers=table_headers)
+    connection.exec_command(command=command)
 
-    return table
+
+def get_instances_list(cli_args=None, app_config=None, statuses=None):
+    """Get list of cloud servers according to CLI arguments (cached inventory, snapshot diff, top-N or all)
+
+    If statuses dictionary is specified, failed regions are recorded there and cloud servers of other regions
+    are returned. Snapshots are always taken from all regions, otherwise servers of failed regions would be
+    shown as removed.
+    """
+
+    if cli_args.get('ip') and not cli_args.get('no_cache'):
+        cached_instances_list = ipindex.find_cached_instances(app_config=app_config, addresses=cli_args.get('ip'))
+        if cached_instances_list:
+            print('\nCloud servers found in the cached inventory (use --no-cache for requesting cloud API)')
+            return cached_instances_list
+
+    if cli_args.get('diff') or cli_args.get('snapshot'):
+        return get_snapshot_instances(app_config=app_config, snapshot_path=cli_args.get('snapshot'),
+                                      show_diff=cli_args.get('diff'))
+
+    if cli_args.get('sort'):
+        return summary.select_instances(instances=iter_cloud_instances(app_config=app_config, statuses=statuses),
+                                        sort_by=cli_args.get('sort'), limit=cli_args.get('limit'))
+
+    return get_cloud_instances(app_config=app_config, limit=cli_args.get('limit'), statuses=statuses)
+
+
+def print_regions_footer(statuses=None):
+    """Print footer with failed regions. Exit with error if all of them failed"""
+
+    regions_footer = inventory.get_regions_footer(statuses=statuses)
+    if not regions_footer:
+        return
+
+    print(f'{regions_footer}\n')
+    if all(status['status'] != 'ok' for status in statuses.values()):
+        sys.exit(1)
+
+
+def run_on_instances(cli_args=None, app_config=None):
+    """Run command on all running cloud servers using SSH connection string"""
+
+    remote_command = list(cli_args.get('remote_command') or [])
+    if remote_command and remote_command[0] == '--':
+        remote_command = remote_command[1:]
+    if not remote_command:
+        print('Command to run cannot be empty')
+        sys.exit(1)
+
+    instances_list = [instance for instance in get_cloud_instances(app_config=app_config)
+                      if instance['instance_state'] == 'running']
+    if not instances_list:
+        print('No running servers found matching your filter')
+        sys.exit(1)
+
+    add_proxy_jumps(app_config=app_config, instances=instances_list,
+                    templates=[app_config.get('ssh_connection_string', '')])
+
+    commands = []
+    for instance in instances_list:
+        command = connection.build_command(
+            connection_string=replace_variables(string=app_config.get('ssh_connection_string', ''),
+                                                instance=instance, app_config=app_config),
+            app_config=app_config)
+        if not connection.is_ssh_command(command=command):
+            print('Only SSH connection strings are supported for running commands')
+            sys.exit(1)
+        commands.append((executor.get_host_label(instance=instance), command[:1] + ['-o', 'BatchMode=yes'] + command[1:]
+                         + remote_command))
+
+    results = executor.run_commands(commands=commands,
+                                    parallel=cli_args.get('parallel') or executor.DEFAULT_PARALLEL,
+                                    timeout=cli_args.get('timeout') or executor.DEFAULT_TIMEOUT)
+
+    print(f'\n{executor.generate_summary(results=results)}\n')
+
+    if any(executor.is_failed(result=result) for result in results):
+        sys.exit(1)
+
+
+def generate_watch_lines(app_config=None, current_snapshot=None, previous_snapshot=None, interval=None,
+                         statuses=None):
+    """Generate screen lines for watch mode (instances with changed state are highlighted, failed regions footer)"""
+
+    changed_ids = set()
+    if previous_snapshot is not None:
+        changed_ids = {instance['instance_id'] for instance
+                       in snapshot.diff_snapshots(previous=previous_snapshot, current=current_snapshot)}
+
+    instances_list = []
+    for instance_id, (_, instance) in current_snapshot.items():
+        instance = {**instance, 'tags': dict(instance.get('tags') or {})}
+        if instance_id in changed_ids:
+            instance['instance_state'] = watch.highlight(instance['instance_state'])
+        instances_list.append(instance)
+
+    enriched_instances_list = enrich_instances_metadata(app_config=app_config, instances=instances_list)
+    header = f'Every {interval:g}s: {len(instances_list)} servers, {len(changed_ids)} changed, ' \
+             f'updated at {time.strftime("%H:%M:%S")}'
+
+    lines = [header, ''] + generate_table(app_config=app_config, instances=enriched_instances_list).splitlines()
+    regions_footer = inventory.get_regions_footer(statuses=statuses)
+
+    return lines + ['', *regions_footer.splitlines()] if regions_footer else lines
+
+
+def watch_instances(app_config=None, interval=None, output=None, cycles=None):
+    """Refresh cloud servers list periodically and redraw only changed rows
+
+    Cloud sessions are kept open between refreshes. Servers of failed regions are kept from the previous refresh.
+    Lines which don't fit into the terminal are not shown.
+    """
+
+    if output is None:
+        output = sys.stdout
+
+    session = inventory.InventorySession()
+    previous_snapshot = None
+    previous_lines = None
+    cycle = 0
+
+    try:
+        while cycles is None or cycle < cycles:
+            if cycle:
+                time.sleep(interval)
+            cycle += 1
+
+            statuses = {}
+            current_snapshot = snapshot.build_snapshot(
+                instances=iter_cloud_instances(app_config=app_config, session=session, statuses=statuses))
+            snapshot.keep_failed_regions(previous=previous_snapshot, current=current_snapshot, statuses=statuses)
+            current_lines = watch.clip_lines(height=shutil.get_terminal_size().lines, lines=generate_watch_lines(
+                app_config=app_config, current_snapshot=current_snapshot, previous_snapshot=previous_snapshot,
+                interval=interval, statuses=statuses))
+
+            output.write(watch.render_updates(previous_lines=previous_lines, current_lines=current_lines))
+            output.flush()
+
+            previous_snapshot = current_snapshot
+            previous_lines = current_lines
+    except KeyboardInterrupt:
+        output.write('\n')
+
+
+def collect_metrics(app_config=None, session=None, statuses=None):
+    """Fetch cloud servers once and return metrics of the fetch in OpenMetrics format
+
+    Fetch errors are accounted in metrics instead of exiting, so metrics endpoint keeps working.
+    Failed regions are exported as region up gauges and error counters, cloud servers of other regions are counted.
+    If statuses dictionary is specified, statuses of the regions are recorded there.
+    """
+
+    inventory_metrics = session.metrics
+    inventory_metrics.reset(name='sshcld_region_fetch_seconds')
+    started = time.perf_counter()
+    statuses = {} if statuses is None else statuses
+
+    try:
+        instances_list = inventory.get_instances(config=app_config, session=session, statuses=statuses)
+    except (AwsApiError, ConfigurationError, CloudNotSupportedError) as error:
+        print(error, file=sys.stderr)
+        inventory_metrics.inc(name='sshcld_fetch_errors', labels={'error': type(error).__name__})
+    else:
+        inventory_metrics.observe_statuses(statuses=statuses)
+        inventory_metrics.observe_instances(instances=instances_list, printable_tags=app_config.get('printable_tags'))
+        inventory_metrics.set(name='sshcld_fetch_seconds', value=time.perf_counter() - started)
+        if not inventory.get_regions_footer(statuses=statuses):
+            inventory_metrics.set(name='sshcld_last_fetch_timestamp_seconds', value=round(time.time(), 3))
+
+    location_caches = session.location_caches.values()
+    inventory_metrics.set_cache_stats(cache_name='locations',
+                                      hits=sum(location_cache.hits for location_cache in location_caches),
+                                      misses=sum(location_cache.misses for location_cache in location_caches))
+
+    return inventory_metrics.render()
+
+
+def export_metrics(cli_args=None, app_config=None):
+    """Write metrics to the file or serve them on HTTP port"""
+
+    session = inventory.InventorySession(metrics=metrics.InventoryMetrics())
+
+    if cli_args.get('metrics_port') is None:
+        statuses = {}
+        content = collect_metrics(app_config=app_config, session=session, statuses=statuses)
+        if cli_args.get('metrics') == '-':
+            sys.stdout.write(content)
+        else:
+            # Metrics are read by other users, e.g. node_exporter textfile collector
+            cache.write_file_atomically(path=cli_args.get('metrics'), content=content.encode('utf-8'), mode=0o644)
+        regions_footer = inventory.get_regions_footer(statuses=statuses)
+        if regions_footer:
+            print(regions_footer, file=sys.stderr)
+        if session.metrics.get_total(name='sshcld_fetch_errors') or regions_footer:
+            sys.exit(1)
+        return
+
+    # Handler serves the last collected metrics, cloud servers are refetched in a background thread
+    last_collection = {'content': collect_metrics(app_config=app_config, session=session)}
+
+    def refresh():
+        last_collection['content'] = collect_metrics(app_config=app_config, session=session)
+
+    address = app_config.get('metrics_address', metrics.DEFAULT_METRICS_ADDRESS)
+    server = metrics.create_metrics_server(address=address, port=cli_args.get('metrics_port'),
+                                           collect=lambda: last_collection['content'])
+    metrics.start_refresh_thread(refresh=refresh, interval=app_config.get('metrics_refresh_interval',
+                                                                          metrics.DEFAULT_REFRESH_INTERVAL))
+    print(f'Serving metrics on http://{address}:{server.server_port}/metrics')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def print_ansible_inventory(cli_args=None, app_config=None):
+    """Print Ansible dynamic inventory ("--list") or variables of one host ("--host")"""
+
+    host_property = app_config.get('ansible_host_property', ansible.DEFAULT_ANSIBLE_HOST_PROPERTY)
+
+    if cli_args.get('host'):
+        # Hosts are named by instance ID, so only one cloud server is requested
+        host_config = dict(app_config, filters=f'FILTER_INSTANCE_ID={cli_args.get("host")}')
+        content = ansible.get_host(instances=get_cloud_instances(app_config=host_config), host=cli_args.get('host'),
+                                   host_property=host_property)
+    else:
+        content = ansible.build_inventory(instances=get_cloud_instances(app_config=app_config),
+                                          printable_tags=app_config.get('printable_tags'),
+                                          host_property=host_property)
+
+    print(json.dumps(content, sort_keys=True, default=str))
+
+
+def get_batch_queries(cli_args=None):
+    """Get named queries (name -> filters) from query file and --query arguments"""
+
+    queries = {}
+
+    if cli_args.get('query_file'):
+        file_queries = open_yaml_file(path=cli_args.get('query_file'))
+        if not isinstance(file_queries, dict) or not file_queries:
+            print(f'Query file should contain named queries (name: filters): {cli_args.get("query_file")}')
+            sys.exit(1)
+        queries.update({str(name): filters for name, filters in file_queries.items()})
+
+    try:
+        for text in cli_args.get('query') or []:
+            name, filters = batch.parse_query(text=text)
+            queries[name] = filters
+        batch.check_queries(queries=queries, output_names=bool(cli_args.get('query_output')))
+    except ValueError as error:
+        print(f'Invalid query: {error}')
+        sys.exit(1)
+
+    return queries
+
+
+def run_batch_queries(cli_args=None, app_config=None):
+    """Fetch cloud servers once with union of queries filters and show result of each query separately"""
+
+    queries = get_batch_queries(cli_args=cli_args)
+
+    statuses = {}
+    instances_list = get_cloud_instances(app_config=dict(app_config, filters=batch.get_union_filters(queries.values())),
+                                         statuses=statuses)
+
+    output_dir = cli_args.get('query_output')
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    for name, query_instances in batch.split_instances(instances=instances_list, queries=queries).items():
+        enriched_instances_list = enrich_instances_metadata(app_config=app_config, instances=query_instances)
+        instances_table = generate_table(app_config=app_config, instances=enriched_instances_list)
+        if output_dir:
+            output_path = os.path.join(output_dir, f'{cache.get_safe_name(name)}.txt')
+            cache.write_file_atomically(path=output_path, content=f'{instances_table}\n'.encode('utf-8'))
+            print(f'{name}: {len(query_instances)} cloud servers ({output_path})')
+        else:
+            print(f'\n== {name} ({len(query_instances)} cloud servers) ==\n\n{instances_table}\n')
+
+    print_regions_footer(statuses=statuses)
+
+
+def get_dns_index(app_config=None, session=None, previous_index=None):
+    """Fetch cloud servers and build DNS index. Records of failed regions are kept from previous index"""
+
+    statuses = {}
+    instances_list = inventory.get_instances(config=app_config, session=session, statuses=statuses)
+    regions_footer = inventory.get_regions_footer(statuses=statuses)
+    if regions_footer:
+        print(regions_footer, file=sys.stderr)
+        instances_list = snapshot.keep_failed_region_instances(previous=previous_index and previous_index.instances,
+                                                               current=instances_list, statuses=statuses)
+
+    return resolver.DnsIndex(instances=instances_list,
+                             domain=app_config.get('dns_domain', resolver.DEFAULT_DNS_DOMAIN),
+                             address_property=app_config.get('dns_address_property', 'private_ip_address'))
+
+
+def serve_dns(cli_args=None, app_config=None):
+    """Serve DNS records of cloud servers on local UDP port and refresh them in the background"""
+
+    session = inventory.InventorySession()
+    refresh_interval = app_config.get('dns_refresh_interval', resolver.DEFAULT_REFRESH_INTERVAL)
+    address = app_config.get('dns_address', resolver.DEFAULT_DNS_ADDRESS)
+    try:
+        index = get_dns_index(app_config=app_config, session=session)
+    except (AwsApiError, ConfigurationError, CloudNotSupportedError) as error:
+        print(error)
+        sys.exit(1)
+    server = resolver.create_dns_server(address=address, port=cli_args.get('dns_port'), index=index,
+                                        ttl=app_config.get('dns_ttl', resolver.DEFAULT_DNS_TTL))
+
+    def build_index(previous_index):
+        return get_dns_index(app_config=app_config, session=session, previous_index=previous_index)
+
+    resolver.start_refresh_thread(server=server, build_index=build_index, interval=refresh_interval)
+
+    print(f'Serving DNS records of *.{server.index.domain} on udp://{address}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# pylint: disable=R0911
+def run_command_mode(cli_args=None, app_config=None):
+    """Run subcommand or output mode other than cloud servers table. Returns True if it was run"""
+
+    if cli_args.get('command') == 'connect':
+        connect_to_instance(cli_args=cli_args, app_config=app_config)
+        return True
+
+    if cli_args.get('command') == 'exec':
+        run_on_instances(cli_args=cli_args, app_config=app_config)
+        return True
+
+    if cli_args.get('query') or cli_args.get('query_file'):
+        run_batch_queries(cli_args=cli_args, app_config=app_config)
+        return True
+
+    if cli_args.get('dns_port') is not None:
+        serve_dns(cli_args=cli_args, app_config=app_config)
+        return True
+
+    if cli_args.get('ansible') or cli_args.get('list') or cli_args.get('host'):
+        print_ansible_inventory(cli_args=cli_args, app_config=app_config)
+        return True
+
+    if cli_args.get('metrics') or cli_args.get('metrics_port') is not None:
+        export_metrics(cli_args=cli_args, app_config=app_config)
+        return True
+
+    if cli_args.get('group_by') or cli_args.get('count'):
+        instances_list = iter_cloud_instances(app_config=app_config)
+        print(f'\n{generate_summary(instances=instances_list, group_by=cli_args.get("group_by"))}\n')
+        return True
+
+    if cli_args.get('watch') is not None:
+        if cli_args.get('watch') <= 0:
+            print('Watch interval should be a positive number')
+            sys.exit(1)
+        watch_instances(app_config=app_config, interval=cli_args.get('watch'))
+        return True
+
+    return False
 
 
 def show_instances():
@@ -255,12 +957,43 @@ def show_instances():
 
     app_config = enrich_config(cli_args=cli_args, yaml_config=app_config)
 
-    instances_list = get_cloud_instances(app_config=app_config)
+    if run_command_mode(cli_args=cli_args, app_config=app_config):
+        return
+
+    if cli_args.get('first'):
+        cli_args['limit'] = 1
+
+    if cli_args.get('limit') is not None and cli_args.get('limit') < 1:
+        print('Limit should be a positive number')
+        sys.exit(1)
+
+    region_statuses = {}
+    instances_list = get_instances_list(cli_args=cli_args, app_config=app_config, statuses=region_statuses)
+
+    if cli_args.get('diff') and not instances_list:
+        print('\nNo changes since the previous snapshot\n')
+        return
+
+    if cli_args.get('probe') and (is_column_displayed(app_config=app_config, column='reachable')
+                                  or is_column_displayed(app_config=app_config, column='latency')):
+        instances_list = probe.probe_instances(instances=instances_list, app_config=app_config)
+
     enriched_instances_list = enrich_instances_metadata(app_config=app_config, instances=instances_list)
+
+    if cli_args.get('pager') and enriched_instances_list and sys.stdout.isatty():
+        try:
+            pager.run_pager(instances=enriched_instances_list, headers=get_table_headers(app_config=app_config))
+            print_regions_footer(statuses=region_statuses)
+            return
+        except ImportError:
+            print('Built-in pager is not supported on this platform')
+
     instances_table = generate_table(app_config=app_config, instances=enriched_instances_list)
 
     print(f'\n{instances_table}\n')
 
+    print_regions_footer(statuses=region_statuses)
+
 
 if __name__ == '__main__':
     show_instances()
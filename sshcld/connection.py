@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Build and run connection commands for cloud servers"""
+
+import os
+import shlex
+
+from sshcld import cache
+
+DEFAULT_CONTROL_PERSIST = '10m'
+
+
+def get_control_path_dir(app_config=None):
+    """Get (and create if needed) directory for SSH ControlMaster sockets"""
+
+    control_path_dir = os.path.join(cache.get_cache_dir(app_config), 'ssh')
+    os.makedirs(control_path_dir, mode=0o700, exist_ok=True)
+
+    return control_path_dir
+
+
+def is_ssh_command(command=None):
+    """Check if command runs SSH client"""
+
+    if not command:
+        return False
+
+    return os.path.basename(command[0]).lower() in ('ssh', 'ssh.exe')
+
+
+def get_control_master_options(app_config=None):
+    """Get SSH options for reusing connections with ControlMaster
+
+    Returns empty list if connection reuse is disabled or not supported (Windows OpenSSH).
+    """
+
+    if app_config is None:
+        app_config = {}
+
+    if os.name == 'nt' or not app_config.get('ssh_control_master_enabled', True):
+        return []
+
+    control_path = os.path.join(get_control_path_dir(app_config=app_config), '%C')
+    control_persist = app_config.get('ssh_control_persist', DEFAULT_CONTROL_PERSIST)
+
+    return ['-o', 'ControlMaster=auto', '-o', f'ControlPath={control_path}', '-o', f'ControlPersist={control_persist}']
+
+
+def build_command(connection_string=None, app_config=None):
+    """Split connection string into command arguments and add connection reuse options for SSH"""
+
+    command = shlex.split(connection_string or '', posix=os.name != 'nt')
+
+    if is_ssh_command(command=command):
+        command = command[:1] + get_control_master_options(app_config=app_config) + command[1:]
+
+    return command
+
+
+def exec_command(command=None):
+    """Replace current process with the connection command"""
+
+    os.execvp(command[0], command)
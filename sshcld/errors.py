@@ -5,3 +5,11 @@
 
 class AwsApiError(Exception):
     """Custom exception for AWS API"""
+
+
+class ConfigurationError(Exception):
+    """Custom exception for invalid or incomplete configuration"""
+
+
+class CloudNotSupportedError(Exception):
+    """Custom exception for clouds that are not supported at the moment"""
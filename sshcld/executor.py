@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""Run commands on many cloud servers in parallel"""
+
+import asyncio
+import sys
+
+DEFAULT_PARALLEL = 20
+DEFAULT_TIMEOUT = 60.0
+READ_CHUNK_SIZE = 64 * 1024
+# Longer output lines are split, so one host can't exhaust memory with output without line breaks
+MAX_LINE_LENGTH = 1024 * 1024
+
+
+def write_line(label=None, line=b'', output=None):
+    """Write output line of the host with its label"""
+
+    output.write(f'[{label}] {line.decode("utf-8", errors="replace").rstrip()}\n')
+    output.flush()
+
+
+async def stream_output(label=None, stream=None, output=None):
+    """Copy process output line by line adding host label to each line
+
+    Output is read in chunks (not with readline), so lines longer than stream buffer limit don't fail the run.
+    """
+
+    pending = b''
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b'\n')
+        for line in lines:
+            write_line(label=label, line=line, output=output)
+        if len(pending) >= MAX_LINE_LENGTH:
+            write_line(label=label, line=pending, output=output)
+            pending = b''
+
+    if pending:
+        write_line(label=label, line=pending, output=output)
+
+
+async def run_host_command(label=None, command=None, timeout=DEFAULT_TIMEOUT, semaphore=None, output=None):
+    """Run command for one host. Returns result with exit code or error"""
+
+    result = {'host': label, 'returncode': None, 'error': None}
+
+    async with semaphore:
+        try:
+            process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.DEVNULL,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.STDOUT)
+        except OSError as error:
+            result['error'] = str(error)
+            return result
+
+        async def communicate():
+            await stream_output(label=label, stream=process.stdout, output=output)
+            return await process.wait()
+
+        try:
+            result['returncode'] = await asyncio.wait_for(communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            result['error'] = f'timeout after {timeout:g} seconds'
+
+    return result
+
+
+async def run_commands_async(commands=None, parallel=DEFAULT_PARALLEL, timeout=DEFAULT_TIMEOUT, output=None):
+    """Run commands for all hosts (not more than parallel commands at once)"""
+
+    semaphore = asyncio.Semaphore(parallel)
+
+    return await asyncio.gather(*[run_host_command(label=label, command=command, timeout=timeout,
+                                                   semaphore=semaphore, output=output)
+                                  for label, command in commands])
+
+
+def get_host_label(instance=None):
+    """Get short host label for command output"""
+
+    if instance.get('instance_name'):
+        return f'{instance["instance_name"]}/{instance["instance_id"]}'
+
+    return instance['instance_id']
+
+
+def run_commands(commands=None, parallel=DEFAULT_PARALLEL, timeout=DEFAULT_TIMEOUT, output=None):
+    """Run commands in parallel and stream their output
+
+    commands is a list of (host label, command arguments) pairs. Returns list of results in the same order.
+    """
+
+    if not commands:
+        return []
+
+    if output is None:
+        output = sys.stdout
+
+    if sys.platform == 'win32':
+        loop = asyncio.ProactorEventLoop()
+    else:
+        loop = asyncio.new_event_loop()
+
+    # Python < 3.8 creates subprocesses only in the current loop with child watcher attached to it
+    asyncio.set_event_loop(loop)
+    if sys.platform != 'win32' and sys.version_info < (3, 8):
+        asyncio.get_child_watcher().attach_loop(loop)
+
+    try:
+        return loop.run_until_complete(run_commands_async(commands=commands, parallel=parallel, timeout=timeout,
+                                                          output=output))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def is_failed(result=None):
+    """Check if command failed on the host"""
+
+    return result['error'] is not None or result['returncode'] != 0
+
+
+def generate_summary(results=None):
+    """Generate summary with number of succeeded hosts and list of failed ones"""
+
+    failed_results = [result for result in results if is_failed(result=result)]
+    lines = [f'{len(results)} hosts: {len(results) - len(failed_results)} succeeded, {len(failed_results)} failed']
+
+    for result in failed_results:
+        reason = result['error'] if result['error'] is not None else f'exit code {result["returncode"]}'
+        lines.append(f'  {result["host"]}: {reason}')
+
+    return '\n'.join(lines)
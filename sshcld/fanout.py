@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""Concurrent execution of independent tasks (e.g. requests to cloud regions) with deadlines and hedged retries"""
+
+import concurrent.futures
+import queue
+import threading
+import time
+
+POLL_INTERVAL = 0.05
+
+# Task attempt run by the current worker thread
+current_attempt = threading.local()
+
+
+class TaskTimeout(Exception):
+    """Task was not completed before its timeout or the global deadline"""
+
+
+class DaemonExecutor:
+    """Thread pool with daemon worker threads
+
+    Unlike concurrent.futures.ThreadPoolExecutor, worker threads are not joined at interpreter exit, so attempts
+    abandoned after a timeout don't keep the process running.
+    """
+
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self.work_queue = queue.Queue()
+        self.threads = []
+
+    def submit(self, function=None):
+        """Schedule function call and return its future"""
+
+        future = concurrent.futures.Future()
+        self.work_queue.put((future, function))
+        if len(self.threads) < self.max_workers:
+            thread = threading.Thread(target=self.work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        return future
+
+    def work(self):
+        """Run scheduled calls until shutdown (called in a worker thread)"""
+
+        while True:
+            work_item = self.work_queue.get()
+            if work_item is None:
+                return
+
+            future, function = work_item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function()
+            except BaseException as error:  # pylint: disable=W0703
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        """Stop idle worker threads. Running calls are not waited for"""
+
+        for _ in self.threads:
+            self.work_queue.put(None)
+
+
+def report_progress():
+    """Report that the task run by the current thread made progress (e.g. got response of one API call)
+
+    Task timeout is measured since the last progress, so long tasks which keep getting responses don't time out.
+    Does nothing outside of tasks.
+    """
+
+    state = getattr(current_attempt, 'state', None)
+    if state is not None:
+        state.progress_at = time.monotonic()
+
+
+class TaskState:
+    """Attempts of one task, time when the first attempt started running and time of the last progress"""
+
+    def __init__(self, key=None, function=None):
+        self.key = key
+        self.function = function
+        self.futures = []
+        self.started_at = None
+        self.progress_at = None
+        self.finished_at = None
+        self.outcome = None
+
+    def run(self):
+        """Run task attempt (called in a worker thread)"""
+
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+            self.progress_at = self.started_at
+
+        current_attempt.state = self
+        try:
+            return self.function()
+        finally:
+            current_attempt.state = None
+
+    def idle(self, now=None):
+        """Get number of seconds since the last progress of the task (0 if the task didn't start yet)"""
+
+        if self.progress_at is None:
+            return 0.0
+
+        return now - self.progress_at
+
+    def elapsed(self, now=None):
+        """Get number of seconds since the first attempt started till now or till the task outcome
+
+        Returns 0 if the task didn't start yet.
+        """
+
+        if self.started_at is None:
+            return 0.0
+
+        return (self.finished_at or now) - self.started_at
+
+    def set_outcome(self, result=None, error=None):
+        """Set the task result or error"""
+
+        self.outcome = (result, error)
+        self.finished_at = time.monotonic()
+
+    def check_futures(self, errors=()):
+        """Set outcome if any attempt succeeded or all attempts failed with expected errors"""
+
+        failure = None
+        for future in self.futures:
+            if not future.done():
+                continue
+            error = future.exception()
+            if error is None:
+                self.set_outcome(result=future.result())
+                return
+            if not isinstance(error, errors):
+                raise error
+            failure = error
+
+        if failure is not None and all(future.done() for future in self.futures):
+            self.set_outcome(error=failure)
+
+
+def update_task_state(state=None, executor=None, options=None, elapsed=0.0):
+    """Set task outcome if it's completed or timed out, start hedged attempt if the task is slow
+
+    elapsed is number of seconds since all tasks were started.
+    """
+
+    state.check_futures(errors=options.get('errors', ()))
+    if state.outcome is not None:
+        return
+
+    now = time.monotonic()
+    task_elapsed = state.elapsed(now)
+    if options.get('deadline') is not None and elapsed >= options['deadline']:
+        state.set_outcome(error=TaskTimeout(f'deadline of {options["deadline"]} s exceeded'))
+    elif options.get('task_timeout') is not None and state.idle(now) >= options['task_timeout']:
+        state.set_outcome(error=TaskTimeout(f'timeout of {options["task_timeout"]} s exceeded'))
+    elif options.get('hedge_delay') is not None and len(state.futures) == 1 and task_elapsed >= options['hedge_delay']:
+        state.futures.append(executor.submit(state.run))
+
+
+def run_tasks(tasks=None, options=None):
+    """Run tasks concurrently and yield (key, result, error, seconds) in the order of tasks
+
+    tasks is a list of (key, function) pairs. options is a dictionary with the following keys:
+    workers (maximum number of concurrent attempts), errors (tuple of expected exceptions, yielded as the task
+    error, other exceptions are raised), task_timeout (seconds since the task start or its last progress reported
+    with report_progress), deadline (seconds since the call) and hedge_delay (one more attempt of a slow task is
+    started after hedge_delay seconds and the first successful attempt wins). Timed out tasks get TaskTimeout
+    error. Abandoned attempts keep running in daemon threads, which don't delay the process exit.
+    """
+
+    if options is None:
+        options = {}
+
+    states = [TaskState(key=key, function=function) for key, function in tasks or []]
+    if not states:
+        return
+
+    started = time.monotonic()
+    executor = DaemonExecutor(max_workers=max(options.get('workers') or 1, 1))
+    next_index = 0
+
+    try:
+        for state in states:
+            state.futures.append(executor.submit(state.run))
+
+        while next_index < len(states):
+            for state in states[next_index:]:
+                if state.outcome is None:
+                    update_task_state(state=state, executor=executor, options=options,
+                                      elapsed=time.monotonic() - started)
+
+            while next_index < len(states) and states[next_index].outcome is not None:
+                state = states[next_index]
+                yield (state.key, *state.outcome, round(state.elapsed(time.monotonic()), 3))
+                next_index += 1
+
+            waiting_futures = [future for state in states[next_index:] for future in state.futures
+                               if not future.done()]
+            if waiting_futures:
+                concurrent.futures.wait(waiting_futures, timeout=POLL_INTERVAL,
+                                        return_when=concurrent.futures.FIRST_COMPLETED)
+    finally:
+        for state in states:
+            for future in state.futures:
+                future.cancel()
+        executor.shutdown()
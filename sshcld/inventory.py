@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+"""Library API for getting cloud servers inventory
+
+Functions from this module never print anything and never exit, all problems are reported with exceptions
+from sshcld.errors. Each yielded record is a dict with the following keys: instance_id, instance_name,
+instance_state, region, private_ip_address, public_ip_address, launch_time and tags (dict of all tags).
+
+Example:
+    from sshcld import inventory
+
+    session = inventory.InventorySession()
+    for instance in inventory.iter_instances({'default_cloud': 'aws', 'cloud_region': 'us-east-1'},
+                                             filters='environment=production', session=session):
+        print(instance['instance_id'], instance['private_ip_address'])
+"""
+
+import functools
+import os
+import time
+
+from sshcld import cache
+from sshcld import fanout
+from sshcld.errors import AwsApiError, CloudNotSupportedError, ConfigurationError
+from sshcld.metrics import MetricsSession
+from sshcld.plugins import aws
+from sshcld.plugins import replay
+
+DEFAULT_INSTANCE_CACHE_TTL = 60
+DEFAULT_REGION_TIMEOUT = 30
+DEFAULT_REGION_CONCURRENCY = 10
+
+
+class InventorySession:
+    """Reusable state shared between inventory requests
+
+    Cloud sessions are created once per cloud profile and reused, so long-running services don't pay
+    for session creation and credentials resolution on every request. Caches are loaded once too.
+    If metrics registry (sshcld.metrics.InventoryMetrics) is specified, cloud API calls are accounted in it.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.aws_sessions = {}
+        self.location_caches = {}
+        self.region_hits_caches = {}
+
+    def get_location_cache(self, config=None):
+        """Get cache with last known locations of cloud servers"""
+
+        path = os.path.join(cache.get_cache_dir(config), 'locations.json')
+        if path not in self.location_caches:
+            self.location_caches[path] = cache.LocationCache(
+                path=path, ttl=config.get('instance_cache_ttl', DEFAULT_INSTANCE_CACHE_TTL))
+
+        return self.location_caches[path]
+
+    def get_region_hits_cache(self, config=None):
+        """Get cache with number of lookups that found cloud servers in each region"""
+
+        path = os.path.join(cache.get_cache_dir(config), 'region_hits.json')
+        if path not in self.region_hits_caches:
+            self.region_hits_caches[path] = cache.RegionHitsCache(path=path)
+
+        return self.region_hits_caches[path]
+
+    def get_aws_session(self, profile_name=None, config=None):
+        """Get AWS session for the profile (created on first use)
+
+        If aws_replay_dir is defined in config, recorded responses are replayed instead of AWS API calls.
+        If aws_record_dir is defined, AWS API responses are recorded.
+        Credentials of assumed roles are cached in the cache directory unless aws_credentials_cache_enabled is False.
+        """
+
+        if config is None:
+            config = {}
+
+        session_key = (profile_name, config.get('aws_record_dir'), config.get('aws_replay_dir'))
+
+        if session_key not in self.aws_sessions:
+            if config.get('aws_replay_dir'):
+                session = replay.ReplaySession(directory=config.get('aws_replay_dir'),
+                                               options=config.get('aws_replay_options'), profile_name=profile_name)
+            else:
+                credential_cache = None
+                if config.get('aws_credentials_cache_enabled', True):
+                    credential_cache = cache.CredentialCache(
+                        directory=os.path.join(cache.get_cache_dir(config), 'credentials'), profile_name=profile_name)
+                session = aws.get_session(profile_name=profile_name, credential_cache=credential_cache)
+                if config.get('aws_record_dir'):
+                    session = replay.RecordingSession(session=session, directory=config.get('aws_record_dir'))
+                session = aws.CachedClientsSession(session=session, client_config=aws.get_client_config(
+                    timeout=config.get('region_timeout', DEFAULT_REGION_TIMEOUT)))
+            if self.metrics is not None:
+                session = MetricsSession(session=session, metrics=self.metrics)
+            self.aws_sessions[session_key] = session
+
+        return self.aws_sessions[session_key]
+
+
+def get_region_status(status='ok', instances_count=0, seconds=0.0, message=None):
+    """Get status record of one region request"""
+
+    return {'status': status, 'instances': instances_count, 'seconds': seconds, 'message': message}
+
+
+def get_regions_footer(statuses=None):
+    """Get footer with failed and timed out regions (empty if all regions succeeded)"""
+
+    failed_statuses = {region: status for region, status in (statuses or {}).items() if status['status'] != 'ok'}
+    if not failed_statuses:
+        return ''
+
+    lines = [f'Not all regions responded ({len(failed_statuses)} of {len(statuses)} failed), '
+             f'cloud servers of other regions are shown:']
+    for region, status in sorted(failed_statuses.items()):
+        lines.append(f'  {region}: {status["status"]} ({status["message"]})')
+
+    return '\n'.join(lines)
+
+
+def get_region_instances(region=None, filters=None, aws_session=None):
+    """Get list of cloud servers of one region (fanout task)
+
+    Each received cloud server is reported as progress of the task, so region_timeout limits waiting for one
+    API response and not the whole pagination of large regions.
+    """
+
+    instances = []
+    for instance in aws.iter_instances(region_name=region, filters=filters, session=aws_session):
+        fanout.report_progress()
+        instances.append(instance)
+
+    return instances
+
+
+def iter_regions_concurrently(config=None, filters=None, aws_session=None, regions=None, statuses=None):
+    """Yield cloud servers of regions requested concurrently (in the order of regions)
+
+    Each region has its own timeout and all of them share the global deadline. Failed and timed out regions
+    are recorded in statuses instead of raising an exception.
+    """
+
+    tasks = [(region, functools.partial(get_region_instances, region=region, filters=filters, aws_session=aws_session))
+             for region in regions]
+
+    options = {
+        'workers': config.get('region_concurrency', DEFAULT_REGION_CONCURRENCY),
+        'errors': (AwsApiError,),
+        'task_timeout': config.get('region_timeout', DEFAULT_REGION_TIMEOUT),
+        'deadline': config.get('fetch_deadline'),
+        'hedge_delay': config.get('hedge_delay'),
+    }
+
+    for region, instances, error, seconds in fanout.run_tasks(tasks=tasks, options=options):
+        if error is None:
+            statuses[region] = get_region_status(instances_count=len(instances), seconds=seconds)
+            yield from instances
+        else:
+            statuses[region] = get_region_status(status='timeout' if isinstance(error, fanout.TaskTimeout) else 'error',
+                                                 seconds=seconds, message=str(error))
+
+
+def iter_regions_sequentially(aws_session=None, filters=None, regions=None, locations=None, statuses=None):
+    """Yield cloud servers of regions requested one by one
+
+    If statuses is specified, failed regions are recorded there and remaining regions are still requested.
+    Regions are recorded as succeeded once all of them are requested (or when cloud servers were found there).
+    """
+
+    started = time.monotonic()
+    failed_regions = {} if statuses is not None else None
+    instances_counts = dict.fromkeys(regions, 0)
+    completed = False
+    instances = aws.iter_instances(region_name=','.join(regions), filters=filters, session=aws_session,
+                                   locations=locations, failed_regions=failed_regions)
+
+    try:
+        for instance in instances:
+            instances_counts[instance.get('region')] = instances_counts.get(instance.get('region'), 0) + 1
+            yield instance
+        completed = True
+    finally:
+        instances.close()
+        if statuses is not None:
+            seconds = round(time.monotonic() - started, 3)
+            for region, instances_count in instances_counts.items():
+                if region in failed_regions:
+                    statuses[region] = get_region_status(status='error', instances_count=instances_count,
+                                                         seconds=seconds, message=str(failed_regions[region]))
+                elif completed or instances_count:
+                    statuses[region] = get_region_status(instances_count=instances_count, seconds=seconds)
+
+
+def get_requested_regions(config=None, aws_session=None, region_hits=None, statuses=None):
+    """Get list of requested regions, ordered by number of recent hits if region_hits cache is specified
+
+    If statuses is specified, failure of getting regions is recorded there and None is returned.
+    """
+
+    try:
+        regions = aws.get_regions(region_name=config.get('cloud_region'), session=aws_session)
+    except AwsApiError as error:
+        if statuses is None:
+            raise
+        region_name = config.get('cloud_region') or aws_session.region_name
+        statuses[region_name] = get_region_status(status='error', message=str(error))
+        return None
+
+    if region_hits is not None:
+        regions = region_hits.order_regions(regions=regions, profile_name=config.get('cloud_profile'))
+
+    return regions
+
+
+def iter_limited_instances(instances=None, limit=None, region_hits=None, profile_name=None):
+    """Yield cloud servers until limit is reached (cloud API requests stop when the generator is closed)
+
+    Regions where cloud servers were found are saved to region_hits cache if it's specified.
+    """
+
+    found_regions = []
+    try:
+        for instance in instances:
+            found_regions.append(instance.get('region'))
+            yield instance
+            if limit is not None and len(found_regions) >= limit:
+                break
+    finally:
+        instances.close()
+        if region_hits is not None:
+            region_hits.update(regions=found_regions, profile_name=profile_name)
+            region_hits.save()
+
+
+def iter_instances(config=None, filters=None, session=None, limit=None, statuses=None):
+    """Yield cloud servers one by one as soon as cloud API pages arrive
+
+    config is the same dictionary as sshcld.yaml (default_cloud, cloud_region, cloud_profile, filters).
+    filters overrides filters from config (string or dictionary tag -> list of allowed values).
+    If limit is specified, cloud API requests stop as soon as limit servers are found: remaining pages and
+    regions are never requested, and regions where servers were found recently are requested first.
+    If statuses dictionary is specified, failed regions are recorded in statuses instead of raising an exception,
+    so cloud servers of other regions are still returned. Without limit, regions are requested concurrently with
+    timeouts (region_timeout, fetch_deadline and hedge_delay from config).
+    """
+
+    if not config:
+        raise ConfigurationError('Configuration cannot be empty')
+
+    if filters is None:
+        filters = config.get('filters')
+
+    if session is None:
+        session = InventorySession()
+
+    if config.get('default_cloud') == 'aws':
+        locations = None
+        if filters is not None and str(filters).strip().startswith('FILTER_INSTANCE_ID='):
+            locations = session.get_location_cache(config=config)
+
+        profile_name = config.get('cloud_profile')
+        aws_session = session.get_aws_session(profile_name=profile_name, config=config)
+
+        if limit is None and statuses is None:
+            yield from aws.iter_instances(region_name=config.get('cloud_region'), filters=filters,
+                                          session=aws_session, locations=locations)
+            return
+
+        region_hits = session.get_region_hits_cache(config=config) if limit is not None else None
+        regions = get_requested_regions(config=config, aws_session=aws_session, region_hits=region_hits,
+                                        statuses=statuses)
+        if regions is None:
+            return
+
+        # Limited lookups request regions one by one, so remaining regions are never requested
+        if statuses is None or locations is not None or limit is not None:
+            instances = iter_regions_sequentially(aws_session=aws_session, filters=filters, regions=regions,
+                                                  locations=locations, statuses=statuses)
+        else:
+            instances = iter_regions_concurrently(config=config, filters=filters, aws_session=aws_session,
+                                                  regions=regions, statuses=statuses)
+
+        yield from iter_limited_instances(instances=instances, limit=limit, region_hits=region_hits,
+                                          profile_name=profile_name)
+    else:
+        raise CloudNotSupportedError('You specified cloud that is not supported at the moment')
+
+
+def get_instances(config=None, filters=None, session=None, limit=None, statuses=None):
+    """Get list of cloud servers (all of them or first limit servers)"""
+
+    return list(iter_instances(config=config, filters=filters, session=session, limit=limit, statuses=statuses))
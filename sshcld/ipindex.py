@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""Search cloud servers by IP addresses and networks
+
+Only primary private and public IP addresses of cloud servers are matched (secondary addresses of network
+interfaces are not a part of cloud server records).
+"""
+
+from bisect import bisect_left, bisect_right
+import glob
+import hashlib
+import ipaddress
+import json
+import os
+import time
+
+from sshcld import cache
+
+IP_ADDRESS_FIELDS = ('private_ip_address', 'public_ip_address')
+DEFAULT_IP_CACHE_TTL = 3600
+INDEX_VERSION = 1
+
+
+def parse_networks(addresses=None):
+    """Parse comma-separated list of IP addresses and CIDRs. Raises ValueError for invalid values"""
+
+    if not addresses:
+        return []
+
+    return [ipaddress.ip_network(address.strip(), strict=False) for address in addresses.split(',') if address.strip()]
+
+
+def get_wildcard_pattern(network=None):
+    """Convert network to EC2 filter value if possible (exact address or octet-aligned IPv4 network)"""
+
+    if network.version != 4 or network.prefixlen % 8 != 0 or network.prefixlen == 0:
+        return None
+
+    if network.prefixlen == 32:
+        return str(network.network_address)
+
+    octets = str(network.network_address).split('.')[:network.prefixlen // 8]
+
+    return '.'.join(octets + ['*'])
+
+
+def build_ip_requests(networks=None):
+    """Build EC2 filters for searching instances by IP addresses
+
+    Private and public addresses are separate EC2 filters which are combined with AND, so they are requested
+    separately. Every address is sent in both requests: VPC private addresses aren't always in private ranges
+    (e.g. 100.64.0.0/10 or public CIDRs), and private ranges can be used as public addresses. If some network
+    can't be expressed as EC2 filter, all instances have to be requested.
+    """
+
+    patterns = []
+
+    for network in networks or []:
+        pattern = get_wildcard_pattern(network=network)
+        if pattern is None:
+            return [[]]
+        if pattern not in patterns:
+            patterns.append(pattern)
+
+    if not patterns:
+        return []
+
+    return [[{'Name': 'private-ip-address', 'Values': patterns}], [{'Name': 'ip-address', 'Values': patterns}]]
+
+
+def instance_matches_networks(instance=None, networks=None):
+    """Check if any IP address of the instance belongs to any of the networks"""
+
+    for field in IP_ADDRESS_FIELDS:
+        if not instance.get(field):
+            continue
+        try:
+            address = ipaddress.ip_address(instance[field])
+        except ValueError:
+            continue
+        if any(address in network for network in networks):
+            return True
+
+    return False
+
+
+class IpIndex:
+    """Sorted index of instances IP addresses
+
+    Each lookup is a binary search of the network's first and last addresses, so it takes O(log n + k) time.
+    Index can be saved to a file and loaded later without parsing and sorting the addresses again.
+    """
+
+    def __init__(self, instances=None):
+        entries = []
+
+        for position, instance in enumerate(instances or []):
+            for field in IP_ADDRESS_FIELDS:
+                try:
+                    address = ipaddress.ip_address(instance.get(field) or '')
+                except ValueError:
+                    continue
+                entries.append((address.version, int(address), position))
+
+        entries.sort()
+        self.instances = instances or []
+        self.keys = [(version, address) for version, address, _ in entries]
+        self.positions = [position for _, _, position in entries]
+        self.saved_at = time.time()
+
+    def lookup(self, networks=None):
+        """Get instances with IP addresses from any of the networks"""
+
+        found_positions = []
+
+        for network in networks or []:
+            first = bisect_left(self.keys, (network.version, int(network.network_address)))
+            last = bisect_right(self.keys, (network.version, int(network.broadcast_address)))
+            found_positions += self.positions[first:last]
+
+        return [self.instances[position] for position in sorted(set(found_positions))]
+
+    def save(self, path=None):
+        """Save index to JSON file"""
+
+        content = json.dumps({'version': INDEX_VERSION, 'saved_at': self.saved_at, 'keys': self.keys,
+                              'positions': self.positions, 'instances': self.instances},
+                             separators=(',', ':'), default=str)
+        cache.write_file_atomically(path=path, content=content.encode('utf-8'))
+
+    @classmethod
+    def load(cls, path=None, ttl=DEFAULT_IP_CACHE_TTL):
+        """Load index saved less than ttl seconds ago. Returns None if it doesn't exist, can't be read or is stale"""
+
+        try:
+            with open(path, 'r', encoding='utf-8') as index_file:
+                content = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(content, dict) or content.get('version') != INDEX_VERSION:
+            return None
+        if time.time() - content.get('saved_at', 0) >= ttl:
+            return None
+
+        index = cls()
+        index.instances = content['instances']
+        index.keys = [tuple(key) for key in content['keys']]
+        index.positions = content['positions']
+        index.saved_at = content['saved_at']
+
+        return index
+
+
+def get_index_prefix(app_config=None):
+    """Get path prefix of saved indexes of the same cloud, profile and region (filters don't matter)"""
+
+    return os.path.join(cache.get_cache_dir(app_config), f'ipindex-{cache.get_query_key(app_config, filters="")}-')
+
+
+def save_cached_index(app_config=None, snapshot_path=None, instances=None):
+    """Save index of instances from the snapshot in the cache directory (one index per snapshot path)"""
+
+    snapshot_key = hashlib.sha1(os.path.abspath(snapshot_path).encode('utf-8')).hexdigest()[:16]
+    IpIndex(instances=instances).save(path=f'{get_index_prefix(app_config=app_config)}{snapshot_key}.json')
+
+
+def find_cached_instances(app_config=None, addresses=None):
+    """Search cloud servers by IP addresses in saved indexes of snapshots of the same cloud, profile and region
+
+    Indexes older than ip_cache_ttl seconds are ignored (0 disables the cache). If a cloud server is found in
+    several indexes, its newest record is returned.
+    """
+
+    ttl = app_config.get('ip_cache_ttl', DEFAULT_IP_CACHE_TTL)
+    if not ttl:
+        return []
+
+    networks = parse_networks(addresses)
+    paths = glob.glob(f'{glob.escape(get_index_prefix(app_config=app_config))}*.json')
+    indexes = [IpIndex.load(path=path, ttl=ttl) for path in paths]
+    found_instances = {}
+    for index in sorted((index for index in indexes if index is not None), key=lambda index: index.saved_at):
+        for instance in index.lookup(networks=networks):
+            found_instances[instance['instance_id']] = instance
+
+    return list(found_instances.values())
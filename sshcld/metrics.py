@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""OpenMetrics export of inventory and cloud API fetch metrics"""
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import sys
+import threading
+import time
+
+import botocore.exceptions
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+DEFAULT_METRICS_ADDRESS = '127.0.0.1'
+DEFAULT_REFRESH_INTERVAL = 60
+
+METRIC_FAMILIES = {
+    'sshcld_instances': ('gauge', 'Number of cloud servers by region and state'),
+    'sshcld_instances_by_tag': ('gauge', 'Number of cloud servers by printable tag value'),
+    'sshcld_region_fetch_seconds': ('gauge', 'Time spent in cloud API calls for the region during the last fetch'),
+    'sshcld_fetch_seconds': ('gauge', 'Duration of the last inventory fetch'),
+    'sshcld_last_fetch_timestamp_seconds': ('gauge', 'Time of the last successful inventory fetch'),
+    'sshcld_api_calls': ('counter', 'Number of cloud API calls'),
+    'sshcld_pages': ('counter', 'Number of received cloud API pages'),
+    'sshcld_api_errors': ('counter', 'Number of failed cloud API calls'),
+    'sshcld_fetch_errors': ('counter', 'Number of failed inventory fetches'),
+    'sshcld_region_up': ('gauge', 'Whether the region responded during the last fetch'),
+    'sshcld_region_errors': ('counter', 'Number of failed and timed out region requests'),
+    'sshcld_cache_hits': ('counter', 'Number of cache lookups answered from the cache'),
+    'sshcld_cache_misses': ('counter', 'Number of cache lookups that required cloud API calls'),
+    'sshcld_cache_hit_ratio': ('gauge', 'Ratio of cache hits to all cache lookups'),
+}
+
+
+def escape_label_value(value=None):
+    """Escape label value according to OpenMetrics text format"""
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_sample(name=None, labels=None, value=0):
+    """Format one metric sample line"""
+
+    labels_text = ''
+    if labels:
+        labels_text = '{' + ','.join(f'{label}="{escape_label_value(label_value)}"'
+                                     for label, label_value in labels) + '}'
+
+    return f'{name}{labels_text} {value}'
+
+
+class InventoryMetrics:
+    """In-memory metrics registry filled during inventory fetches
+
+    Counters are cumulative for the lifetime of the registry, gauges describe the last fetch.
+    All samples are changed and rendered under one lock, so metrics can be rendered while they are refreshed.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def get_key(name=None, labels=None):
+        """Get sample key (metric name and sorted labels)"""
+
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name=None, labels=None, value=1):
+        """Increase counter"""
+
+        key = self.get_key(name=name, labels=labels)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+    def set(self, name=None, labels=None, value=0):
+        """Set gauge (or counter tracked elsewhere) value"""
+
+        with self.lock:
+            self.samples[self.get_key(name=name, labels=labels)] = value
+
+    def reset(self, name=None):
+        """Remove all samples of the metric"""
+
+        with self.lock:
+            for key in [key for key in self.samples if key[0] == name]:
+                del self.samples[key]
+
+    def get_total(self, name=None):
+        """Get sum of all samples of the metric"""
+
+        with self.lock:
+            return sum(value for (sample_name, _), value in self.samples.items() if sample_name == name)
+
+    def observe_call(self, region_name=None, operation_name=None, duration=0.0, failed=False, page=False):
+        """Account one cloud API call"""
+
+        labels = {'region': region_name or '', 'operation': operation_name}
+        self.inc(name='sshcld_api_calls', labels=labels)
+        if failed:
+            self.inc(name='sshcld_api_errors', labels=labels)
+        if page:
+            self.inc(name='sshcld_pages', labels={'region': region_name or ''})
+        self.inc(name='sshcld_region_fetch_seconds', labels={'region': region_name or ''}, value=duration)
+
+    def observe_instances(self, instances=None, printable_tags=None):
+        """Replace instance count gauges with counts of the fetched cloud servers"""
+
+        by_state = Counter()
+        by_tag = Counter()
+        for instance in instances:
+            by_state[(instance.get('region'), instance.get('instance_state'))] += 1
+            for tag in printable_tags or []:
+                if (instance.get('tags') or {}).get(tag):
+                    by_tag[(tag, instance['tags'][tag])] += 1
+
+        with self.lock:
+            self.reset(name='sshcld_instances')
+            self.reset(name='sshcld_instances_by_tag')
+            for (region, state), count in by_state.items():
+                self.set(name='sshcld_instances', labels={'region': region, 'state': state}, value=count)
+            for (tag, tag_value), count in by_tag.items():
+                self.set(name='sshcld_instances_by_tag', labels={'tag': tag, 'value': tag_value}, value=count)
+
+    def observe_statuses(self, statuses=None):
+        """Replace region up gauges with statuses of the last fetch and account failed regions"""
+
+        with self.lock:
+            self.reset(name='sshcld_region_up')
+            for region, status in (statuses or {}).items():
+                failed = status['status'] != 'ok'
+                self.set(name='sshcld_region_up', labels={'region': region}, value=0 if failed else 1)
+                if failed:
+                    self.inc(name='sshcld_region_errors', labels={'region': region, 'status': status['status']})
+
+    def set_cache_stats(self, cache_name=None, hits=0, misses=0):
+        """Set cache lookup counters and hit ratio"""
+
+        labels = {'cache': cache_name}
+        with self.lock:
+            self.set(name='sshcld_cache_hits', labels=labels, value=hits)
+            self.set(name='sshcld_cache_misses', labels=labels, value=misses)
+            if hits + misses:
+                self.set(name='sshcld_cache_hit_ratio', labels=labels, value=round(hits / (hits + misses), 6))
+
+    def render(self):
+        """Render all metrics in OpenMetrics text format"""
+
+        with self.lock:
+            all_samples = list(self.samples.items())
+
+        lines = []
+        for name, (metric_type, help_text) in METRIC_FAMILIES.items():
+            samples = sorted((labels, value) for (sample_name, labels), value in all_samples if sample_name == name)
+            if not samples:
+                continue
+
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'# HELP {name} {help_text}')
+            sample_name = f'{name}_total' if metric_type == 'counter' else name
+            for labels, value in samples:
+                if isinstance(value, float):
+                    value = round(value, 6)
+                lines.append(format_sample(name=sample_name, labels=labels, value=value))
+
+        lines.append('# EOF')
+
+        return '\n'.join(lines) + '\n'
+
+
+# pylint: disable=R0903
+class MetricsPaginator:
+    """Paginator wrapper which accounts every received page as an API call"""
+
+    def __init__(self, paginator=None, client=None, operation_name=None):
+        self.paginator = paginator
+        self.client = client
+        self.operation_name = operation_name
+
+    def paginate(self, **params):
+        """Yield pages and measure time of each page request"""
+
+        pages = iter(self.paginator.paginate(**params))
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError):
+                self.client.observe_call(operation_name=self.operation_name, started=started, failed=True)
+                raise
+
+            self.client.observe_call(operation_name=self.operation_name, started=started, page=True)
+            yield page
+
+
+class MetricsClient:
+    """EC2 client wrapper which accounts API calls, pages, errors and latency"""
+
+    def __init__(self, client=None, metrics=None, region_name=None):
+        self.client = client
+        self.metrics = metrics
+        self.region_name = region_name
+
+    def observe_call(self, operation_name=None, started=0.0, failed=False, page=False):
+        """Account API call started at the specified time"""
+
+        self.metrics.observe_call(region_name=self.region_name, operation_name=operation_name,
+                                  duration=time.perf_counter() - started, failed=failed, page=page)
+
+    def describe_regions(self, **params):
+        """Call DescribeRegions"""
+
+        started = time.perf_counter()
+        try:
+            response = self.client.describe_regions(**params)
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError):
+            self.observe_call(operation_name='describe_regions', started=started, failed=True)
+            raise
+
+        self.observe_call(operation_name='describe_regions', started=started)
+
+        return response
+
+    def get_paginator(self, operation_name=None):
+        """Get paginator which accounts pages"""
+
+        return MetricsPaginator(paginator=self.client.get_paginator(operation_name), client=self,
+                                operation_name=operation_name)
+
+
+# pylint: disable=R0903
+class MetricsSession:
+    """boto3 session wrapper which creates clients with metrics"""
+
+    def __init__(self, session=None, metrics=None):
+        self.session = session
+        self.metrics = metrics
+        self.profile_name = session.profile_name
+        self.region_name = session.region_name
+
+    def client(self, service_name=None, region_name=None):
+        """Create client with metrics"""
+
+        return MetricsClient(client=self.session.client(service_name, region_name=region_name),
+                             metrics=self.metrics, region_name=region_name)
+
+
+def create_metrics_server(address=DEFAULT_METRICS_ADDRESS, port=0, collect=None):
+    """Create HTTP server which returns collect() result on /metrics"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Handler of metrics requests"""
+
+        # pylint: disable=C0103
+        def do_GET(self):
+            """Return metrics"""
+
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+
+            content = collect().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        # pylint: disable=W0622
+        def log_message(self, format, *args):
+            """Don't log requests to stderr"""
+
+    return HTTPServer((address, port), MetricsHandler)
+
+
+def start_refresh_thread(refresh=None, interval=DEFAULT_REFRESH_INTERVAL):
+    """Call refresh() every interval seconds in a daemon thread
+
+    Errors are logged and the thread keeps running, so the previously collected metrics are served.
+    """
+
+    def refresh_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh()
+            except Exception as error:  # pylint: disable=W0703
+                print(f'Metrics cannot be refreshed, previous metrics are served: {error!r}', file=sys.stderr)
+
+    thread = threading.Thread(target=refresh_forever, daemon=True)
+    thread.start()
+
+    return thread
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""Built-in pager that renders only the visible window of a large table"""
+
+COLUMN_SEPARATOR = '  '
+
+
+def format_value(value=None):
+    """Convert table cell value to string the same way as tabulate does for empty values"""
+
+    if value is None:
+        return ''
+
+    return str(value)
+
+
+# pylint: disable=R0902
+class TablePager:
+    """Table view over in-memory list of instances
+
+    Only rows inside the current window are formatted, so the cost of rendering a screen doesn't depend on
+    the total number of instances.
+    """
+
+    def __init__(self, instances=None, headers=None):
+        self.instances = instances if instances is not None else []
+        self.headers = dict(headers) if headers is not None else {}
+
+        if self.instances:
+            self.headers = {column: name for column, name in self.headers.items() if column in self.instances[0]}
+            for column in self.instances[0]:
+                if column not in self.headers:
+                    self.headers[column] = column
+
+        self.columns = list(self.headers)
+        self.hidden_columns = set()
+        self.column_widths = {}
+        self.row_offset = 0
+        self.column_offset = 0
+        self.search_term = None
+        self.match_row = None
+
+    def visible_columns(self):
+        """Get list of columns that are not hidden, starting from the current horizontal offset"""
+
+        columns = [column for column in self.columns if column not in self.hidden_columns]
+
+        return columns[self.column_offset:]
+
+    def column_width(self, column=None):
+        """Get column width (calculated once per column and cached)"""
+
+        if column not in self.column_widths:
+            width = len(self.headers.get(column, column))
+            for instance in self.instances:
+                width = max(width, len(format_value(instance.get(column))))
+            self.column_widths[column] = width
+
+        return self.column_widths[column]
+
+    def format_row(self, values=None, columns=None):
+        """Format one table row"""
+
+        cells = [format_value(value).ljust(self.column_width(column)) for column, value in zip(columns, values)]
+
+        return COLUMN_SEPARATOR.join(cells).rstrip()
+
+    def render(self, height=24, width=None):
+        """Render header and visible rows as list of lines"""
+
+        columns = self.visible_columns()
+        header_line = self.format_row(values=[self.headers[column] for column in columns], columns=columns)
+        separator_line = COLUMN_SEPARATOR.join('-' * self.column_width(column) for column in columns)
+
+        lines = [header_line, separator_line]
+        for instance in self.instances[self.row_offset:self.row_offset + self.page_size(height)]:
+            lines.append(self.format_row(values=[instance.get(column) for column in columns], columns=columns))
+
+        if width is not None:
+            lines = [line[:width] for line in lines]
+
+        return lines
+
+    @staticmethod
+    def page_size(height=24):
+        """Get number of table rows fitting into the screen (header, separator and status lines excluded)"""
+
+        return max(height - 3, 1)
+
+    def jump(self, row=0, height=24):
+        """Move window so the specified row is the first visible one"""
+
+        last_offset = max(len(self.instances) - self.page_size(height), 0)
+        self.row_offset = min(max(row, 0), last_offset)
+        self.match_row = None
+
+    def scroll(self, rows=1, height=24):
+        """Scroll window up (negative) or down (positive)"""
+
+        self.jump(row=self.row_offset + rows, height=height)
+
+    def scroll_columns(self, columns=1):
+        """Scroll window left (negative) or right (positive) by whole columns"""
+
+        visible_count = len([column for column in self.columns if column not in self.hidden_columns])
+        self.column_offset = min(max(self.column_offset + columns, 0), max(visible_count - 1, 0))
+
+    def toggle_column(self, index=0):
+        """Hide or show column by its position in the full list of columns"""
+
+        if index < 0 or index >= len(self.columns):
+            return
+
+        column = self.columns[index]
+        if column in self.hidden_columns:
+            self.hidden_columns.remove(column)
+        elif len(self.hidden_columns) < len(self.columns) - 1:
+            self.hidden_columns.add(column)
+
+        self.column_offset = 0
+
+    def search(self, term=None, forward=True, height=24):
+        """Find next (or previous) row containing the term in any visible column and jump to it
+
+        Search starts from the previous match (or from the first visible row if the window was moved since then).
+        Returns index of the found row or None.
+        """
+
+        if term is not None:
+            self.search_term = term.lower()
+        if not self.search_term or not self.instances:
+            return None
+
+        columns = [column for column in self.columns if column not in self.hidden_columns]
+        total = len(self.instances)
+        step = 1 if forward else -1
+
+        start = self.row_offset if self.match_row is None else self.match_row
+
+        for shift in range(1, total + 1):
+            index = (start + shift * step) % total
+            instance = self.instances[index]
+            if any(self.search_term in format_value(instance.get(column)).lower() for column in columns):
+                self.jump(row=index, height=height)
+                self.match_row = index
+                return index
+
+        return None
+
+    def status_line(self, height=24):
+        """Get status line shown at the bottom of the screen"""
+
+        last_row = min(self.row_offset + self.page_size(height), len(self.instances))
+        columns_help = ' '.join(f'{index + 1}:{self.headers[column]}'
+                                f'{"(hidden)" if column in self.hidden_columns else ""}'
+                                for index, column in enumerate(self.columns[:9]))
+
+        return (f'Rows {self.row_offset + 1}-{last_row} of {len(self.instances)} | '
+                f'q:quit /:search n/N:next/prev g/G:top/bottom ::jump | {columns_help}')
+
+
+def prompt(screen=None, text=''):
+    """Read a line of user input at the bottom of the screen"""
+
+    import curses  # pylint: disable=C0415
+
+    height, width = screen.getmaxyx()
+    screen.move(height - 1, 0)
+    screen.clrtoeol()
+    screen.addstr(height - 1, 0, text[:width - 1])
+    curses.echo()
+    try:
+        value = screen.getstr(height - 1, len(text)).decode('utf-8', errors='ignore')
+    finally:
+        curses.noecho()
+
+    return value
+
+
+def handle_key(pager=None, screen=None, key=None, height=24):
+    """Apply pressed key to the pager state. Returns False when pager should be closed"""
+
+    import curses  # pylint: disable=C0415
+
+    actions = {
+        ord('j'): lambda: pager.scroll(1, height), curses.KEY_DOWN: lambda: pager.scroll(1, height),
+        ord('k'): lambda: pager.scroll(-1, height), curses.KEY_UP: lambda: pager.scroll(-1, height),
+        ord(' '): lambda: pager.scroll(pager.page_size(height), height),
+        curses.KEY_NPAGE: lambda: pager.scroll(pager.page_size(height), height),
+        ord('b'): lambda: pager.scroll(-pager.page_size(height), height),
+        curses.KEY_PPAGE: lambda: pager.scroll(-pager.page_size(height), height),
+        ord('g'): lambda: pager.jump(0, height), curses.KEY_HOME: lambda: pager.jump(0, height),
+        ord('G'): lambda: pager.jump(len(pager.instances), height),
+        curses.KEY_END: lambda: pager.jump(len(pager.instances), height),
+        ord('l'): lambda: pager.scroll_columns(1), curses.KEY_RIGHT: lambda: pager.scroll_columns(1),
+        ord('h'): lambda: pager.scroll_columns(-1), curses.KEY_LEFT: lambda: pager.scroll_columns(-1),
+        ord('n'): lambda: pager.search(forward=True, height=height),
+        ord('N'): lambda: pager.search(forward=False, height=height),
+    }
+
+    if key in (ord('q'), 27):
+        return False
+
+    if key in actions:
+        actions[key]()
+    elif ord('1') <= key <= ord('9'):
+        pager.toggle_column(key - ord('1'))
+    elif key == ord('/'):
+        pager.search(term=prompt(screen=screen, text='/'), height=height)
+    elif key == ord(':'):
+        row = prompt(screen=screen, text=':')
+        if row.isdigit():
+            pager.jump(int(row) - 1, height)
+
+    return True
+
+
+def run_pager(instances=None, headers=None):
+    """Show interactive pager in the terminal"""
+
+    import curses  # pylint: disable=C0415
+
+    pager = TablePager(instances=instances, headers=headers)
+
+    def main_loop(screen):
+        curses.curs_set(0)
+        while True:
+            height, width = screen.getmaxyx()
+            screen.erase()
+            for line_number, line in enumerate(pager.render(height=height, width=width - 1)):
+                screen.addstr(line_number, 0, line)
+            screen.addstr(height - 1, 0, pager.status_line(height=height)[:width - 1], curses.A_REVERSE)
+            screen.refresh()
+
+            if not handle_key(pager=pager, screen=screen, key=screen.getch(), height=height):
+                break
+
+    curses.wrapper(main_loop)
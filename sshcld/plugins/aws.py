@@ -2,23 +2,38 @@
 
 """Get list of servers from AWS cloud"""
 
+import threading
+
 import botocore
+import botocore.config
+import botocore.session
 import boto3
 
 from sshcld.errors import AwsApiError
+from sshcld import ipindex
+
+# Maximum number of values in one EC2 API filter
+INSTANCE_IDS_CHUNK_SIZE = 200
 
 
 def parse_filters(filters=None):
-    """Parse filters defined by user"""
+    """Parse filters defined by user (string or dictionary tag -> list of allowed values)"""
 
     filters_list = []
 
     if filters is None:
         return []
 
+    if isinstance(filters, dict):
+        return [{'Name': f'tag:{tag}', 'Values': list(values)} for tag, values in filters.items()]
+
     if not isinstance(filters, str):
         return []
 
+    if filters.strip().startswith('FILTER_INSTANCE_ID='):
+        instance_ids = filters.strip()[len('FILTER_INSTANCE_ID='):].split(',')
+        return list(dict.fromkeys(instance_id.strip() for instance_id in instance_ids if instance_id.strip()))
+
     conditions = filters.strip().split(',')
 
     if conditions:
@@ -42,57 +57,125 @@ def parse_filters(filters=None):
     return filters_list
 
 
-def parse_instances(instances=None, region_name='us-east-1'):
-    """Parse list of EC2 instances returned by AWS API"""
+def parse_instance_data(instance=None, region_name='us-east-1'):
+    """Parse one EC2 instance from raw DescribeInstances response"""
+
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags') or []}
+    launch_time = instance.get('LaunchTime')
 
-    instances_list = []
+    return {
+        'instance_id': instance.get('InstanceId', 'unknown'),
+        'instance_name': tags.get('Name', ''),
+        'region': region_name,
+        'instance_state': (instance.get('State') or {}).get('Name', 'unknown'),
+        'private_ip_address': instance.get('PrivateIpAddress'),
+        'public_ip_address': instance.get('PublicIpAddress'),
+        'launch_time': launch_time.isoformat() if hasattr(launch_time, 'isoformat') else launch_time,
+        'tags': tags,
+    }
 
-    if instances is None:
-        return {}
+
+def get_session(profile_name=None, credential_cache=None):
+    """Create boto3 session for the cloud profile
+
+    If credential_cache (dictionary-like object) is specified, credentials of assumed roles are cached in it,
+    so STS AssumeRole call (and MFA prompt) is not repeated until credentials expire.
+    """
 
     try:
-        for instance in instances:
+        botocore_session = botocore.session.Session(profile=profile_name or None)
+        if credential_cache is not None:
+            credential_provider = botocore_session.get_component('credential_provider')
+            credential_provider.get_provider('assume-role').cache = credential_cache
+        return boto3.Session(botocore_session=botocore_session)
+    except botocore.exceptions.ProfileNotFound as error:
+        raise AwsApiError(error) from error
 
-            try:
-                instance_name = next(tag['Value'] for tag in instance.tags if tag['Key'] == 'Name')
-            except (StopIteration, TypeError):
-                instance_name = ''
-            except AttributeError:
-                return {}
 
-            try:
-                tags = {}
-                if instance.tags:
-                    for tag in instance.tags:
-                        tags[tag['Key']] = tag['Value']
+def get_client_config(timeout=None):
+    """Get botocore client configuration with connect and read timeouts (in seconds)"""
 
-                instances_list.append(
-                    {
-                        'instance_id': instance.instance_id,
-                        'instance_name': instance_name,
-                        'region': region_name,
-                        'instance_state': instance.state.get('Name', 'unknown'),
-                        'private_ip_address': instance.private_ip_address,
-                        'public_ip_address': instance.public_ip_address,
-                        'tags': tags,
-                    }
-                )
-            except AttributeError:
-                instances_list.append(
-                    {
-                        'instance_id': 'unknown',
-                        'instance_name': instance_name,
-                        'instance_state': 'unknown',
-                        'region': region_name,
-                        'private_ip_address': 'unknown',
-                        'public_ip_address': 'unknown',
-                        'tags': [],
-                    }
-                )
+    if timeout is None:
+        return None
+
+    return botocore.config.Config(connect_timeout=timeout, read_timeout=timeout)
+
+
+# pylint: disable=R0903
+class CachedClientsSession:
+    """boto3 session wrapper which creates only one client per service and region
+
+    Clients keep their HTTP connections open, so repeated requests (e.g. in watch mode) don't pay for
+    client creation and new TLS connections. Clients are created under lock, so the session can be used
+    from several threads.
+    """
 
-    except (botocore.exceptions.NoCredentialsError, botocore.exceptions.EndpointConnectionError,
+    def __init__(self, session=None, client_config=None):
+        self.session = session
+        self.client_config = client_config
+        self.profile_name = session.profile_name
+        self.region_name = session.region_name
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def client(self, service_name=None, region_name=None):
+        """Get client for the service and region (created on first use)"""
+
+        with self.lock:
+            if (service_name, region_name) not in self.clients:
+                self.clients[(service_name, region_name)] = self.session.client(service_name, region_name=region_name,
+                                                                                config=self.client_config)
+
+        return self.clients[(service_name, region_name)]
+
+
+def get_regions(region_name='us-east-1', session=None):
+    """Get list of regions to check"""
+
+    if session is None:
+        session = get_session()
+
+    if region_name is None:
+        return [session.region_name]
+
+    if region_name != 'all':
+        return region_name.strip().split(',')
+
+    try:
+        region_client = session.client('ec2', region_name='us-east-1')
+        return [region.get('RegionName') for region in region_client.describe_regions().get('Regions', [])]
+    except (botocore.exceptions.NoRegionError, botocore.exceptions.NoCredentialsError,
+            botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError,
             botocore.exceptions.UnauthorizedSSOTokenError) as error:
-        print(error)  # error message is not shown without print
+        raise AwsApiError(error) from error
+    except botocore.exceptions.ClientError as error:
+        raise AwsApiError(error.response.get('Error', {}).get('Message', error)) from error
+
+
+def iter_region_pages(region_name='us-east-1', filters_list=None, session=None):
+    """Yield raw DescribeInstances pages for one region"""
+
+    if session is None:
+        session = get_session()
+
+    try:
+        ec2_client = session.client('ec2', region_name=region_name)
+    except botocore.exceptions.NoRegionError as error:
+        raise AwsApiError(error) from error
+
+    if filters_list and isinstance(filters_list[0], str):
+        requests_filters = [[{'Name': 'instance-id', 'Values': filters_list[index:index + INSTANCE_IDS_CHUNK_SIZE]}]
+                            for index in range(0, len(filters_list), INSTANCE_IDS_CHUNK_SIZE)]
+    else:
+        requests_filters = [filters_list or []]
+
+    try:
+        for request_filters in requests_filters:
+            yield from ec2_client.get_paginator('describe_instances').paginate(
+                Filters=request_filters, DryRun=False, PaginationConfig={'PageSize': 1000})
+
+    except (botocore.exceptions.NoCredentialsError, botocore.exceptions.ConnectionError,
+            botocore.exceptions.HTTPClientError, botocore.exceptions.UnauthorizedSSOTokenError) as error:
         raise AwsApiError(error) from error
 
     except botocore.exceptions.ClientError as error:
@@ -100,61 +183,171 @@ def parse_instances(instances=None, region_name='us-east-1'):
             error_message = error.response['Error']['Message']
             error_code = error.response['Error']['Code']
             if error_code in ('InvalidInstanceID.NotFound', 'InvalidInstanceID.Malformed'):
-                return []
+                return
         except KeyError:
             error_message = error
         raise AwsApiError(error_message) from error
 
-    return instances_list
 
+def iter_region_instances(region_name='us-east-1', filters_list=None, session=None):
+    """Yield EC2 instances of one region"""
 
-def get_instances(region_name='us-east-1', filters=None, profile_name=None):
-    """Make AWS API call to get list of EC2 instances"""
+    for page in iter_region_pages(region_name=region_name, filters_list=filters_list, session=session):
+        for reservation in page.get('Reservations', []):
+            for instance in reservation.get('Instances', []):
+                yield parse_instance_data(instance=instance, region_name=region_name)
 
-    full_instances_list = []
 
-    filters_list = parse_filters(filters)
+def iter_region_safely(region_name=None, instances=None, failed_regions=None):
+    """Yield EC2 instances of one region
 
-    if region_name == 'all':
-        try:
-            region_session = boto3.Session(profile_name=profile_name)
-            region_client = region_session.client('ec2', region_name='us-east-1')
-            regions_list = [region.get('RegionName') for region in region_client.describe_regions().get('Regions', [])]
-        except botocore.exceptions.NoRegionError as error:
-            raise AwsApiError(error) from error
-        except botocore.exceptions.ProfileNotFound as error:
-            raise AwsApiError(error) from error
-    else:
-        regions_list = region_name.strip().split(',')
+    If failed_regions dictionary is specified, AwsApiError is recorded there (region -> error) instead of raising,
+    so other regions can still be requested.
+    """
 
-    for region in regions_list:
+    try:
+        yield from instances
+    except AwsApiError as error:
+        if failed_regions is None:
+            raise
+        failed_regions[region_name] = error
 
-        try:
-            if profile_name is not None and profile_name:
-                boto3.setup_default_session(profile_name=profile_name)
-            ec2 = boto3.resource('ec2', region_name=region)
-        except botocore.exceptions.NoRegionError as error:
-            raise AwsApiError(error) from error
-        except botocore.exceptions.ProfileNotFound as error:
-            raise AwsApiError(error) from error
-
-        if len(filters_list) == 1 and isinstance(filters_list[0], str):
-            instances = ec2.instances.filter(
-                InstanceIds=filters_list,
-                DryRun=False,
-            )
+
+def find_known_instances(instance_ids=None, region_name='us-east-1', session=None, locations=None):
+    """Split instance IDs using locations cache
+
+    Returns fresh cached instances and IDs of other known instances grouped by their last known region.
+    """
+
+    cached_instances = []
+    known_regions = {}
+
+    requested_regions = None
+    if region_name != 'all':
+        requested_regions = get_regions(region_name=region_name, session=session)
+
+    for instance_id in instance_ids:
+        location = locations.get(instance_id=instance_id, profile_name=session.profile_name)
+        if location is None or (requested_regions is not None and location['region'] not in requested_regions):
+            continue
+        if locations.is_fresh(location=location):
+            cached_instances.append(locations.get_instance(location=location))
         else:
-            instances = ec2.instances.filter(
-                Filters=filters_list,
-                DryRun=False,
-                MaxResults=1000,
-            )
+            known_regions.setdefault(location['region'], []).append(instance_id)
 
-        try:
-            instances_list = parse_instances(instances=instances, region_name=region)
-        except AwsApiError as error:
-            raise AwsApiError from error
+    return cached_instances, known_regions
+
+
+def iter_instances_by_ids(instance_ids=None, region_name='us-east-1', session=None, locations=None,
+                          failed_regions=None):
+    """Yield EC2 instances with specified IDs
+
+    Last known region of each instance is taken from locations cache: fresh cached instances are returned without
+    API calls, other known instances are requested with one call per region. Only unknown instances (and known
+    instances that weren't found in their last region) are searched in all requested regions, and the search stops
+    as soon as all of them are found. Errors of regions are handled as in iter_region_safely.
+    """
+
+    remaining_ids = list(dict.fromkeys(instance_ids or []))
+    known_regions = {}
+
+    def found(instance):
+        remaining_ids.remove(instance['instance_id'])
+        if locations is not None:
+            locations.update(instance=instance, profile_name=session.profile_name)
+        return instance
+
+    try:
+        if locations is not None:
+            cached_instances, known_regions = find_known_instances(instance_ids=remaining_ids, region_name=region_name,
+                                                                   session=session, locations=locations)
+            for instance in cached_instances:
+                remaining_ids.remove(instance['instance_id'])
+                yield instance
+
+        for region, region_ids in known_regions.items():
+            region_instances = iter_region_instances(region_name=region, filters_list=region_ids, session=session)
+            for instance in iter_region_safely(region_name=region, instances=region_instances,
+                                               failed_regions=failed_regions):
+                if instance['instance_id'] in remaining_ids:
+                    yield found(instance)
+
+        for region in get_regions(region_name=region_name, session=session) if remaining_ids else []:
+            if failed_regions is not None and region in failed_regions:
+                continue
+            region_instances = iter_region_instances(region_name=region, filters_list=list(remaining_ids),
+                                                     session=session)
+            for instance in iter_region_safely(region_name=region, instances=region_instances,
+                                               failed_regions=failed_regions):
+                if instance['instance_id'] in remaining_ids:
+                    yield found(instance)
+            if not remaining_ids:
+                break
+    finally:
+        if locations is not None:
+            locations.save()
+
+
+def iter_instances_by_ips(addresses=None, region_name='us-east-1', session=None, failed_regions=None):
+    """Yield EC2 instances with IP addresses from the comma-separated list of addresses and CIDRs
+
+    Exact addresses and octet-aligned networks are sent to AWS API as filters, other networks are checked locally.
+    Errors of regions are handled as in iter_region_safely.
+    """
+
+    try:
+        networks = ipindex.parse_networks(addresses)
+    except ValueError as error:
+        raise AwsApiError(error) from error
+
+    requests_filters = ipindex.build_ip_requests(networks=networks)
+    found_ids = set()
+
+    for region in get_regions(region_name=region_name, session=session) if networks else []:
+        for filters_list in requests_filters:
+            if failed_regions is not None and region in failed_regions:
+                break
+            region_instances = iter_region_instances(region_name=region, filters_list=filters_list, session=session)
+            for instance in iter_region_safely(region_name=region, instances=region_instances,
+                                               failed_regions=failed_regions):
+                if instance['instance_id'] in found_ids:
+                    continue
+                if ipindex.instance_matches_networks(instance=instance, networks=networks):
+                    found_ids.add(instance['instance_id'])
+                    yield instance
+
+
+def iter_instances(region_name='us-east-1', filters=None, session=None, locations=None, failed_regions=None):
+    """Yield EC2 instances one by one as soon as API pages arrive
+
+    If failed_regions dictionary is specified, errors of regions are recorded there (region -> error) and other
+    regions are still requested.
+    """
+
+    if session is None:
+        session = get_session()
+
+    if isinstance(filters, str) and filters.strip().startswith('FILTER_IP_ADDRESS='):
+        yield from iter_instances_by_ips(addresses=filters.strip()[len('FILTER_IP_ADDRESS='):],
+                                         region_name=region_name, session=session, failed_regions=failed_regions)
+        return
+
+    filters_list = parse_filters(filters)
+
+    if filters_list and isinstance(filters_list[0], str):
+        yield from iter_instances_by_ids(instance_ids=filters_list, region_name=region_name, session=session,
+                                         locations=locations, failed_regions=failed_regions)
+        return
+
+    for region in get_regions(region_name=region_name, session=session):
+        region_instances = iter_region_instances(region_name=region, filters_list=filters_list, session=session)
+        yield from iter_region_safely(region_name=region, instances=region_instances, failed_regions=failed_regions)
+
+
+def get_instances(region_name='us-east-1', filters=None, profile_name=None, session=None, locations=None):
+    """Make AWS API call to get list of EC2 instances"""
 
-        full_instances_list += instances_list
+    if session is None:
+        session = get_session(profile_name=profile_name)
 
-    return full_instances_list
+    return list(iter_instances(region_name=region_name, filters=filters, session=session, locations=locations))
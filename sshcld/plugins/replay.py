@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+"""Record raw AWS API responses and replay them without AWS
+
+Recording session wraps boto3 session and saves DescribeRegions and DescribeInstances pages to a directory.
+Replay session reads them back and can be used by the AWS plugin instead of boto3 session. Replay session
+injects per-call latency, jitter and throttling (throttled calls are retried with exponential backoff like
+botocore does), so concurrency and caching can be benchmarked without AWS.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import botocore
+
+from sshcld import cache
+
+
+def serialize_value(value=None):
+    """Convert values which are not supported by JSON (datetime) to strings"""
+
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+
+    return str(value)
+
+
+def get_record_path(directory=None, region_name=None, operation_name=None, params=None):
+    """Get file path for recorded pages of one API request"""
+
+    request_params = {key: value for key, value in (params or {}).items() if key != 'PaginationConfig'}
+    params_key = hashlib.sha1(json.dumps(request_params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    return os.path.join(directory, f'{region_name}-{operation_name}-{params_key}.json')
+
+
+def save_pages(path=None, pages=None):
+    """Save recorded pages"""
+
+    cache.write_file_atomically(path=path, content=json.dumps(pages, default=serialize_value).encode('utf-8'))
+
+
+# pylint: disable=R0903
+class RecordingPaginator:
+    """Paginator wrapper which saves all pages after the last one is received"""
+
+    def __init__(self, paginator=None, directory=None, region_name=None, operation_name=None):
+        self.paginator = paginator
+        self.directory = directory
+        self.region_name = region_name
+        self.operation_name = operation_name
+
+    def paginate(self, **params):
+        """Yield pages and record them"""
+
+        pages = []
+        for page in self.paginator.paginate(**params):
+            pages.append(page)
+            yield page
+
+        save_pages(path=get_record_path(directory=self.directory, region_name=self.region_name,
+                                        operation_name=self.operation_name, params=params), pages=pages)
+
+
+class RecordingClient:
+    """EC2 client wrapper which records responses"""
+
+    def __init__(self, client=None, directory=None, region_name=None):
+        self.client = client
+        self.directory = directory
+        self.region_name = region_name
+
+    def describe_regions(self, **params):
+        """Call DescribeRegions and record response"""
+
+        response = self.client.describe_regions(**params)
+        save_pages(path=get_record_path(directory=self.directory, region_name=self.region_name,
+                                        operation_name='describe_regions', params=params), pages=[response])
+
+        return response
+
+    def get_paginator(self, operation_name=None):
+        """Get paginator which records pages"""
+
+        return RecordingPaginator(paginator=self.client.get_paginator(operation_name), directory=self.directory,
+                                  region_name=self.region_name, operation_name=operation_name)
+
+
+class RecordingSession:
+    """boto3 session wrapper which records EC2 responses to the directory"""
+
+    def __init__(self, session=None, directory=None):
+        self.session = session
+        self.directory = os.path.expanduser(directory)
+        self.profile_name = session.profile_name
+        self.region_name = session.region_name
+        os.makedirs(self.directory, exist_ok=True)
+
+    def client(self, service_name=None, region_name=None, config=None):
+        """Create recording client"""
+
+        return RecordingClient(client=self.session.client(service_name, region_name=region_name, config=config),
+                               directory=self.directory, region_name=region_name)
+
+
+# pylint: disable=R0903
+class ReplayPaginator:
+    """Paginator which yields recorded pages"""
+
+    def __init__(self, client=None, operation_name=None):
+        self.client = client
+        self.operation_name = operation_name
+
+    def paginate(self, **params):
+        """Yield recorded pages (each page is a separate API call)"""
+
+        yield from self.client.replay(operation_name=self.operation_name, params=params)
+
+
+class ReplayClient:
+    """EC2 client which returns recorded responses with injected latency and throttling
+
+    Random values are taken from the generator of the region and service (see ReplaySession.get_random).
+    """
+
+    def __init__(self, session=None, region_name=None, service_name=None):
+        self.session = session
+        self.region_name = region_name
+        self.random = session.get_random(region_name=region_name, service_name=service_name)
+
+    def get_latency(self):
+        """Get latency of one call (in seconds)"""
+
+        return max(self.session.latency + self.random.uniform(-self.session.jitter, self.session.jitter), 0)
+
+    def call(self, operation_name=None):
+        """Emulate one API call: wait for latency and retry throttled calls"""
+
+        for attempt in range(self.session.max_attempts):
+            time.sleep(self.get_latency())
+            self.session.calls_count += 1
+            if self.random.random() >= self.session.throttle_rate:
+                return
+            time.sleep(self.session.backoff * 2 ** attempt)
+
+        raise botocore.exceptions.ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}},
+                                              operation_name)
+
+    def replay(self, operation_name=None, params=None):
+        """Yield recorded pages of the request"""
+
+        path = get_record_path(directory=self.session.directory, region_name=self.region_name,
+                               operation_name=operation_name, params=params)
+        try:
+            with open(path, 'r', encoding='utf-8') as record_file:
+                pages = json.load(record_file)
+        except (OSError, ValueError) as error:
+            self.call(operation_name=operation_name)
+            raise botocore.exceptions.ClientError(
+                {'Error': {'Code': 'ReplayNotFound',
+                           'Message': f'No recorded response for {operation_name} in {self.region_name}'}},
+                operation_name) from error
+
+        for page in pages:
+            self.call(operation_name=operation_name)
+            yield page
+
+    def describe_regions(self, **params):
+        """Return recorded DescribeRegions response"""
+
+        return next(self.replay(operation_name='describe_regions', params=params))
+
+    def get_paginator(self, operation_name=None):
+        """Get paginator which yields recorded pages"""
+
+        return ReplayPaginator(client=self, operation_name=operation_name)
+
+
+# pylint: disable=R0902
+class ReplaySession:
+    """Session which can be used by the AWS plugin instead of boto3 session
+
+    Options: latency and jitter of each call (in seconds), throttle_rate (probability of throttled call),
+    max_attempts and backoff (in seconds) for throttled calls, seed for deterministic random values.
+    """
+
+    def __init__(self, directory=None, options=None, profile_name=None):
+        if options is None:
+            options = {}
+
+        self.directory = os.path.expanduser(directory)
+        self.latency = float(options.get('latency', 0))
+        self.jitter = float(options.get('jitter', 0))
+        self.throttle_rate = float(options.get('throttle_rate', 0))
+        self.max_attempts = int(options.get('max_attempts', 3))
+        self.backoff = float(options.get('backoff', 0.05))
+        self.seed = options.get('seed')
+        self.randoms = {}
+        self.randoms_lock = threading.Lock()
+        self.profile_name = profile_name or 'default'
+        self.region_name = 'us-east-1'
+        self.calls_count = 0
+
+    def get_random(self, region_name=None, service_name=None):
+        """Get random generator of the region and service
+
+        Each generator is seeded with the session seed, region and service and is reused by all clients of them,
+        so seeded replay is deterministic even if several regions are requested from concurrent threads.
+        """
+
+        with self.randoms_lock:
+            if (region_name, service_name) not in self.randoms:
+                seed = self.seed
+                if seed is not None:
+                    seed = f'{seed}:{region_name}:{service_name}'
+                self.randoms[(region_name, service_name)] = random.Random(seed)
+
+            return self.randoms[(region_name, service_name)]
+
+    def client(self, service_name=None, region_name=None):
+        """Create replay client"""
+
+        return ReplayClient(session=self, region_name=region_name, service_name=service_name)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Concurrent TCP reachability and latency probes"""
+
+import asyncio
+import time
+
+DEFAULT_PROBE_PORT = 22
+DEFAULT_PROBE_TIMEOUT = 2.0
+DEFAULT_PROBE_CONCURRENCY = 500
+DEFAULT_PROBE_ADDRESS = 'private_ip_address'
+
+
+async def probe_address(address=None, port=DEFAULT_PROBE_PORT, timeout=DEFAULT_PROBE_TIMEOUT, semaphore=None):
+    """Open TCP connection to the address. Returns connection latency (in seconds) or None if not reachable"""
+
+    async with semaphore:
+        started_at = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout=timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        latency = time.monotonic() - started_at
+        writer.close()
+
+    return latency
+
+
+async def probe_endpoints_async(endpoints=None, timeout=DEFAULT_PROBE_TIMEOUT, concurrency=DEFAULT_PROBE_CONCURRENCY):
+    """Probe all (address, port) endpoints concurrently (not more than concurrency probes at once)"""
+
+    semaphore = asyncio.Semaphore(concurrency)
+    endpoints = list(endpoints)
+    latencies = await asyncio.gather(*[probe_address(address=address, port=port, timeout=timeout,
+                                                     semaphore=semaphore) for address, port in endpoints])
+
+    return dict(zip(endpoints, latencies))
+
+
+def probe_endpoints(endpoints=None, timeout=DEFAULT_PROBE_TIMEOUT, concurrency=DEFAULT_PROBE_CONCURRENCY):
+    """Probe all (address, port) endpoints concurrently. Returns dict endpoint -> latency (in seconds) or None"""
+
+    endpoints = set(endpoints or [])
+    if not endpoints:
+        return {}
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(probe_endpoints_async(endpoints=endpoints, timeout=timeout,
+                                                             concurrency=concurrency))
+    finally:
+        loop.close()
+
+
+def probe_addresses(addresses=None, port=DEFAULT_PROBE_PORT, timeout=DEFAULT_PROBE_TIMEOUT,
+                    concurrency=DEFAULT_PROBE_CONCURRENCY):
+    """Probe all addresses concurrently. Returns dict address -> latency (in seconds) or None"""
+
+    latencies = probe_endpoints(endpoints=[(address, port) for address in addresses or []], timeout=timeout,
+                                concurrency=concurrency)
+
+    return {address: latency for (address, _), latency in latencies.items()}
+
+
+def get_probe_address(instance=None, address_field=DEFAULT_PROBE_ADDRESS):
+    """Get instance address for probing (public address is used if instance doesn't have the preferred one)"""
+
+    for field in (address_field, 'private_ip_address', 'public_ip_address'):
+        address = instance.get(field)
+        if address and address != 'unknown':
+            return address
+
+    return None
+
+
+def probe_instances(instances=None, app_config=None):
+    """Add reachable and latency properties to each instance"""
+
+    if app_config is None:
+        app_config = {}
+
+    address_field = app_config.get('probe_address', DEFAULT_PROBE_ADDRESS)
+    instances_addresses = [get_probe_address(instance=instance, address_field=address_field)
+                           for instance in instances]
+
+    latencies = probe_addresses(addresses=[address for address in instances_addresses if address],
+                                port=int(app_config.get('probe_port', DEFAULT_PROBE_PORT)),
+                                timeout=float(app_config.get('probe_timeout', DEFAULT_PROBE_TIMEOUT)),
+                                concurrency=int(app_config.get('probe_concurrency', DEFAULT_PROBE_CONCURRENCY)))
+
+    for instance, address in zip(instances, instances_addresses):
+        latency = latencies.get(address)
+        if address is None:
+            instance['reachable'] = ''
+            instance['latency'] = ''
+        elif latency is None:
+            instance['reachable'] = 'no'
+            instance['latency'] = ''
+        else:
+            instance['reachable'] = 'yes'
+            instance['latency'] = f'{latency * 1000:.1f} ms'
+
+    return instances
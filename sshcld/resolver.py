@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""Local DNS responder answering A and PTR queries for cloud servers from the in-memory inventory"""
+
+import ipaddress
+import re
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+DEFAULT_DNS_ADDRESS = '127.0.0.1'
+DEFAULT_DNS_DOMAIN = 'aws.internal'
+DEFAULT_DNS_TTL = 30
+DEFAULT_REFRESH_INTERVAL = 60
+
+TYPE_A = 1
+TYPE_PTR = 12
+CLASS_IN = 1
+RCODE_FORMAT_ERROR = 1
+RCODE_NAME_ERROR = 3
+RCODE_REFUSED = 5
+REVERSE_DOMAIN = 'in-addr.arpa'
+FLAG_TRUNCATED = 0x0200
+MAX_LABEL_LENGTH = 63
+MAX_NAME_LENGTH = 253
+MAX_UDP_RESPONSE_SIZE = 512
+
+
+def get_reverse_name(address=None):
+    """Get PTR query name of IPv4 address (e.g. 1.0.0.10.in-addr.arpa)"""
+
+    return ipaddress.ip_address(address).reverse_pointer
+
+
+def get_host_name(host=None, domain=DEFAULT_DNS_DOMAIN):
+    """Convert cloud server name to valid host name inside the domain. Returns None if it can't be converted
+
+    Each label is lowercased and characters other than letters, digits and hyphens are replaced with hyphens.
+    Names with too long labels or too long in total are not converted (truncated names could collide).
+    """
+
+    labels = [re.sub(r'[^a-z0-9-]+', '-', label.lower()).strip('-') for label in str(host).split('.')]
+    labels = [label for label in labels if label]
+    if not labels or any(len(label) > MAX_LABEL_LENGTH for label in labels):
+        return None
+
+    name = '.'.join(labels + [domain])
+    if len(name) > MAX_NAME_LENGTH:
+        return None
+
+    return name
+
+
+def is_ipv4_address(address=None):
+    """Check if the value is IPv4 address"""
+
+    try:
+        return ipaddress.ip_address(address).version == 4
+    except ValueError:
+        return False
+
+
+class DnsIndex:
+    """Hash indexes of cloud server names and addresses built once per inventory fetch
+
+    Each cloud server is resolved by its name and ID inside the domain, e.g. web01.aws.internal and
+    i-123456.aws.internal. If several cloud servers have the same name, all of their addresses are returned.
+    Cloud servers without IPv4 address (or with other value of the address property) are skipped.
+    """
+
+    def __init__(self, instances=None, domain=DEFAULT_DNS_DOMAIN, address_property='private_ip_address'):
+        self.domain = domain.strip('.').lower()
+        self.instances = list(instances or [])
+        self.addresses = {}
+        self.names = {}
+
+        for instance in self.instances:
+            address = instance.get(address_property)
+            if not is_ipv4_address(address=address):
+                continue
+
+            names = [get_host_name(host=host, domain=self.domain)
+                     for host in (instance.get('instance_name'), instance.get('instance_id')) if host]
+            names = [name for name in names if name is not None]
+            for name in names:
+                addresses = self.addresses.setdefault(name, [])
+                if address not in addresses:
+                    addresses.append(address)
+
+            if names:
+                self.names.setdefault(get_reverse_name(address), names[0])
+
+    def is_authoritative(self, name=None):
+        """Check if the name belongs to the served domain or reverse lookup domain"""
+
+        return any(name == domain or name.endswith(f'.{domain}') for domain in (self.domain, REVERSE_DOMAIN))
+
+    def resolve(self, name=None, query_type=TYPE_A):
+        """Get answers (list of A addresses or PTR names) and response code of the query"""
+
+        if not self.is_authoritative(name=name):
+            return [], RCODE_REFUSED
+
+        if name in self.addresses:
+            return (self.addresses[name] if query_type == TYPE_A else []), 0
+
+        if name in self.names:
+            return ([self.names[name]] if query_type == TYPE_PTR else []), 0
+
+        return [], RCODE_NAME_ERROR
+
+
+def encode_name(name=None):
+    """Encode domain name as a sequence of labels"""
+
+    labels = [label.encode('utf-8') for label in name.strip('.').split('.') if label]
+
+    return b''.join(struct.pack('!B', len(label)) + label for label in labels) + b'\x00'
+
+
+def parse_query(data=None):
+    """Parse DNS query. Returns (query ID, flags, name, query type, query class, end of question section)
+
+    Raises ValueError if the query is malformed.
+    """
+
+    if len(data) < 12:
+        raise ValueError('DNS header is too short')
+
+    query_id, flags, questions_count = struct.unpack('!HHH', data[:6])
+    if questions_count != 1:
+        raise ValueError('Only one question is supported')
+
+    labels = []
+    offset = 12
+    while True:
+        if offset >= len(data):
+            raise ValueError('Question is truncated')
+        length = data[offset]
+        offset += 1
+        if length == 0:
+            break
+        if length > 63 or offset + length > len(data):
+            raise ValueError('Invalid label')
+        labels.append(data[offset:offset + length].decode('ascii', errors='replace').lower())
+        offset += length
+
+    if offset + 4 > len(data):
+        raise ValueError('Question is truncated')
+    query_type, query_class = struct.unpack('!HH', data[offset:offset + 4])
+
+    return query_id, flags, '.'.join(labels), query_type, query_class, offset + 4
+
+
+def encode_record(answer=None, query_type=TYPE_A, ttl=DEFAULT_DNS_TTL):
+    """Encode answer record (IPv4 address for A query, domain name for PTR query)"""
+
+    if query_type == TYPE_A:
+        record_data = ipaddress.ip_address(answer).packed
+    else:
+        record_data = encode_name(name=answer)
+
+    # Name of the answer is a pointer to the question name (offset 12)
+    return struct.pack('!HHHIH', 0xC00C, query_type, CLASS_IN, ttl, len(record_data)) + record_data
+
+
+def build_response(data=None, index=None, ttl=DEFAULT_DNS_TTL):
+    """Build response to the DNS query. Returns None if the query can't be parsed at all"""
+
+    try:
+        query_id, flags, name, query_type, query_class, question_end = parse_query(data=data)
+    except ValueError:
+        if len(data) < 2:
+            return None
+        return data[:2] + struct.pack('!HHHHH', 0x8000 | RCODE_FORMAT_ERROR, 0, 0, 0, 0)
+
+    answers, response_code = [], RCODE_REFUSED
+    if query_class == CLASS_IN and index is not None:
+        answers, response_code = index.resolve(name=name, query_type=query_type)
+
+    records = [encode_record(answer=answer, query_type=query_type, ttl=ttl) for answer in answers]
+
+    # QR and AA flags are set, opcode and RD flag are copied from the query
+    response_flags = 0x8400 | (flags & 0x7900) | response_code
+
+    # Answers which don't fit into UDP response are dropped and TC flag tells the client about it
+    while records and question_end + sum(len(record) for record in records) > MAX_UDP_RESPONSE_SIZE:
+        records.pop()
+        response_flags |= FLAG_TRUNCATED
+    header = struct.pack('!HHHHHH', query_id, response_flags, 1, len(records), 0, 0)
+
+    return header + data[12:question_end] + b''.join(records)
+
+
+def create_dns_server(address=DEFAULT_DNS_ADDRESS, port=0, index=None, ttl=DEFAULT_DNS_TTL):
+    """Create UDP DNS server. Index can be replaced at any time by setting server.index attribute"""
+
+    class DnsHandler(socketserver.BaseRequestHandler):
+        """Handler of DNS queries"""
+
+        def handle(self):
+            """Send response to the query"""
+
+            data, server_socket = self.request
+            response = build_response(data=data, index=self.server.index, ttl=ttl)
+            if response is not None:
+                server_socket.sendto(response, self.client_address)
+
+    server = socketserver.UDPServer((address, port), DnsHandler)
+    server.index = index
+
+    return server
+
+
+def refresh_index(server=None, build_index=None):
+    """Replace server index with build_index(previous index) result
+
+    Any error is logged and the previous index is kept, so the server keeps answering.
+    """
+
+    try:
+        server.index = build_index(server.index)
+    except Exception as error:  # pylint: disable=W0703
+        print(f'DNS records cannot be refreshed, previous records are served: {error!r}', file=sys.stderr)
+
+
+def start_refresh_thread(server=None, build_index=None, interval=DEFAULT_REFRESH_INTERVAL):
+    """Refresh server index every interval seconds in a daemon thread"""
+
+    def refresh():
+        while True:
+            time.sleep(interval)
+            refresh_index(server=server, build_index=build_index)
+
+    thread = threading.Thread(target=refresh, daemon=True)
+    thread.start()
+
+    return thread
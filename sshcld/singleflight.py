@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""Coalescing of identical inventory fetches made by concurrent sshcld processes
+
+The first process takes a lock file in the cache directory, fetches the inventory and saves the result next to
+the lock. Other processes with the same query wait for that result (or serve the previous result if it's fresh
+enough) instead of scanning the same regions again. Lock files are locked with flock (msvcrt.locking on
+Windows).
+"""
+
+import json
+import os
+import time
+
+try:
+    import fcntl
+    msvcrt = None  # pylint: disable=C0103
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt  # pylint: disable=E0401
+
+from sshcld import cache
+
+DEFAULT_SINGLE_FLIGHT_WAIT = 60
+# Configuration options which change the fetch result besides the query itself
+RESULT_OPTIONS = ('aws_replay_dir', 'fetch_deadline', 'region_timeout')
+POLL_INTERVAL = 0.1
+
+
+def get_paths(app_config=None):
+    """Get paths of the lock file and the shared result of the inventory query"""
+
+    directory = os.path.join(cache.get_cache_dir(app_config), 'single-flight')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    query_key = cache.get_query_key(app_config, options=RESULT_OPTIONS)
+
+    return os.path.join(directory, f'{query_key}.lock'), os.path.join(directory, f'{query_key}.json')
+
+
+def acquire_lock(path=None):
+    """Take exclusive lock of the lock file without waiting. Returns open lock file or None if it's locked
+
+    The lock is released by the operating system when the process exits, so a crashed process never leaves
+    a stale lock behind, and lock files are never removed (removing them would race with other processes).
+    """
+
+    lock_file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+
+    return lock_file
+
+
+def release_lock(lock_file=None):
+    """Release lock taken with acquire_lock"""
+
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+    finally:
+        lock_file.close()
+
+
+def load_result(path=None):
+    """Load shared result. Returns None if it doesn't exist or can't be read"""
+
+    try:
+        with open(path, 'r', encoding='utf-8') as result_file:
+            content = json.load(result_file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(content, dict) or 'finished_at' not in content:
+        return None
+
+    return content
+
+
+def save_result(path=None, result=None):
+    """Save shared result for waiting processes"""
+
+    content = json.dumps({'finished_at': time.time(), 'result': result}, separators=(',', ':'), default=str)
+    try:
+        cache.write_file_atomically(path=path, content=content.encode('utf-8'))
+    except OSError:
+        pass
+
+
+def run_single_flight(app_config=None, fetch=None):
+    """Run fetch() unless another process runs the same inventory query. Returns fetch() result or shared result
+
+    Waiting processes get the result finished after they started waiting. If single_flight_stale_ttl is set
+    in config, the previous result not older than that is returned at once instead of waiting. After
+    single_flight_wait seconds the process stops waiting and runs fetch() itself.
+    fetch() result should be serializable to JSON.
+    """
+
+    lock_path, result_path = get_paths(app_config=app_config)
+    wait = app_config.get('single_flight_wait', DEFAULT_SINGLE_FLIGHT_WAIT)
+    stale_ttl = app_config.get('single_flight_stale_ttl') or 0
+    started = time.time()
+
+    while True:
+        shared_result = load_result(path=result_path)
+        if shared_result is not None and shared_result['finished_at'] >= started:
+            return shared_result['result']
+
+        lock_file = acquire_lock(path=lock_path)
+        if lock_file is not None:
+            try:
+                # The previous holder could finish between reading its result and taking the lock
+                shared_result = load_result(path=result_path)
+                if shared_result is not None and shared_result['finished_at'] >= started:
+                    return shared_result['result']
+                result = fetch()
+                save_result(path=result_path, result=result)
+                return result
+            finally:
+                release_lock(lock_file=lock_file)
+
+        if shared_result is not None and time.time() - shared_result['finished_at'] < stale_ttl:
+            return shared_result['result']
+
+        if time.time() - started >= wait:
+            return fetch()
+
+        time.sleep(POLL_INTERVAL)
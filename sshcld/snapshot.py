@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Inventory snapshots and changes between them"""
+
+import gzip
+import hashlib
+import json
+import os
+
+from sshcld import cache
+
+SNAPSHOT_VERSION = 1
+RECORD_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'), default=str)
+
+
+def get_record_hash(instance=None):
+    """Get content hash of one instance record"""
+
+    return hashlib.blake2b(RECORD_ENCODER.encode(instance).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def get_snapshot_path(app_config=None):
+    """Get default snapshot path for the inventory query"""
+
+    return os.path.join(cache.get_cache_dir(app_config), f'snapshot-{cache.get_query_key(app_config)}.json.gz')
+
+
+def build_snapshot(instances=None):
+    """Build snapshot (instance ID -> content hash and record) from list of instances"""
+
+    if instances is None:
+        return {}
+
+    return {instance['instance_id']: [get_record_hash(instance), instance] for instance in instances}
+
+
+def keep_failed_regions(previous=None, current=None, statuses=None):
+    """Copy records of the regions which failed to respond (according to region statuses) from previous snapshot
+
+    If the failure is not recorded for a single region (e.g. list of all regions couldn't be requested), all
+    records of previous snapshot are kept.
+    """
+
+    failed_regions = {region for region, status in (statuses or {}).items() if status['status'] != 'ok'}
+    keep_all = any(region == 'all' or ',' in region for region in failed_regions)
+    for instance_id, entry in (previous or {}).items():
+        if keep_all or entry[1].get('region') in failed_regions:
+            current.setdefault(instance_id, entry)
+
+    return current
+
+
+def keep_failed_region_instances(previous=None, current=None, statuses=None):
+    """Get list of current cloud servers with cloud servers of the failed regions taken from previous list"""
+
+    merged_snapshot = keep_failed_regions(previous=build_snapshot(instances=previous),
+                                          current=build_snapshot(instances=current), statuses=statuses)
+
+    return [instance for _, instance in merged_snapshot.values()]
+
+
+def save_snapshot(path=None, snapshot=None):
+    """Save snapshot to compressed JSON file"""
+
+    content = json.dumps({'version': SNAPSHOT_VERSION, 'instances': snapshot or {}}, separators=(',', ':'),
+                         default=str)
+    cache.write_file_atomically(path=path, content=gzip.compress(content.encode('utf-8'), compresslevel=1))
+
+
+def load_snapshot(path=None):
+    """Load snapshot from file. Returns None if snapshot doesn't exist or can't be read"""
+
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as snapshot_file:
+            content = json.load(snapshot_file)
+    except (OSError, EOFError, ValueError):
+        return None
+
+    if not isinstance(content, dict) or content.get('version') != SNAPSHOT_VERSION:
+        return None
+
+    return content.get('instances', {})
+
+
+def get_changed_fields(previous=None, current=None):
+    """Get names of changed fields (tags are compared one by one)"""
+
+    changed_fields = []
+
+    for field in sorted(set(previous) | set(current)):
+        if field == 'tags':
+            previous_tags = previous.get('tags') or {}
+            current_tags = current.get('tags') or {}
+            changed_fields += [f'tag_{tag}' for tag in sorted(set(previous_tags) | set(current_tags))
+                               if previous_tags.get(tag) != current_tags.get(tag)]
+        elif previous.get(field) != current.get(field):
+            changed_fields.append(field)
+
+    return changed_fields
+
+
+def diff_snapshots(previous=None, current=None):
+    """Compare two snapshots using content hashes keyed by instance ID
+
+    Returns list of changed instances only. Each instance gets "change" property: added, removed
+    or changed with list of changed fields.
+    """
+
+    if previous is None:
+        previous = {}
+    if current is None:
+        current = {}
+
+    changes = []
+
+    for instance_id, (record_hash, instance) in current.items():
+        previous_entry = previous.get(instance_id)
+        if previous_entry is None:
+            changes.append({'change': 'added', **instance})
+        elif previous_entry[0] != record_hash:
+            changed_fields = get_changed_fields(previous=previous_entry[1], current=instance)
+            changes.append({'change': f'changed: {", ".join(changed_fields)}', **instance})
+
+    for instance_id, (_, instance) in previous.items():
+        if instance_id not in current:
+            changes.append({'change': 'removed', **instance})
+
+    return changes
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""Sorting, top-N selection and group-by summaries over a stream of instances"""
+
+from collections import Counter
+import heapq
+import ipaddress
+
+
+def get_field_value(instance=None, field=None):
+    """Get value of instance property or tag (properties have priority over tags)"""
+
+    if field in instance:
+        value = instance[field]
+    else:
+        value = (instance.get('tags') or {}).get(field)
+
+    if value is None:
+        return ''
+
+    return str(value)
+
+
+def get_sort_value(instance=None, field=None):
+    """Get comparable value of instance property or tag. Returns None if the value is missing
+
+    IP address fields are compared as addresses (10.0.0.9 goes before 10.0.0.10), other fields as strings.
+    """
+
+    value = get_field_value(instance=instance, field=field)
+    if not value:
+        return None
+
+    if field.endswith('_ip_address'):
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        return address.version, int(address)
+
+    return value
+
+
+def parse_sort_key(sort_by=None):
+    """Parse sort key. Leading "-" means descending order"""
+
+    if sort_by is None or not sort_by.strip():
+        return None, False
+
+    sort_by = sort_by.strip()
+    if sort_by.startswith('-'):
+        return sort_by[1:], True
+
+    return sort_by, False
+
+
+def select_instances(instances=None, sort_by=None, limit=None):
+    """Sort instances and/or take first N of them
+
+    Top-N uses heap selection, so only N instances are kept in memory besides the input stream.
+    """
+
+    if instances is None:
+        return []
+
+    field, descending = parse_sort_key(sort_by)
+
+    if field is None:
+        if limit is None:
+            return list(instances)
+        return [instance for _, instance in zip(range(limit), instances)]
+
+    def sort_key(instance):
+        # Instances without the value go last in both ascending and descending order
+        value = get_sort_value(instance=instance, field=field)
+        if value is None:
+            return (not descending,)
+        return descending, value
+
+    if limit is None:
+        return sorted(instances, key=sort_key, reverse=descending)
+
+    if descending:
+        return heapq.nlargest(limit, instances, key=sort_key)
+
+    return heapq.nsmallest(limit, instances, key=sort_key)
+
+
+def group_instances(instances=None, group_by=None):
+    """Count instances per group using streaming aggregation
+
+    Memory usage depends on the number of groups only. Returns list of dicts sorted by count (descending).
+    """
+
+    if instances is None:
+        return []
+
+    fields = [field.strip() for field in (group_by or '').split(',') if field.strip()]
+
+    counters = Counter(tuple(get_field_value(instance=instance, field=field) for field in fields)
+                       for instance in instances)
+
+    groups = []
+    for values, count in sorted(counters.items(), key=lambda item: (-item[1], item[0])):
+        group = dict(zip(fields, values))
+        group['count'] = count
+        groups.append(group)
+
+    return groups
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Terminal updates for watch mode: only changed lines are redrawn"""
+
+CLEAR_SCREEN = '\x1b[2J\x1b[H'
+CLEAR_LINE = '\x1b[2K'
+HIGHLIGHT_START = '\x1b[1;33m'
+HIGHLIGHT_END = '\x1b[0m'
+
+
+def move_cursor(row=0):
+    """Move cursor to the beginning of the row (rows are counted from 0)"""
+
+    return f'\x1b[{row + 1};1H'
+
+
+def highlight(value=None):
+    """Highlight value in the terminal"""
+
+    return f'{HIGHLIGHT_START}{value}{HIGHLIGHT_END}'
+
+
+def clip_lines(lines=None, height=None):
+    """Clip screen lines to the terminal height, so cursor movements stay inside the screen
+
+    The last visible line tells how many lines are hidden.
+    """
+
+    if not height or len(lines) < height:
+        return lines
+
+    visible_count = max(height - 2, 0)
+
+    return lines[:visible_count] + [f'... {len(lines) - visible_count} more lines are hidden, enlarge the terminal']
+
+
+def render_updates(previous_lines=None, current_lines=None):
+    """Get terminal output which turns previous screen into the current one
+
+    The whole screen is drawn only the first time. After that, only changed lines are rewritten in place.
+    """
+
+    if previous_lines is None:
+        return CLEAR_SCREEN + '\n'.join(current_lines) + '\n'
+
+    output = []
+
+    for row, line in enumerate(current_lines):
+        if row >= len(previous_lines) or previous_lines[row] != line:
+            output.append(f'{move_cursor(row)}{CLEAR_LINE}{line}')
+
+    for row in range(len(current_lines), len(previous_lines)):
+        output.append(f'{move_cursor(row)}{CLEAR_LINE}')
+
+    if output:
+        output.append(move_cursor(len(current_lines)))
+
+    return ''.join(output)
@@ -3,6 +3,7 @@
 """Common pytest fixtures for other tests"""
 
 import os
+import socket
 
 import boto3
 import pytest
@@ -10,6 +11,15 @@ import pytest
 from moto import mock_ec2
 
 
+@pytest.fixture(autouse=True)
+def isolate_home_dir(tmp_path_factory, monkeypatch):
+    """Temporary home directory for each test, so cache files are never written to the real one"""
+    home_dir = tmp_path_factory.mktemp('home')
+    monkeypatch.setenv('HOME', str(home_dir))
+    monkeypatch.setenv('USERPROFILE', str(home_dir))
+    monkeypatch.delenv('XDG_CACHE_HOME', raising=False)
+
+
 @pytest.fixture(name='aws_credentials', scope="session")
 def define_aws_credentials():
     """Mocked AWS Credentials for moto"""
@@ -82,3 +92,23 @@ def aws_ec2_instances(aws_ec2_client):
                     )
 
     yield instances_list
+
+
+@pytest.fixture(name='listening_port')
+def create_listening_port():
+    """Local TCP port accepting connections"""
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(100)
+    yield server_socket.getsockname()[1]
+    server_socket.close()
+
+
+@pytest.fixture(name='closed_port')
+def create_closed_port():
+    """Local TCP port without listener"""
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    port = server_socket.getsockname()[1]
+    server_socket.close()
+    yield port
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for ansible.py file"""
+
+from sshcld import ansible
+
+INSTANCES = [
+    {'instance_id': 'i-1', 'instance_name': 'web01', 'instance_state': 'running', 'region': 'us-east-1',
+     'private_ip_address': '10.0.0.1', 'public_ip_address': '3.0.0.1', 'tags': {'environment': 'prod-eu'}},
+    {'instance_id': 'i-2', 'instance_name': 'web02', 'instance_state': 'stopped', 'region': 'us-east-1',
+     'private_ip_address': None, 'public_ip_address': '3.0.0.2', 'tags': {}},
+]
+
+
+def test_ansible_get_group_name():
+    """Test that group name contains only allowed characters"""
+    assert ansible.get_group_name('tag', 'environment', 'prod-eu.1') == 'tag_environment_prod_eu_1'
+
+
+def test_ansible_get_host_variables():
+    """Test that ansible_host falls back to public IP address"""
+    assert ansible.get_host_variables(instance=INSTANCES[0])['ansible_host'] == '10.0.0.1'
+    assert ansible.get_host_variables(instance=INSTANCES[1])['ansible_host'] == '3.0.0.2'
+    assert ansible.get_host_variables(instance=INSTANCES[0], host_property='public_ip_address')['ansible_host'] \
+        == '3.0.0.1'
+    assert ansible.get_host_variables(instance=INSTANCES[0])['sshcld_tags'] == {'environment': 'prod-eu'}
+
+
+def test_ansible_build_inventory():
+    """Test that hosts are grouped by region, state and printable tags, and hostvars are included"""
+    actual_result = ansible.build_inventory(instances=INSTANCES, printable_tags=['environment'])
+    assert actual_result['region_us_east_1'] == {'hosts': ['i-1', 'i-2']}
+    assert actual_result['state_running'] == {'hosts': ['i-1']}
+    assert actual_result['tag_environment_prod_eu'] == {'hosts': ['i-1']}
+    assert actual_result['all'] == {'children': ['region_us_east_1', 'state_running', 'state_stopped',
+                                                 'tag_environment_prod_eu']}
+    assert sorted(actual_result['_meta']['hostvars']) == ['i-1', 'i-2']
+
+
+def test_ansible_get_host():
+    """Test that variables of unknown host are empty"""
+    assert ansible.get_host(instances=INSTANCES, host='i-2')['sshcld_instance_name'] == 'web02'
+    assert ansible.get_host(instances=INSTANCES, host='i-3') == {}
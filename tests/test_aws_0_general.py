@@ -2,9 +2,10 @@
 
 """Tests for functions from AWS plugin"""
 
-import boto3
+import os
 
-from moto import mock_ec2
+from moto import mock_sts
+from sshcld import cache
 from sshcld.plugins import aws
 
 
@@ -56,26 +57,37 @@ def test_aws_parse_filters_id_filter():
     assert expected_result == actual_result
 
 
-def test_aws_parse_instances_no_instances():
-    """Test that instances parsing works with no instances"""
-    actual_result = aws.parse_instances()
-    assert len(actual_result) == 0
-
-
-def test_aws_parse_instances_incorrect_list():
-    """Test that instances parsing works with incorrect list of instances"""
-    actual_result = aws.parse_instances('test')
-    assert len(actual_result) == 0
+def test_aws_parse_filters_many_ids_filter():
+    """Test that filters parsing works with several IDs as a filter"""
+    expected_result = ['i-123456', 'i-654321']
+    actual_result = aws.parse_filters(filters='FILTER_INSTANCE_ID=i-123456, i-654321,i-123456')
+    assert expected_result == actual_result
 
 
 # pylint: disable=W0613
-def test_aws_parse_instances_one_instance(aws_credentials):
-    """Test that instances parsing works with one instance"""
-    with mock_ec2():
-        ec2_client = boto3.client('ec2', region_name='eu-central-1')
-        image_id = ec2_client.describe_images()['Images'][0]['ImageId']
-        ec2_client.run_instances(ImageId=image_id, InstanceType='t3.small', DryRun=False, MinCount=1, MaxCount=1)
-        ec2_resource = boto3.resource('ec2', region_name='eu-central-1')
-        instances = ec2_resource.instances.filter(DryRun=False, MaxResults=1000)
-        actual_result = aws.parse_instances(instances)
-    assert len(actual_result) == 1
+def test_aws_get_session_credential_cache(aws_credentials, tmp_path, monkeypatch):
+    """Test that assumed role credentials are reused from the cache by new sessions"""
+    config_path = tmp_path / 'config'
+    config_path.write_text('[profile assumed]\nrole_arn = arn:aws:iam::123456789012:role/readonly\n'
+                           'source_profile = source\n', encoding='utf-8')
+    credentials_path = tmp_path / 'credentials'
+    credentials_path.write_text('[source]\naws_access_key_id = testing\naws_secret_access_key = testing\n',
+                                encoding='utf-8')
+    monkeypatch.setenv('AWS_CONFIG_FILE', str(config_path))
+    monkeypatch.setenv('AWS_SHARED_CREDENTIALS_FILE', str(credentials_path))
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SECURITY_TOKEN', 'AWS_SESSION_TOKEN'):
+        monkeypatch.delenv(name)
+
+    cache_dir = str(tmp_path / 'cache')
+    with mock_sts():
+        first_session = aws.get_session(profile_name='assumed',
+                                        credential_cache=cache.CredentialCache(directory=cache_dir,
+                                                                               profile_name='assumed'))
+        first_access_key = first_session.get_credentials().get_frozen_credentials().access_key
+        second_session = aws.get_session(profile_name='assumed',
+                                         credential_cache=cache.CredentialCache(directory=cache_dir,
+                                                                                profile_name='assumed'))
+        second_access_key = second_session.get_credentials().get_frozen_credentials().access_key
+
+    assert first_access_key == second_access_key and first_access_key != 'testing'
+    assert len(os.listdir(cache_dir)) == 1 and os.listdir(cache_dir)[0].startswith('assumed--')
@@ -2,9 +2,29 @@
 
 """Tests for filters from AWS plugin"""
 
+import ipaddress
+
+import boto3
+
+from sshcld import cache
 from sshcld.plugins import aws
 
 
+# pylint: disable=R0903
+class CountingSession:
+    """AWS session that remembers regions of created EC2 clients"""
+
+    def __init__(self):
+        self.session = boto3.Session()
+        self.profile_name = self.session.profile_name
+        self.regions = []
+
+    def client(self, service_name=None, region_name=None):
+        """Create client and remember its region"""
+        self.regions.append(region_name)
+        return self.session.client(service_name, region_name=region_name)
+
+
 # pylint: disable=W0613
 def test_aws_get_instances_all_instances(aws_ec2_instances):
     """Check that all instances from AWS region are returned"""
@@ -64,3 +84,53 @@ def test_aws_get_instances_instance_id(aws_ec2_instances):
     """Check that no instances returned for non-existing ID"""
     assert len(aws.get_instances(region_name='us-east-1',
                                  filters='FILTER_INSTANCE_ID=i-123456789')) == 0
+
+
+# pylint: disable=W0613
+def test_aws_get_instances_many_ids(aws_ec2_instances):
+    """Check that several instances are returned by their IDs"""
+    instance_ids = [instance['instance_id'] for instance in aws.get_instances(region_name='us-east-1')[:3]]
+    actual_result = aws.get_instances(region_name='us-east-1,us-west-1',
+                                      filters=f'FILTER_INSTANCE_ID={",".join(instance_ids)},i-00000000')
+    assert sorted(instance['instance_id'] for instance in actual_result) == sorted(instance_ids)
+
+
+# pylint: disable=W0613
+def test_aws_get_instances_ids_location_cache(aws_ec2_instances, tmp_path):
+    """Check that known instances are requested only from their last known region"""
+    instance_ids = [instance['instance_id'] for instance in aws.get_instances(region_name='us-east-1')[:2]]
+    filters = f'FILTER_INSTANCE_ID={",".join(instance_ids)}'
+    locations = cache.LocationCache(path=str(tmp_path / 'locations.json'))
+    assert len(aws.get_instances(region_name='us-west-1,us-east-1', filters=filters, locations=locations)) == 2
+
+    session = CountingSession()
+    actual_result = aws.get_instances(region_name='us-west-1,us-east-1', filters=filters, session=session,
+                                      locations=cache.LocationCache(path=str(tmp_path / 'locations.json')))
+    assert len(actual_result) == 2
+    assert session.regions == ['us-east-1']
+
+
+# pylint: disable=W0613
+def test_aws_get_instances_ids_fresh_cache(aws_ec2_instances, tmp_path):
+    """Check that recently seen instances are returned without API calls"""
+    instance_id = aws.get_instances(region_name='us-east-1')[0]['instance_id']
+    locations = cache.LocationCache(path=str(tmp_path / 'locations.json'), ttl=60)
+    aws.get_instances(region_name='us-east-1', filters=f'FILTER_INSTANCE_ID={instance_id}', locations=locations)
+
+    session = CountingSession()
+    actual_result = aws.get_instances(region_name='us-east-1', filters=f'FILTER_INSTANCE_ID={instance_id}',
+                                      session=session, locations=locations)
+    assert [instance['instance_id'] for instance in actual_result] == [instance_id]
+    assert not session.regions
+
+
+# pylint: disable=W0613
+def test_aws_get_instances_ip_address(aws_ec2_instances):
+    """Check that instances are found by private IP address and network"""
+    instance = aws.get_instances(region_name='us-east-1')[0]
+    actual_result = aws.get_instances(region_name='us-east-1',
+                                      filters=f'FILTER_IP_ADDRESS={instance["private_ip_address"]}')
+    assert [found_instance['instance_id'] for found_instance in actual_result] == [instance['instance_id']]
+    network = ipaddress.ip_network(f'{instance["private_ip_address"]}/25', strict=False)
+    actual_result = aws.get_instances(region_name='us-east-1', filters=f'FILTER_IP_ADDRESS={network}')
+    assert instance['instance_id'] in [found_instance['instance_id'] for found_instance in actual_result]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for bastion.py file"""
+
+import re
+
+import pytest
+
+from sshcld import bastion
+from sshcld.errors import ConfigurationError
+
+
+@pytest.mark.parametrize('jump_host, expected_result', [
+    ('bastion.example.com', ('bastion.example.com', 22)),
+    ('ec2-user@bastion.example.com:2222', ('bastion.example.com', 2222)),
+    ('admin@[2001:db8::1]:2200', ('2001:db8::1', 2200)),
+    ('[2001:db8::1]', ('2001:db8::1', 22)),
+])
+def test_bastion_parse_jump_host(jump_host, expected_result):
+    """Test that address and port are parsed from jump host"""
+    assert bastion.parse_jump_host(jump_host) == expected_result
+
+
+@pytest.mark.parametrize('jump_host', ['bastion.example.com:ssh', '[2001:db8::1]:', 'bastion:70000', ':22'])
+def test_bastion_parse_jump_host_invalid(jump_host):
+    """Test that invalid jump host is reported as configuration error with the jump host"""
+    with pytest.raises(ConfigurationError, match=re.escape(jump_host)):
+        bastion.parse_jump_host(jump_host)
+
+
+def test_bastion_get_candidates():
+    """Test that jump hosts of the first group matching region and tags are used"""
+    app_config = {'proxy_jump_hosts': [
+        {'region': 'us-east-1', 'tags': {'environment': 'production'}, 'hosts': ['prod-bastion']},
+        {'region': 'us-east-1,us-west-2', 'hosts': ['us-bastion-a', 'us-bastion-b']},
+        {'tags': {'environment': 'staging'}, 'hosts': ['staging-bastion']},
+    ]}
+    instance = {'region': 'us-east-1', 'tags': {'environment': 'production'}}
+    assert bastion.get_candidates(instance=instance, app_config=app_config) == ['prod-bastion']
+    instance = {'region': 'us-west-2', 'tags': {'environment': 'production'}}
+    assert bastion.get_candidates(instance=instance, app_config=app_config) == ['us-bastion-a', 'us-bastion-b']
+    instance = {'region': 'eu-west-1', 'tags': {'environment': 'staging'}}
+    assert bastion.get_candidates(instance=instance, app_config=app_config) == ['staging-bastion']
+    instance = {'region': 'eu-west-1', 'tags': {}}
+    assert not bastion.get_candidates(instance=instance, app_config=app_config)
+
+
+@pytest.mark.parametrize('region, message', [('eu-west-1', 'None of jump hosts'), ('ap-east-1', 'No group')])
+def test_bastion_add_proxy_jumps_no_jump_host(closed_port, tmp_path, region, message):
+    """Test that cloud server without reachable jump host is never connected directly"""
+    app_config = {'cache_dir': str(tmp_path), 'probe_timeout': 1, 'proxy_jump_hosts': [
+        {'region': 'eu-west-1', 'hosts': [f'127.0.0.1:{closed_port}']},
+    ]}
+    with pytest.raises(ConfigurationError, match=message):
+        bastion.add_proxy_jumps(instances=[{'instance_id': 'i-1', 'region': region}], app_config=app_config)
+
+
+def test_bastion_add_proxy_jumps(listening_port, closed_port, tmp_path, monkeypatch):
+    """Test that reachable jump host is selected and measurements are reused from cache"""
+    app_config = {'cache_dir': str(tmp_path), 'probe_timeout': 1, 'proxy_jump_hosts': [
+        {'region': 'us-east-1', 'hosts': [f'user@127.0.0.1:{closed_port}', f'user@127.0.0.1:{listening_port}']},
+        {'region': 'eu-west-1', 'hosts': [f'127.0.0.1:{closed_port}']},
+    ]}
+    instances = [{'region': 'us-east-1'}, {'region': 'us-east-1'}]
+    bastion.add_proxy_jumps(instances=instances, app_config=app_config)
+    assert [instance['proxy_jump'] for instance in instances] == [f'user@127.0.0.1:{listening_port}'] * 2
+
+    monkeypatch.setattr(bastion.probe, 'probe_endpoints', lambda **kwargs: pytest.fail('Cache is not used'))
+    instances = [{'region': 'us-east-1'}]
+    bastion.add_proxy_jumps(instances=instances, app_config=app_config)
+    assert instances[0]['proxy_jump'] == f'user@127.0.0.1:{listening_port}'
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for batch.py file"""
+
+import pytest
+
+from sshcld import batch
+
+INSTANCES = [
+    {'instance_id': 'i-1', 'tags': {'Name': 'web01', 'environment': 'production'}},
+    {'instance_id': 'i-2', 'tags': {'Name': 'db01', 'environment': 'production'}},
+    {'instance_id': 'i-3', 'tags': {'Name': 'web02', 'environment': 'staging'}},
+]
+
+
+def test_batch_parse_query():
+    """Test that query name is separated from filters"""
+    assert batch.parse_query(text='web:Name=web*,environment=production') == ('web', 'Name=web*,environment=production')
+    assert batch.parse_query(text='all:') == ('all', None)
+    with pytest.raises(ValueError):
+        batch.parse_query(text='environment=production')
+
+
+@pytest.mark.parametrize('pattern, value, expected_result', [
+    ('web01', 'web01', True),
+    ('web*', 'web01', True),
+    ('web?1', 'web01', True),
+    ('web.1', 'web01', False),
+    ('web01', 'web011', False),
+    ('web01', None, False),
+])
+def test_batch_value_matches(pattern, value, expected_result):
+    """Test that values are matched exactly or with cloud API wildcards"""
+    assert batch.value_matches(pattern=pattern, value=value) == expected_result
+
+
+@pytest.mark.parametrize('queries, expected_result', [
+    (['environment=production,Name=web*', 'environment=staging'], {'environment': ['production', 'staging']}),
+    (['environment=production', 'Name=web01'], None),
+    (['environment=production', None], None),
+    (['environment=production', 'environment=production,Name=db01'], {'environment': ['production']}),
+])
+def test_batch_get_union_filters(queries, expected_result):
+    """Test that only tags used in every query are sent to cloud API"""
+    assert batch.get_union_filters(queries=queries) == expected_result
+
+
+def test_batch_split_instances():
+    """Test that each query gets its own copies of matching cloud servers"""
+    queries = {'web': 'Name=web*', 'prod': 'environment=production', 'all': None}
+    actual_result = batch.split_instances(instances=INSTANCES, queries=queries)
+    assert [instance['instance_id'] for instance in actual_result['web']] == ['i-1', 'i-3']
+    assert [instance['instance_id'] for instance in actual_result['prod']] == ['i-1', 'i-2']
+    assert len(actual_result['all']) == 3
+    assert actual_result['web'][0] is not actual_result['prod'][0]
+    assert actual_result['web'][0]['tags'] is not actual_result['prod'][0]['tags']
+
+
+def test_batch_is_batch_supported():
+    """Test that queries by server ID and IP address are not supported"""
+    assert batch.is_batch_supported(filters='environment=production')
+    assert not batch.is_batch_supported(filters='FILTER_INSTANCE_ID=i-1')
+    assert not batch.is_batch_supported(filters='environment=production, FILTER_IP_ADDRESS=10.0.0.1')
+
+
+def test_batch_check_queries():
+    """Test that filters which are not strings and names with the same output file are not accepted"""
+    batch.check_queries(queries={'all': None, 'prod': 'environment=production'}, output_names=True)
+    with pytest.raises(ValueError):
+        batch.check_queries(queries={'prod': ['environment=production']})
+    with pytest.raises(ValueError):
+        batch.check_queries(queries={'prod': 'environment=production,FILTER_INSTANCE_ID=i-1'})
+    batch.check_queries(queries={'web/1': None, 'web:1': None})
+    with pytest.raises(ValueError):
+        batch.check_queries(queries={'web/1': None, 'web:1': None}, output_names=True)
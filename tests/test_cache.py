@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for cache.py file"""
+
+from datetime import datetime, timezone
+import os
+
+import pytest
+
+from sshcld import cache
+
+
+def test_cache_get_cache_dir_from_config(tmp_path):
+    """Test that cache directory from configuration is created"""
+    cache_dir = str(tmp_path / 'sshcld_cache')
+    assert cache.get_cache_dir(app_config={'cache_dir': cache_dir}) == cache_dir
+    assert os.path.isdir(cache_dir)
+
+
+def test_cache_get_query_key():
+    """Test that query key depends on region, profile and filters"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cloud_profile': 'prod'}
+    assert cache.get_query_key(app_config) == cache.get_query_key(dict(app_config))
+    assert cache.get_query_key(app_config) != cache.get_query_key({**app_config, 'cloud_region': 'all'})
+    assert cache.get_query_key(app_config) != cache.get_query_key(app_config, filters='Name=webserver01')
+
+
+def test_cache_write_file_atomically(tmp_path):
+    """Test that file is written and temporary file is removed"""
+    path = str(tmp_path / 'test.json')
+    cache.write_file_atomically(path=path, content=b'{}')
+    assert os.listdir(str(tmp_path)) == ['test.json']
+    with open(path, 'rb') as test_file:
+        assert test_file.read() == b'{}'
+
+
+def test_cache_region_hits_cache(tmp_path):
+    """Test that regions are ordered by number of hits and hits are saved per profile"""
+    path = os.path.join(tmp_path, 'region_hits.json')
+    region_hits = cache.RegionHitsCache(path=path)
+    regions = ['us-east-1', 'eu-west-1', 'eu-central-1']
+    assert region_hits.order_regions(regions=regions) == regions
+    region_hits.update(regions=['eu-central-1', 'eu-central-1'])
+    region_hits.update(regions=['eu-central-1', 'eu-west-1'])
+    region_hits.update(regions=['us-east-1'], profile_name='prod')
+    region_hits.save()
+
+    loaded_region_hits = cache.RegionHitsCache(path=path)
+    assert loaded_region_hits.order_regions(regions=regions) == ['eu-central-1', 'eu-west-1', 'us-east-1']
+    assert loaded_region_hits.order_regions(regions=regions[::-1], profile_name='prod') == \
+        ['us-east-1', 'eu-central-1', 'eu-west-1']
+
+
+def test_cache_region_hits_cache_decay(tmp_path, monkeypatch):
+    """Test that old hits lose their weight, so regions with recent hits go first"""
+    region_hits = cache.RegionHitsCache(path=os.path.join(tmp_path, 'region_hits.json'), half_life=60)
+    monkeypatch.setattr(cache.time, 'time', lambda: 1000.0)
+    for _ in range(10):
+        region_hits.update(regions=['eu-west-1'])
+    monkeypatch.setattr(cache.time, 'time', lambda: 1000.0 + 600)
+    region_hits.update(regions=['us-east-1'])
+    assert region_hits.order_regions(regions=['eu-west-1', 'us-east-1']) == ['us-east-1', 'eu-west-1']
+
+
+def test_cache_credential_cache(tmp_path):
+    """Test that credentials are stored per profile with restricted permissions and expired ones are ignored"""
+    directory = str(tmp_path / 'credentials')
+    credential_cache = cache.CredentialCache(directory=directory, profile_name='prod')
+    valid_credentials = {'Credentials': {'AccessKeyId': 'key', 'Expiration': datetime(2999, 1, 1, tzinfo=timezone.utc)}}
+    expired_credentials = {'Credentials': {'AccessKeyId': 'key', 'Expiration': '2000-01-01T00:00:00Z'}}
+
+    credential_cache['role:valid'] = valid_credentials
+    credential_cache['role:expired'] = expired_credentials
+    assert 'role:valid' in credential_cache and 'role:expired' not in credential_cache
+    assert credential_cache['role:valid']['Credentials']['Expiration'] == '2999-01-01T00:00:00+00:00'
+    assert 'role:valid' not in cache.CredentialCache(directory=directory, profile_name='dev')
+    assert sorted(os.listdir(directory)) == ['prod--role_expired.json', 'prod--role_valid.json']
+
+    if os.name != 'nt':
+        assert os.stat(directory).st_mode & 0o777 == 0o700
+        assert os.stat(os.path.join(directory, 'prod--role_valid.json')).st_mode & 0o777 == 0o600
+
+
+@pytest.mark.parametrize('expiration, expected_result', [
+    ('2999-01-01T00:00:00Z', False),
+    ('2999-01-01T00:00:00+02:00', False),
+    ('2999-01-01 00:00:00', False),
+    ('2000-01-01T00:00:00Z', True),
+    ('not a timestamp', True),
+    (None, True),
+])
+def test_cache_credential_cache_is_expired(expiration, expected_result):
+    """Test that expiration is parsed in different formats and unparsable expiration means expired credentials"""
+    assert cache.CredentialCache.is_expired({'Credentials': {'Expiration': expiration}}) == expected_result
@@ -2,12 +2,19 @@
 
 """Tests for cli.py file"""
 
+import io
+import json
 import os
 from pathlib import Path
 
 import pytest
 
 from sshcld import cli
+from sshcld import inventory
+from sshcld import ipindex
+from sshcld import metrics
+from sshcld import singleflight
+from sshcld import snapshot
 
 
 @pytest.fixture(name='aws_ec2_instance_fake')
@@ -155,7 +162,13 @@ def test_cli_get_cli_args_no_args():
     """Test that CLI arguments are parsed correctly if not defined"""
     actual_result = cli.get_cli_args([])
     expected_result = {'region': None, 'profile': None, 'filter': None, 'name': None, 'id': None,
-                       'aws': False, 'azure': False, 'ssh': False, 'ssm': False}
+                       'aws': False, 'azure': False, 'ssh': False, 'ssm': False, 'pager': False,
+                       'sort': None, 'limit': None, 'first': False, 'group_by': None, 'count': False,
+                       'diff': False, 'snapshot': None, 'ip': None, 'no_cache': False, 'command': None,
+                       'probe': False, 'probe_port': None, 'record': None, 'replay': None,
+                       'watch': None, 'columns': None, 'deadline': None, 'metrics': None, 'metrics_port': None,
+                       'query': None, 'query_file': None, 'query_output': None,
+                       'dns_port': None, 'ansible': False, 'list': False, 'host': None}
     assert expected_result == actual_result
 
 
@@ -214,12 +227,63 @@ def test_cli_get_cli_args_ssm():
     assert actual_result['ssm']
 
 
+def test_cli_get_cli_args_pager():
+    """Test that pager parameter from CLI arguments is parsed correctly"""
+    actual_result = cli.get_cli_args(['--pager'])
+    assert actual_result['pager']
+
+
+def test_cli_get_cli_args_connect():
+    """Test that connect subcommand arguments are parsed correctly"""
+    actual_result = cli.get_cli_args(['-r', 'eu-west-1', 'connect', '-p', 'prod', '--ssm', 'webserver01'])
+    assert actual_result['command'] == 'connect' and actual_result['target'] == 'webserver01'
+    assert actual_result['region'] == 'eu-west-1' and actual_result['profile'] == 'prod'
+    assert actual_result['ssm'] and not actual_result.get('print_only')
+
+
+def test_cli_get_cli_args_probe():
+    """Test that probe parameters from CLI arguments are parsed correctly"""
+    actual_result = cli.get_cli_args(['--probe', '--probe-port', '443'])
+    assert actual_result['probe'] and actual_result['probe_port'] == 443
+
+
+def test_cli_get_cli_args_exec():
+    """Test that exec subcommand arguments are parsed correctly"""
+    actual_result = cli.get_cli_args(['exec', '-f', 'environment=production', '--parallel', '50', '--timeout', '5',
+                                      '--', 'uptime', '-p'])
+    assert actual_result['command'] == 'exec' and actual_result['filter'] == 'environment=production'
+    assert actual_result['parallel'] == 50 and actual_result['timeout'] == 5
+    assert actual_result['remote_command'] == ['--', 'uptime', '-p']
+
+
+@pytest.mark.parametrize('parallel', ['0', '-1'])
+def test_cli_get_cli_args_exec_invalid_parallel(parallel):
+    """Test that number of parallel hosts should be positive"""
+    with pytest.raises(SystemExit):
+        cli.get_cli_args(['exec', '--parallel', parallel, '--', 'uptime'])
+
+
+def test_cli_get_cli_args_summary():
+    """Test that sorting and summary parameters from CLI arguments are parsed correctly"""
+    actual_result = cli.get_cli_args(['--sort=-launch_time', '--limit', '20', '--group-by', 'region', '--count'])
+    assert actual_result['sort'] == '-launch_time'
+    assert actual_result['limit'] == 20
+    assert actual_result['group_by'] == 'region'
+    assert actual_result['count']
+
+
 def test_cli_get_cli_args_all_args():
     """Test that all CLI arguments are parsed correctly"""
     actual_result = cli.get_cli_args(['-r', 'eu-west-1', '-p', 'prod',
                                       '-f', 'environment=production', '--aws', '--ssh', '--ssm'])
     expected_result = {'region': 'eu-west-1', 'profile': 'prod', 'filter': 'environment=production',
-                       'name': None, 'id': None, 'aws': True, 'azure': False, 'ssh': True, 'ssm': True}
+                       'name': None, 'id': None, 'aws': True, 'azure': False, 'ssh': True, 'ssm': True,
+                       'pager': False, 'sort': None, 'limit': None, 'first': False, 'group_by': None, 'count': False,
+                       'diff': False, 'snapshot': None, 'ip': None, 'no_cache': False, 'command': None,
+                       'probe': False, 'probe_port': None, 'record': None, 'replay': None,
+                       'watch': None, 'columns': None, 'deadline': None, 'metrics': None, 'metrics_port': None,
+                       'query': None, 'query_file': None, 'query_output': None,
+                       'dns_port': None, 'ansible': False, 'list': False, 'host': None}
     assert expected_result == actual_result
 
 
@@ -321,6 +385,28 @@ def test_cli_enrich_config_filters_id(cli_args, yaml_config, expected_result):
     assert cli.enrich_config(cli_args=cli_args, yaml_config=yaml_config)['filters'] == expected_result
 
 
+@pytest.mark.parametrize('cli_args, yaml_config, expected_result', [
+    ({'ip': '10.0.0.1'}, {'default_cloud': 'aws'}, 'FILTER_IP_ADDRESS=10.0.0.1'),
+    ({'ip': '10.0.0.1,172.16.0.0/12'}, {'default_cloud': 'aws'}, 'FILTER_IP_ADDRESS=10.0.0.1,172.16.0.0/12'),
+])
+def test_cli_enrich_config_filters_ip(cli_args, yaml_config, expected_result):
+    """Test that config enrichment works for IP address as filter"""
+    assert cli.enrich_config(cli_args=cli_args, yaml_config=yaml_config)['filters'] == expected_result
+
+
+def test_cli_enrich_config_filters_invalid_ip():
+    """Test that invalid IP address stops the tool"""
+    with pytest.raises(SystemExit):
+        cli.enrich_config(cli_args={'ip': '10.0.0.300'}, yaml_config={'default_cloud': 'aws'})
+
+
+def test_cli_enrich_config_filters_id_stdin(monkeypatch):
+    """Test that config enrichment works for IDs from standard input"""
+    monkeypatch.setattr('sys.stdin', io.StringIO('i-123456\ni-654321, i-111111\n'))
+    actual_result = cli.enrich_config(cli_args={'id': '-'}, yaml_config={'default_cloud': 'aws'})['filters']
+    assert actual_result == 'FILTER_INSTANCE_ID=i-123456,i-654321,i-111111'
+
+
 # pylint: disable=W0613
 def test_cli_get_cloud_instances_empty_region(aws_ec2_instances):
     """Test that empty region is handled correctly"""
@@ -361,6 +447,248 @@ def test_cli_get_cloud_instances_non_existing_filter(aws_ec2_instances):
     assert len(actual_result) == 0
 
 
+# pylint: disable=W0613
+def test_cli_get_snapshot_instances(aws_ec2_instances, tmp_path):
+    """Test that the first run shows all instances as added and the next run shows no changes"""
+    snapshot_path = str(tmp_path / 'snapshot.json.gz')
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'filters': 'environment=production'}
+    actual_result = cli.get_snapshot_instances(app_config=app_config, snapshot_path=snapshot_path, show_diff=True)
+    assert len(actual_result) == 16 and all(instance['change'] == 'added' for instance in actual_result)
+    actual_result = cli.get_snapshot_instances(app_config=app_config, snapshot_path=snapshot_path, show_diff=True)
+    assert actual_result == []
+    actual_result = cli.get_snapshot_instances(app_config=app_config, snapshot_path=snapshot_path)
+    assert len(actual_result) == 16 and 'change' not in actual_result[0]
+
+
+# pylint: disable=W0613
+def test_cli_get_cloud_instances_single_flight(aws_ec2_instances, tmp_path):
+    """Test that full fetch result and region statuses are shared with concurrent processes if it's enabled"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path)}
+    cli.get_cloud_instances(app_config=app_config)
+    assert not os.path.exists(tmp_path / 'single-flight')
+
+    app_config['single_flight_enabled'] = True
+    statuses = {}
+    instances_list = cli.get_cloud_instances(app_config=app_config, statuses=statuses)
+    assert statuses['us-east-1']['status'] == 'ok'
+
+    _, result_path = singleflight.get_paths(app_config=app_config)
+    shared_result = singleflight.load_result(path=result_path)['result']
+    assert len(shared_result['instances']) == len(instances_list) and shared_result['statuses'] == statuses
+
+
+def test_cli_get_cloud_instances_single_flight_partial(monkeypatch, capsys):
+    """Test that shared partial result is returned only to callers accepting failed regions"""
+    shared_result = {'instances': [{'instance_id': 'i-1'}],
+                     'statuses': {'us-east-1': inventory.get_region_status(),
+                                  'eu-west-1': inventory.get_region_status(status='timeout', message='timed out')}}
+    monkeypatch.setattr(singleflight, 'run_single_flight', lambda **_: shared_result)
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1,eu-west-1', 'single_flight_enabled': True}
+
+    statuses = {}
+    assert cli.get_cloud_instances(app_config=app_config, statuses=statuses) == [{'instance_id': 'i-1'}]
+    assert statuses['eu-west-1']['status'] == 'timeout'
+
+    with pytest.raises(SystemExit):
+        cli.get_cloud_instances(app_config=app_config)
+    assert 'eu-west-1: timed out' in capsys.readouterr().out
+
+
+# pylint: disable=W0613
+def test_cli_print_ansible_inventory(aws_ec2_instances, tmp_path, capsys):
+    """Test that Ansible inventory and variables of one host are printed in JSON"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'filters': 'environment=production', 'printable_tags': ['department']}
+    cli.print_ansible_inventory(cli_args={'ansible': True}, app_config=app_config)
+    actual_result = json.loads(capsys.readouterr().out)
+    assert len(actual_result['_meta']['hostvars']) == 16 and 'region_us_east_1' in actual_result['all']['children']
+
+    host = sorted(actual_result['_meta']['hostvars'])[0]
+    cli.print_ansible_inventory(cli_args={'ansible': True, 'host': host}, app_config=app_config)
+    assert json.loads(capsys.readouterr().out) == actual_result['_meta']['hostvars'][host]
+
+
+# pylint: disable=W0613
+def test_cli_get_dns_index(aws_ec2_instances, tmp_path, monkeypatch):
+    """Test that DNS index is built from cloud servers, and records of failed regions are kept from previous index"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'dns_domain': 'example.internal.'}
+    index = cli.get_dns_index(app_config=app_config, session=inventory.InventorySession())
+    instance = cli.get_cloud_instances(app_config=app_config)[0]
+    assert index.resolve(name=f'{instance["instance_id"]}.example.internal') == ([instance['private_ip_address']], 0)
+
+    new_instance = {'instance_id': 'i-0123456789', 'instance_name': 'new01', 'region': 'eu-west-3',
+                    'private_ip_address': '10.1.0.1'}
+
+    def get_failed_instances(statuses=None, **_):
+        statuses['us-east-1'] = inventory.get_region_status(status='timeout', message='timeout of 30 s exceeded')
+        statuses['eu-west-3'] = inventory.get_region_status(instances_count=1)
+        return [new_instance]
+
+    monkeypatch.setattr(inventory, 'get_instances', get_failed_instances)
+    refreshed_index = cli.get_dns_index(app_config=app_config, session=inventory.InventorySession(),
+                                        previous_index=index)
+    assert refreshed_index.resolve(name=f'{instance["instance_id"]}.example.internal') == \
+        ([instance['private_ip_address']], 0)
+    assert refreshed_index.resolve(name='new01.example.internal') == (['10.1.0.1'], 0)
+
+
+# pylint: disable=W0613
+def test_cli_run_batch_queries(aws_ec2_instances, tmp_path, capsys):
+    """Test that queries are evaluated over one fetch and their results are written to separate files"""
+    query_file = tmp_path / 'queries.yaml'
+    query_file.write_text('prod-finance: environment=production,department=finance\n', encoding='utf-8')
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path)}
+    cli_args = {'query_file': str(query_file), 'query': ['staging-web:environment=staging,Name=webserver01'],
+                'query_output': str(tmp_path / 'output')}
+    cli.run_batch_queries(cli_args=cli_args, app_config=app_config)
+    actual_result = capsys.readouterr().out
+    assert 'prod-finance: 4 cloud servers' in actual_result and 'staging-web: 4 cloud servers' in actual_result
+    assert (tmp_path / 'output' / 'staging-web.txt').read_text(encoding='utf-8').count('webserver01') == 4
+
+    cli.run_batch_queries(cli_args={'query': ['all:']}, app_config=app_config)
+    assert '== all (' in capsys.readouterr().out
+
+
+def test_cli_get_batch_queries_invalid():
+    """Test that queries without name and queries by server ID are not accepted"""
+    with pytest.raises(SystemExit):
+        cli.get_batch_queries(cli_args={'query': ['environment=production']})
+    with pytest.raises(SystemExit):
+        cli.get_batch_queries(cli_args={'query': ['one:FILTER_INSTANCE_ID=i-1']})
+    with pytest.raises(SystemExit):
+        cli.get_batch_queries(cli_args={'query': ['one:environment=production,FILTER_INSTANCE_ID=i-1']})
+    with pytest.raises(SystemExit):
+        cli.get_batch_queries(cli_args={'query': ['web/1:', 'web 1:'], 'query_output': 'output'})
+
+
+def test_cli_get_batch_queries_file(tmp_path):
+    """Test that queries file values should be filters strings (or empty for all cloud servers)"""
+    query_file = tmp_path / 'queries.yaml'
+    query_file.write_text('all:\nprod: environment=production\n', encoding='utf-8')
+    assert cli.get_batch_queries(cli_args={'query_file': str(query_file)}) == {
+        'all': None, 'prod': 'environment=production'}
+
+    query_file.write_text('prod:\n  environment: production\n', encoding='utf-8')
+    with pytest.raises(SystemExit):
+        cli.get_batch_queries(cli_args={'query_file': str(query_file)})
+
+
+# pylint: disable=W0613
+def test_cli_get_snapshot_instances_ip_index(aws_ec2_instances, tmp_path):
+    """Test that cloud servers of the saved snapshot are found by IP address in the same cloud region only"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'filters': 'environment=production'}
+    instances_list = cli.get_snapshot_instances(app_config=app_config)
+    private_ip_address = instances_list[0]['private_ip_address']
+    ip_config = {**app_config, 'filters': f'FILTER_IP_ADDRESS={private_ip_address}'}
+    actual_result = ipindex.find_cached_instances(app_config=ip_config, addresses=private_ip_address)
+    assert [instance['instance_id'] for instance in actual_result] == [instances_list[0]['instance_id']]
+    assert not ipindex.find_cached_instances(app_config={**ip_config, 'cloud_region': 'eu-west-1'},
+                                             addresses=private_ip_address)
+
+
+@pytest.mark.parametrize('target, expected_result', [
+    ('i-0123456789abcdef0', 'FILTER_INSTANCE_ID=i-0123456789abcdef0'),
+    ('i-12345678', 'FILTER_INSTANCE_ID=i-12345678'),
+    ('i-gateway', 'Name=i-gateway'),
+    ('i-123456', 'Name=i-123456'),
+    ('webserver01', 'Name=webserver01'),
+    ('10.0.0.1', 'FILTER_IP_ADDRESS=10.0.0.1'),
+])
+def test_cli_get_target_filters(target, expected_result):
+    """Test that connection target is converted to filters"""
+    assert cli.get_target_filters(target=target) == expected_result
+
+
+# pylint: disable=W0613
+def test_cli_connect_to_instance_print(aws_ec2_instances, tmp_path, capsys):
+    """Test that connection command is built for the single found instance"""
+    instance = cli.get_cloud_instances(app_config={'default_cloud': 'aws', 'cloud_region': 'us-east-1'})[0]
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'ssh_connection_string': 'ssh admin@%private_ip_address%'}
+    cli.connect_to_instance(cli_args={'target': instance['instance_id'], 'print_only': True}, app_config=app_config)
+    actual_result = capsys.readouterr().out
+    assert actual_result.startswith('ssh -o ControlMaster=auto') or os.name == 'nt'
+    assert actual_result.strip().endswith(f'admin@{instance["private_ip_address"]}')
+
+
+# pylint: disable=W0613
+def test_cli_connect_to_instance_several_instances(aws_ec2_instances, tmp_path):
+    """Test that connection is not started if several instances match the filter"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'ssh_connection_string': 'ssh %private_ip_address%'}
+    with pytest.raises(SystemExit):
+        cli.connect_to_instance(cli_args={'target': 'webserver01', 'print_only': True}, app_config=app_config)
+
+
+# pylint: disable=W0613
+@pytest.mark.skipif(os.name == 'nt', reason='Shell script stub is not supported on Windows')
+def test_cli_run_on_instances_stub_ssh(aws_ec2_instances, tmp_path, monkeypatch, capsys):
+    """Test that command is run on each found instance using stub SSH binary"""
+    (tmp_path / 'bin').mkdir()
+    stub_path = tmp_path / 'bin' / 'ssh'
+    stub_path.write_text('#!/bin/sh\necho "$@"\n', encoding='utf-8')
+    stub_path.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{tmp_path / "bin"}{os.pathsep}{os.environ.get("PATH", "")}')
+
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'filters': 'environment=production,department=finance',
+                  'ssh_connection_string': 'ssh admin@%private_ip_address%'}
+    cli.run_on_instances(cli_args={'remote_command': ['--', 'uptime', '-p']}, app_config=app_config)
+    actual_result = capsys.readouterr().out
+    assert actual_result.count('uptime -p') == 4 and '4 hosts: 4 succeeded, 0 failed' in actual_result
+    assert 'BatchMode=yes' in actual_result and '[webserver01/i-' in actual_result
+
+
+def test_cli_run_on_instances_empty_command():
+    """Test that empty command is not accepted"""
+    with pytest.raises(SystemExit):
+        cli.run_on_instances(cli_args={'remote_command': ['--']}, app_config={'default_cloud': 'aws'})
+
+
+# pylint: disable=W0613
+def test_cli_watch_instances(aws_ec2_instances):
+    """Test that the second refresh redraws only the changed lines (header with time)"""
+    output = io.StringIO()
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1',
+                  'filters': 'environment=production,department=finance'}
+    cli.watch_instances(app_config=app_config, interval=0.01, output=output, cycles=2)
+    actual_result = output.getvalue()
+    assert actual_result.startswith('\x1b[2J') and '4 servers, 0 changed' in actual_result
+    assert actual_result.count('i-') == 4
+
+
+@pytest.mark.parametrize('failed_key', ['us-east-1', 'all', 'us-east-1,eu-west-1'])
+def test_cli_watch_instances_failed_region(aws_ec2_instance_fake, monkeypatch, failed_key):
+    """Test that failed region doesn't stop watch, its servers are kept and the region is shown in the footer"""
+    fetches = []
+
+    def iter_failing_instances(statuses=None, **_):
+        fetches.append(1)
+        if len(fetches) > 1:
+            statuses[failed_key] = inventory.get_region_status(status='error', message='AWS API error')
+            return
+        yield aws_ec2_instance_fake
+
+    monkeypatch.setattr(cli, 'iter_cloud_instances', iter_failing_instances)
+    output = io.StringIO()
+    cli.watch_instances(app_config={'default_cloud': 'aws'}, interval=0.01, output=output, cycles=2)
+    actual_result = output.getvalue()
+    assert '1 servers, 0 changed' in actual_result and '0 servers' not in actual_result
+    assert f'{failed_key}: error (AWS API error)' in actual_result
+
+
+def test_cli_generate_watch_lines_highlight(aws_ec2_instance_fake):
+    """Test that changed state is highlighted"""
+    previous_snapshot = snapshot.build_snapshot([dict(aws_ec2_instance_fake, tags={})])
+    current_snapshot = snapshot.build_snapshot([dict(aws_ec2_instance_fake, instance_state='stopped', tags={})])
+    actual_result = cli.generate_watch_lines(app_config={'default_cloud': 'aws'}, current_snapshot=current_snapshot,
+                                             previous_snapshot=previous_snapshot, interval=5)
+    assert '1 servers, 1 changed' in actual_result[0]
+    assert any('\x1b[1;33mstopped\x1b[0m' in line for line in actual_result)
+
+
 def test_cli_enrich_instances_metadata_no_instances():
     """Test that instance metadata enrichment works if no instances"""
     expected_result = []
@@ -472,6 +800,33 @@ def test_cli_generate_table_one_instance_aws_region(aws_ec2_instance_fake):
     assert 'SSH Connection' in actual_result and 'us-east-1' in actual_result and 'i-123456' in actual_result
 
 
+def test_cli_generate_summary_group_by(aws_ec2_instance_fake):
+    """Test that summary table contains groups and counts"""
+    actual_result = cli.generate_summary(instances=[aws_ec2_instance_fake, aws_ec2_instance_fake],
+                                         group_by='region,environment')
+    assert 'us-east-1' in actual_result and 'production' in actual_result and '2' in actual_result
+
+
+def test_cli_generate_summary_no_instances():
+    """Test that summary generation works if no instances"""
+    actual_result = cli.generate_summary(instances=[], group_by='region')
+    assert actual_result == 'No servers found matching your filter'
+
+
+def test_cli_generate_summary_count_no_instances():
+    """Test that total number of instances is 0 (not a message) if no instances"""
+    assert cli.generate_summary(instances=[]) == '  count\n-------\n      0'
+
+
+# pylint: disable=W0613
+def test_cli_run_command_mode_count_no_matches(aws_ec2_instances, tmp_path, capsys):
+    """Test that --count prints 0 and doesn't exit if no cloud servers match the filter"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path),
+                  'filters': 'environment=nonexistent'}
+    assert cli.run_command_mode(cli_args={'count': True}, app_config=app_config)
+    assert capsys.readouterr().out == '\n  count\n-------\n      0\n\n'
+
+
 def test_cli_generate_table_one_instance_fake_cloud(aws_ec2_instance_fake):
     """Test that table generation works if one instance of another cloud"""
     instance = aws_ec2_instance_fake.copy()
@@ -480,3 +835,91 @@ def test_cli_generate_table_one_instance_fake_cloud(aws_ec2_instance_fake):
     actual_result = cli.generate_table(app_config={'default_cloud': 'fakecloud', 'ssh_connection_string_enabled': False,
                                                    'aws_ssm_connection_string_enabled': True}, instances=[instance])
     assert 'SSH Connection' not in actual_result and 'Native Cloud Connection' in actual_result
+
+
+# pylint: disable=W0613
+def test_cli_collect_metrics(aws_ec2_instances):
+    """Test that metrics are collected from one fetch and fetch errors are accounted instead of exiting"""
+    session = inventory.InventorySession(metrics=metrics.InventoryMetrics())
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'filters': 'environment=staging'}
+    actual_result = cli.collect_metrics(app_config=app_config, session=session)
+    assert 'sshcld_instances{region="us-east-1",state="running"} 16\n' in actual_result
+    assert actual_result.endswith('# EOF\n')
+
+    actual_result = cli.collect_metrics(app_config={'default_cloud': 'azure'}, session=session)
+    assert 'sshcld_fetch_errors_total{error="CloudNotSupportedError"} 1\n' in actual_result
+    assert 'sshcld_instances{region="us-east-1",state="running"} 16\n' in actual_result
+
+
+def test_cli_collect_metrics_failed_region(aws_ec2_instance_fake, monkeypatch):
+    """Test that servers of responded regions are counted and failed regions are exported as down"""
+    def get_instances(statuses=None, **_):
+        statuses['us-east-1'] = inventory.get_region_status(instances_count=1)
+        statuses['eu-west-3'] = inventory.get_region_status(status='error', message='AuthFailure')
+        return [aws_ec2_instance_fake]
+
+    monkeypatch.setattr(inventory, 'get_instances', get_instances)
+    session = inventory.InventorySession(metrics=metrics.InventoryMetrics())
+    statuses = {}
+    actual_result = cli.collect_metrics(app_config={}, session=session, statuses=statuses)
+    assert 'sshcld_region_up{region="eu-west-3"} 0\n' in actual_result
+    assert 'sshcld_region_up{region="us-east-1"} 1\n' in actual_result
+    assert 'sshcld_region_errors_total{region="eu-west-3",status="error"} 1\n' in actual_result
+    assert 'sshcld_instances{' in actual_result
+    assert 'sshcld_last_fetch_timestamp_seconds' not in actual_result
+    assert statuses['eu-west-3']['status'] == 'error'
+
+
+# pylint: disable=W0613
+@pytest.mark.skipif(os.name == 'nt', reason='File permissions are not supported on Windows')
+def test_cli_export_metrics_file(aws_ec2_instances, tmp_path):
+    """Test that metrics file is readable by other users (e.g. node_exporter)"""
+    metrics_path = tmp_path / 'sshcld.prom'
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path)}
+    previous_umask = os.umask(0o022)
+    try:
+        cli.export_metrics(cli_args={'metrics': str(metrics_path)}, app_config=app_config)
+    finally:
+        os.umask(previous_umask)
+    assert metrics_path.read_text(encoding='utf-8').endswith('# EOF\n')
+    assert os.stat(metrics_path).st_mode & 0o777 == 0o644
+
+
+def test_cli_enrich_instances_metadata_columns(aws_ec2_instance_fake, monkeypatch):
+    """Test that only selected columns are computed and kept in the specified order"""
+    rendered_strings = []
+    replace_variables = cli.replace_variables
+    monkeypatch.setattr(cli, 'replace_variables',
+                        lambda **kwargs: rendered_strings.append(kwargs['string']) or replace_variables(**kwargs))
+    app_config = cli.enrich_config(cli_args={'columns': 'environment, instance_name,ssh_string'},
+                                   yaml_config={'default_cloud': 'aws', 'ssh_connection_string': 'ssh %instance_id%',
+                                                'aws_ssm_connection_string': 'ssm %instance_id%',
+                                                'aws_ssm_connection_string_enabled': True,
+                                                'printable_tags': ['department']})
+    actual_result = cli.enrich_instances_metadata(instances=[aws_ec2_instance_fake], app_config=app_config)
+    assert actual_result == [{'environment': 'production', 'instance_name': 'nginx', 'ssh_string': 'ssh i-123456'}]
+    assert list(actual_result[0]) == ['environment', 'instance_name', 'ssh_string']
+    assert rendered_strings == ['ssh %instance_id%']
+
+    actual_result = cli.generate_table(app_config=app_config, instances=actual_result)
+    assert actual_result.splitlines()[0].split() == ['environment', 'Instance', 'Name', 'SSH', 'Connection']
+
+
+def test_cli_add_proxy_jumps_invalid(aws_ec2_instance_fake, capsys):
+    """Test that invalid jump host stops the command with the message instead of traceback"""
+    app_config = {'proxy_jump_hosts': [{'hosts': ['bastion:ssh']}]}
+    with pytest.raises(SystemExit):
+        cli.add_proxy_jumps(app_config=app_config, instances=[aws_ec2_instance_fake],
+                            templates=['ssh -J %proxy_jump% %private_ip_address%'])
+    assert 'bastion:ssh' in capsys.readouterr().out
+
+
+def test_cli_enrich_instances_metadata_proxy_jump(aws_ec2_instance_fake, listening_port, tmp_path):
+    """Test that %proxy_jump% is replaced and proxy_jump is not shown as a column"""
+    app_config = {'default_cloud': 'aws', 'cache_dir': str(tmp_path), 'probe_timeout': 1,
+                  'ssh_connection_string': 'ssh -o ProxyJump=%proxy_jump% %private_ip_address%',
+                  'ssh_connection_string_enabled': True,
+                  'proxy_jump_hosts': [{'region': 'us-east-1', 'hosts': [f'127.0.0.1:{listening_port}']}]}
+    actual_result = cli.enrich_instances_metadata(instances=[aws_ec2_instance_fake], app_config=app_config)
+    assert actual_result[0]['ssh_string'] == f'ssh -o ProxyJump=127.0.0.1:{listening_port} 10.0.0.1'
+    assert 'proxy_jump' not in actual_result[0]
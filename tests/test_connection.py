@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for connection.py file"""
+
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from sshcld import connection
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='ControlMaster is not supported on Windows')
+def test_connection_build_command_ssh(tmp_path):
+    """Test that connection reuse options are added to SSH command"""
+    actual_result = connection.build_command(connection_string='ssh -i "my key.pem" admin@10.0.0.1',
+                                             app_config={'cache_dir': str(tmp_path), 'ssh_control_persist': '5m'})
+    control_path = os.path.join(str(tmp_path), 'ssh', '%C')
+    assert actual_result == ['ssh', '-o', 'ControlMaster=auto', '-o', f'ControlPath={control_path}',
+                             '-o', 'ControlPersist=5m', '-i', 'my key.pem', 'admin@10.0.0.1']
+    assert stat.S_IMODE(os.stat(os.path.join(str(tmp_path), 'ssh')).st_mode) == 0o700
+
+
+def test_connection_build_command_control_master_disabled(tmp_path):
+    """Test that connection reuse options are not added if disabled"""
+    actual_result = connection.build_command(connection_string='ssh 10.0.0.1',
+                                             app_config={'cache_dir': str(tmp_path),
+                                                         'ssh_control_master_enabled': False})
+    assert actual_result == ['ssh', '10.0.0.1']
+
+
+def test_connection_build_command_not_ssh(tmp_path):
+    """Test that other commands are not changed"""
+    actual_result = connection.build_command(connection_string='aws ssm start-session --target i-123456',
+                                             app_config={'cache_dir': str(tmp_path)})
+    assert actual_result == ['aws', 'ssm', 'start-session', '--target', 'i-123456']
+
+
+def test_connection_build_command_empty():
+    """Test that empty connection string is handled correctly"""
+    assert connection.build_command(connection_string='') == []
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='Shell script stub is not supported on Windows')
+def test_connection_exec_command_stub_ssh(tmp_path):
+    """Test that connection command is executed using stub SSH binary"""
+    arguments_path = tmp_path / 'arguments.txt'
+    (tmp_path / 'bin').mkdir()
+    stub_path = tmp_path / 'bin' / 'ssh'
+    stub_path.write_text(f'#!/bin/sh\nprintf "%s\\n" "$@" > "{arguments_path}"\n', encoding='utf-8')
+    stub_path.chmod(0o755)
+
+    command = connection.build_command(connection_string='ssh admin@10.0.0.1', app_config={'cache_dir': str(tmp_path)})
+    environment = {**os.environ, 'PATH': f'{tmp_path / "bin"}{os.pathsep}{os.environ.get("PATH", "")}'}
+    subprocess.run([sys.executable, '-c', f'from sshcld import connection; connection.exec_command({command!r})'],
+                   env=environment, check=True)
+
+    assert arguments_path.read_text(encoding='utf-8').splitlines() == command[1:]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for executor.py file"""
+
+import io
+import sys
+
+from sshcld import executor
+
+
+def python_command(code=None):
+    """Command running Python code"""
+    return [sys.executable, '-c', code]
+
+
+def test_executor_run_commands_output():
+    """Test that output of each host is prefixed with its label"""
+    output = io.StringIO()
+    commands = [(f'host{index}', python_command(f'print("started"); print("line{index}")')) for index in range(5)]
+    actual_result = executor.run_commands(commands=commands, parallel=2, output=output)
+    assert [result['returncode'] for result in actual_result] == [0] * 5
+    assert '[host3] line3\n' in output.getvalue() and output.getvalue().count('started') == 5
+
+
+def test_executor_run_commands_failures():
+    """Test that failed commands, timeouts and missing binaries are reported"""
+    output = io.StringIO()
+    commands = [('ok', python_command('pass')), ('failed', python_command('import sys; sys.exit(3)')),
+                ('slow', python_command('import time; time.sleep(10)')),
+                ('missing', ['sshcld-binary-that-does-not-exist'])]
+    actual_result = executor.run_commands(commands=commands, timeout=1, output=output)
+    assert [executor.is_failed(result) for result in actual_result] == [False, True, True, True]
+    summary = executor.generate_summary(results=actual_result)
+    assert summary.startswith('4 hosts: 1 succeeded, 3 failed')
+    assert 'failed: exit code 3' in summary and 'slow: timeout after 1 seconds' in summary
+
+
+def test_executor_run_commands_empty():
+    """Test that running commands works without hosts"""
+    assert executor.run_commands(commands=[]) == []
+
+
+def test_executor_run_commands_repeated():
+    """Test that real subprocesses are run by repeated calls, each with its own event loop"""
+    for index in range(2):
+        actual_result = executor.run_commands(commands=[(f'host{index}', python_command('print("ok")'))],
+                                              output=io.StringIO())
+        assert actual_result[0]['returncode'] == 0 and actual_result[0]['error'] is None
+
+
+def test_executor_run_commands_long_line():
+    """Test that output line longer than stream buffer limit doesn't fail the run"""
+    output = io.StringIO()
+    commands = [('long', python_command('print("x" * 200000); print("end", end="")')),
+                ('short', python_command('print("ok")'))]
+    actual_result = executor.run_commands(commands=commands, output=output)
+    assert [result['returncode'] for result in actual_result] == [0, 0]
+    assert f'[long] {"x" * 200000}\n' in output.getvalue() and '[long] end\n' in output.getvalue()
+    assert '[short] ok\n' in output.getvalue()
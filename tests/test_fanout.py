@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for fanout.py file"""
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from sshcld import fanout
+
+
+def sleep_and_return(seconds=0.0, result=None):
+    """Task function for tests"""
+    time.sleep(seconds)
+    return result
+
+
+def fail_with(error=None):
+    """Task function for tests"""
+    raise error
+
+
+def test_fanout_run_tasks_order():
+    """Test that results are yielded in the order of tasks, even if later tasks are completed first"""
+    tasks = [('slow', lambda: sleep_and_return(0.2, 'slow')), ('fast', lambda: sleep_and_return(0, 'fast'))]
+    actual_result = [(key, result, error) for key, result, error, _ in fanout.run_tasks(tasks=tasks,
+                                                                                        options={'workers': 2})]
+    assert actual_result == [('slow', 'slow', None), ('fast', 'fast', None)]
+
+
+def test_fanout_run_tasks_errors():
+    """Test that expected errors are yielded and unexpected ones are raised"""
+    tasks = [('expected', lambda: fail_with(ValueError('bad value'))), ('ok', lambda: 'ok')]
+    actual_result = list(fanout.run_tasks(tasks=tasks, options={'workers': 2, 'errors': (ValueError,)}))
+    assert isinstance(actual_result[0][2], ValueError) and actual_result[1][1] == 'ok'
+
+    with pytest.raises(KeyError):
+        list(fanout.run_tasks(tasks=[('unexpected', lambda: fail_with(KeyError('key')))]))
+
+
+def test_fanout_run_tasks_deadline():
+    """Test that tasks not completed before the deadline get timeout error"""
+    tasks = [('fast', lambda: 'fast'), ('slow', lambda: sleep_and_return(1, 'slow'))]
+    started_at = time.monotonic()
+    actual_result = list(fanout.run_tasks(tasks=tasks, options={'workers': 2, 'deadline': 0.1}))
+    assert time.monotonic() - started_at < 0.8
+    assert actual_result[0][1] == 'fast'
+    assert isinstance(actual_result[1][2], fanout.TaskTimeout)
+
+
+def test_fanout_run_tasks_timeout_since_progress():
+    """Test that task timeout is measured since the last reported progress of the task"""
+    def task_with_progress():
+        for _ in range(8):
+            time.sleep(0.05)
+            fanout.report_progress()
+        return 'done'
+
+    tasks = [('progress', task_with_progress), ('silent', lambda: sleep_and_return(0.4, 'silent'))]
+    actual_result = list(fanout.run_tasks(tasks=tasks, options={'workers': 2, 'task_timeout': 0.2}))
+    assert actual_result[0][1] == 'done'
+    assert isinstance(actual_result[1][2], fanout.TaskTimeout)
+
+
+def test_fanout_run_tasks_hedged_attempt():
+    """Test that the second attempt of a slow task is started and its result is used"""
+    attempts = []
+
+    def task():
+        attempts.append(time.monotonic())
+        return sleep_and_return(1 if len(attempts) == 1 else 0, len(attempts))
+
+    started_at = time.monotonic()
+    actual_result = list(fanout.run_tasks(tasks=[('hedged', task)], options={'workers': 2, 'hedge_delay': 0.1}))
+    assert time.monotonic() - started_at < 0.8
+    assert actual_result[0][1] == 2 and actual_result[0][2] is None
+
+
+def test_fanout_run_tasks_deadline_process_exit():
+    """Test that abandoned attempts don't keep the process running after the deadline"""
+    script = ('import time\n'
+              'from sshcld import fanout\n'
+              'tasks = [("slow", lambda: time.sleep(5))]\n'
+              'print(list(fanout.run_tasks(tasks=tasks, options={"deadline": 0.2})))\n')
+    started_at = time.monotonic()
+    completed_process = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, check=True)
+    assert time.monotonic() - started_at < 3
+    assert b'TaskTimeout' in completed_process.stdout
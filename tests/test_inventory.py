@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for inventory.py file"""
+
+import os
+import types
+
+import pytest
+
+from sshcld import inventory
+from sshcld import metrics
+from sshcld.errors import CloudNotSupportedError, ConfigurationError
+
+
+def test_inventory_iter_instances_empty_config():
+    """Test that empty configuration raises exception instead of exit"""
+    with pytest.raises(ConfigurationError):
+        list(inventory.iter_instances(config={}))
+
+
+def test_inventory_iter_instances_unsupported_cloud():
+    """Test that unsupported cloud raises exception instead of exit"""
+    with pytest.raises(CloudNotSupportedError):
+        list(inventory.iter_instances(config={'default_cloud': 'azure'}))
+
+
+# pylint: disable=W0613
+def test_inventory_iter_instances_is_lazy(aws_ec2_instances):
+    """Test that instances are yielded one by one"""
+    instances = inventory.iter_instances(config={'default_cloud': 'aws', 'cloud_region': 'us-east-1'})
+    assert isinstance(instances, types.GeneratorType)
+    instance = next(instances)
+    assert instance['region'] == 'us-east-1' and instance['instance_id'].startswith('i-')
+    assert set(instance) == {'instance_id', 'instance_name', 'instance_state', 'region', 'private_ip_address',
+                             'public_ip_address', 'launch_time', 'tags'}
+
+
+# pylint: disable=W0613
+def test_inventory_iter_instances_filters_override(aws_ec2_instances):
+    """Test that filters argument overrides filters from configuration"""
+    config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'filters': 'environment=staging'}
+    assert len(inventory.get_instances(config=config)) == 16
+    assert len(inventory.get_instances(config=config, filters='environment=production,department=finance')) == 4
+
+
+# pylint: disable=W0613
+def test_inventory_session_reused(aws_ec2_instances):
+    """Test that cloud session is created once and reused between requests"""
+    session = inventory.InventorySession()
+    config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1'}
+    assert len(inventory.get_instances(config=config, session=session)) == 63
+    aws_session = session.get_aws_session()
+    assert len(inventory.get_instances(config=config, filters='Name=webserver01', session=session)) == 16
+    assert session.get_aws_session() is aws_session
+
+
+# pylint: disable=W0613
+def test_inventory_iter_instances_limit(aws_ec2_instances, tmp_path):
+    """Test that lookup stops after limit instances and regions with found instances are requested first"""
+    session = inventory.InventorySession()
+    config = {'default_cloud': 'aws', 'cloud_region': 'eu-west-1,us-east-1', 'cache_dir': str(tmp_path)}
+    instances = inventory.get_instances(config=config, filters='environment=staging', session=session, limit=3)
+    assert len(instances) == 3
+    region_hits = session.get_region_hits_cache(config=config)
+    assert region_hits.order_regions(regions=['eu-west-1', 'us-east-1']) == ['us-east-1', 'eu-west-1']
+    assert os.path.exists(os.path.join(tmp_path, 'region_hits.json'))
+
+
+# pylint: disable=W0613
+def test_inventory_iter_instances_limit_with_statuses(aws_ec2_instances, tmp_path):
+    """Test that limited lookup with statuses stops before requesting the remaining regions"""
+    session = inventory.InventorySession(metrics=metrics.InventoryMetrics())
+    config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1,eu-west-1,eu-central-1', 'cache_dir': str(tmp_path)}
+    statuses = {}
+    instances = inventory.get_instances(config=config, session=session, limit=1, statuses=statuses)
+    assert len(instances) == 1 and list(statuses) == ['us-east-1']
+    requested_regions = {dict(labels)['region'] for (name, labels) in session.metrics.samples
+                         if name == 'sshcld_api_calls' and dict(labels)['operation'] == 'describe_instances'}
+    assert requested_regions == {'us-east-1'}
+
+
+def test_inventory_get_regions_footer():
+    """Test that footer lists only failed regions"""
+    statuses = {'us-east-1': inventory.get_region_status(instances_count=3),
+                'eu-west-3': inventory.get_region_status(status='error', message='AuthFailure'),
+                'ap-east-1': inventory.get_region_status(status='timeout', message='timeout of 30 s exceeded')}
+    assert inventory.get_regions_footer(statuses=statuses) == (
+        'Not all regions responded (2 of 3 failed), cloud servers of other regions are shown:\n'
+        '  ap-east-1: timeout (timeout of 30 s exceeded)\n'
+        '  eu-west-3: error (AuthFailure)')
+    assert inventory.get_regions_footer(statuses={'us-east-1': statuses['us-east-1']}) == ''
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for ipindex.py file"""
+
+import time
+
+import pytest
+
+from sshcld import ipindex
+
+
+@pytest.fixture(name='instances_fake')
+def create_instances_fake():
+    """List of fake instances with private and public IP addresses"""
+    instances = [{'instance_id': f'i-{index}', 'private_ip_address': f'10.0.{index // 256}.{index % 256}',
+                  'public_ip_address': f'54.1.{index // 256}.{index % 256}' if index % 2 else None}
+                 for index in range(1000)]
+    instances.append({'instance_id': 'i-unknown', 'private_ip_address': 'unknown', 'public_ip_address': 'unknown'})
+    yield instances
+
+
+@pytest.mark.parametrize('address, expected_result', [
+    ('10.0.0.1', '10.0.0.1'),
+    ('10.0.1.0/24', '10.0.1.*'),
+    ('10.1.0.0/16', '10.1.*'),
+    ('10.0.0.0/25', None),
+    ('2001:db8::1', None),
+])
+def test_ipindex_get_wildcard_pattern(address, expected_result):
+    """Test that only exact addresses and octet-aligned networks are converted to EC2 filter values"""
+    assert ipindex.get_wildcard_pattern(ipindex.parse_networks(address)[0]) == expected_result
+
+
+def test_ipindex_parse_networks_invalid():
+    """Test that invalid addresses are not accepted"""
+    with pytest.raises(ValueError):
+        ipindex.parse_networks('10.0.0.1,test')
+
+
+def test_ipindex_build_ip_requests():
+    """Test that private and public addresses are requested separately with all patterns"""
+    actual_result = ipindex.build_ip_requests(ipindex.parse_networks('10.0.0.1,100.64.0.1,10.0.1.0/24'))
+    patterns = ['10.0.0.1', '100.64.0.1', '10.0.1.*']
+    assert actual_result == [[{'Name': 'private-ip-address', 'Values': patterns}],
+                             [{'Name': 'ip-address', 'Values': patterns}]]
+
+
+def test_ipindex_build_ip_requests_not_aligned():
+    """Test that all instances are requested if network can't be converted to EC2 filter"""
+    assert ipindex.build_ip_requests(ipindex.parse_networks('10.0.0.1,10.0.0.0/25')) == [[]]
+
+
+def test_ipindex_lookup_address(instances_fake):
+    """Test that instances are found by private and public addresses"""
+    index = ipindex.IpIndex(instances=instances_fake)
+    assert [instance['instance_id'] for instance in index.lookup(ipindex.parse_networks('10.0.1.2'))] == ['i-258']
+    assert [instance['instance_id'] for instance in index.lookup(ipindex.parse_networks('54.1.0.3'))] == ['i-3']
+    assert not index.lookup(ipindex.parse_networks('54.1.0.2'))
+
+
+def test_ipindex_lookup_networks(instances_fake):
+    """Test that instances are found by networks without duplicates"""
+    index = ipindex.IpIndex(instances=instances_fake)
+    actual_result = index.lookup(ipindex.parse_networks('10.0.0.0/25,54.1.0.0/24,10.0.0.1'))
+    assert len(actual_result) == 128 + 64
+
+
+def test_ipindex_instance_matches_networks(instances_fake):
+    """Test that instance is checked against list of networks"""
+    networks = ipindex.parse_networks('10.0.0.0/30')
+    assert ipindex.instance_matches_networks(instance=instances_fake[3], networks=networks)
+    assert not ipindex.instance_matches_networks(instance=instances_fake[4], networks=networks)
+    assert not ipindex.instance_matches_networks(instance=instances_fake[-1], networks=networks)
+
+
+def test_ipindex_find_cached_instances(instances_fake, tmp_path, monkeypatch):
+    """Test that saved indexes are searched until they are older than TTL and newer records win"""
+    app_config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path)}
+    assert not ipindex.find_cached_instances(app_config=app_config, addresses='10.0.0.3')
+    ipindex.save_cached_index(app_config=app_config, snapshot_path='old.json.gz', instances=instances_fake)
+    changed_instance = dict(instances_fake[3], instance_state='stopped')
+    ipindex.save_cached_index(app_config=app_config, snapshot_path='new.json.gz', instances=[changed_instance])
+
+    assert ipindex.find_cached_instances(app_config=app_config, addresses='10.0.0.3') == [changed_instance]
+    assert not ipindex.find_cached_instances(app_config={**app_config, 'ip_cache_ttl': 0}, addresses='10.0.0.3')
+    saved_at = time.time()
+    monkeypatch.setattr(ipindex.time, 'time', lambda: saved_at + ipindex.DEFAULT_IP_CACHE_TTL)
+    assert not ipindex.find_cached_instances(app_config=app_config, addresses='10.0.0.3')
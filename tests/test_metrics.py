@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for metrics.py file"""
+
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from sshcld import inventory
+from sshcld import metrics
+
+
+def test_metrics_render_openmetrics_format():
+    """Test that counters get _total suffix, labels are escaped and output ends with EOF marker"""
+    inventory_metrics = metrics.InventoryMetrics()
+    inventory_metrics.inc(name='sshcld_fetch_errors', labels={'error': 'AwsApiError'})
+    inventory_metrics.inc(name='sshcld_fetch_errors', labels={'error': 'AwsApiError'})
+    inventory_metrics.set(name='sshcld_instances_by_tag', labels={'tag': 'team', 'value': 'a "b"'}, value=3)
+    actual_result = inventory_metrics.render()
+    assert actual_result == ('# TYPE sshcld_instances_by_tag gauge\n'
+                             '# HELP sshcld_instances_by_tag Number of cloud servers by printable tag value\n'
+                             'sshcld_instances_by_tag{tag="team",value="a \\"b\\""} 3\n'
+                             '# TYPE sshcld_fetch_errors counter\n'
+                             '# HELP sshcld_fetch_errors Number of failed inventory fetches\n'
+                             'sshcld_fetch_errors_total{error="AwsApiError"} 2\n'
+                             '# EOF\n')
+
+
+def test_metrics_observe_instances():
+    """Test that instance counts are grouped by region, state and printable tags"""
+    instance = {'instance_id': 'i-1234567890', 'region': 'us-east-1', 'instance_state': 'running'}
+    inventory_metrics = metrics.InventoryMetrics()
+    inventory_metrics.set(name='sshcld_instances', labels={'region': 'old', 'state': 'running'}, value=5)
+    instances = [dict(instance, tags={'environment': 'production'}),
+                 dict(instance, tags={'environment': 'production'}),
+                 dict(instance, instance_state='stopped', tags={'environment': 'staging'})]
+    inventory_metrics.observe_instances(instances=instances, printable_tags=['environment', 'department'])
+    actual_result = inventory_metrics.render()
+    assert 'sshcld_instances{region="us-east-1",state="running"} 2\n' in actual_result
+    assert 'sshcld_instances{region="us-east-1",state="stopped"} 1\n' in actual_result
+    assert 'region="old"' not in actual_result
+    assert 'sshcld_instances_by_tag{tag="environment",value="production"} 2\n' in actual_result
+    assert 'department' not in actual_result
+
+
+def test_metrics_observe_statuses():
+    """Test that region up gauges describe the last fetch and region errors are accumulated"""
+    inventory_metrics = metrics.InventoryMetrics()
+    inventory_metrics.observe_statuses(statuses={
+        'us-east-1': inventory.get_region_status(instances_count=3),
+        'eu-west-3': inventory.get_region_status(status='error', message='AuthFailure')})
+    inventory_metrics.observe_statuses(statuses={
+        'eu-west-3': inventory.get_region_status(status='timeout', message='timeout of 30 s exceeded')})
+    actual_result = inventory_metrics.render()
+    assert 'sshcld_region_up{region="us-east-1"}' not in actual_result
+    assert 'sshcld_region_up{region="eu-west-3"} 0\n' in actual_result
+    assert 'sshcld_region_errors_total{region="eu-west-3",status="error"} 1\n' in actual_result
+    assert 'sshcld_region_errors_total{region="eu-west-3",status="timeout"} 1\n' in actual_result
+
+
+def test_metrics_refresh_thread(capsys):
+    """Test that refresh errors are logged and refreshing continues"""
+    refreshed = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('throttled')
+        refreshed.set()
+
+    thread = metrics.start_refresh_thread(refresh=refresh, interval=0.01)
+    assert refreshed.wait(timeout=5)
+    assert thread.daemon
+    assert 'previous metrics are served' in capsys.readouterr().err
+
+
+# pylint: disable=W0613
+def test_metrics_session_counts_api_calls(aws_ec2_instances):
+    """Test that pages and API calls are accounted during the regular inventory fetch"""
+    inventory_metrics = metrics.InventoryMetrics()
+    session = inventory.InventorySession(metrics=inventory_metrics)
+    instances = inventory.get_instances(config={'default_cloud': 'aws', 'cloud_region': 'us-east-1'},
+                                        session=session)
+    assert len(instances) == 63
+    assert inventory_metrics.get_total(name='sshcld_pages') == 1
+    assert inventory_metrics.get_total(name='sshcld_api_calls') == 1
+    assert inventory_metrics.get_total(name='sshcld_region_fetch_seconds') > 0
+    assert 'sshcld_api_calls_total{operation="describe_instances",region="us-east-1"} 1\n' in \
+        inventory_metrics.render()
+
+
+def test_metrics_server():
+    """Test that metrics are served on /metrics and other paths return 404"""
+    server = metrics.create_metrics_server(port=0, collect=lambda: '# EOF\n')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_port}'
+        with urllib.request.urlopen(f'{url}/metrics', timeout=5) as response:
+            assert response.read() == b'# EOF\n'
+            assert response.headers['Content-Type'].startswith('application/openmetrics-text')
+        with pytest.raises(urllib.error.HTTPError) as error:
+            with urllib.request.urlopen(f'{url}/other', timeout=5):
+                pass
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
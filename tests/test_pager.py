@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for pager.py file"""
+
+import pytest
+
+from sshcld import pager
+
+
+@pytest.fixture(name='table_pager')
+def create_table_pager():
+    """Pager with a big list of fake instances"""
+    instances = [{'instance_id': f'i-{index:06d}', 'instance_name': f'webserver{index:05d}',
+                  'private_ip_address': f'10.0.{index // 256}.{index % 256}', 'public_ip_address': None,
+                  'environment': 'production' if index % 2 else 'staging'} for index in range(20000)]
+    headers = {'instance_id': 'Instance ID', 'instance_name': 'Instance Name', 'private_ip_address': 'Private IP',
+               'public_ip_address': 'Public IP'}
+    yield pager.TablePager(instances=instances, headers=headers)
+
+
+def test_pager_columns_include_tags(table_pager):
+    """Test that columns not defined in headers (tags) are shown too"""
+    assert table_pager.columns == ['instance_id', 'instance_name', 'private_ip_address', 'public_ip_address',
+                                   'environment']
+
+
+def test_pager_render_window_only(table_pager):
+    """Test that only visible rows are rendered"""
+    lines = table_pager.render(height=13)
+    assert len(lines) == 12
+    assert lines[0].startswith('Instance ID')
+    assert lines[2].startswith('i-000000')
+    assert lines[-1].startswith('i-000009')
+
+
+def test_pager_render_empty_values(table_pager):
+    """Test that empty values are rendered as empty strings"""
+    assert 'None' not in table_pager.render(height=5)[2]
+
+
+def test_pager_scroll_and_jump(table_pager):
+    """Test that window can be scrolled and moved to the specific row"""
+    table_pager.scroll(5, height=13)
+    assert table_pager.render(height=13)[2].startswith('i-000005')
+    table_pager.jump(100000, height=13)
+    assert table_pager.row_offset == 20000 - 10
+    table_pager.scroll(-100000, height=13)
+    assert table_pager.row_offset == 0
+
+
+def test_pager_toggle_column(table_pager):
+    """Test that columns can be hidden and shown again"""
+    table_pager.toggle_column(0)
+    assert table_pager.render(height=5)[0].startswith('Instance Name')
+    table_pager.toggle_column(0)
+    assert table_pager.render(height=5)[0].startswith('Instance ID')
+
+
+def test_pager_search(table_pager):
+    """Test that search finds next and previous rows"""
+    assert table_pager.search(term='WEBSERVER01234') == 1234
+    assert table_pager.search(term='staging') == 1236
+    assert table_pager.search(forward=False) == 1234
+    assert table_pager.search(term='does-not-exist') is None
+    assert table_pager.row_offset == 1234
+
+
+def test_pager_search_last_page(table_pager):
+    """Test that match on the last page doesn't scroll past the last row and next match is still found"""
+    assert table_pager.search(term='webserver1999', height=24) == 19990
+    assert table_pager.row_offset == 20000 - table_pager.page_size(24)
+    assert table_pager.search(height=24) == 19991
+    assert table_pager.row_offset == 20000 - table_pager.page_size(24)
+
+
+def test_pager_search_hidden_column(table_pager):
+    """Test that hidden columns are not searched"""
+    table_pager.toggle_column(1)
+    assert table_pager.search(term='webserver') is None
+
+
+def test_pager_no_instances():
+    """Test that pager works without instances"""
+    table_pager = pager.TablePager(instances=[], headers={'instance_id': 'Instance ID'})
+    assert table_pager.render(height=5) == ['Instance ID', '-----------']
+    assert table_pager.search(term='test') is None
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for probe.py file"""
+
+from sshcld import probe
+
+
+def test_probe_addresses_reachable(listening_port):
+    """Test that reachable address has latency"""
+    actual_result = probe.probe_addresses(addresses=['127.0.0.1'], port=listening_port, timeout=2)
+    assert actual_result['127.0.0.1'] is not None and actual_result['127.0.0.1'] < 2
+
+
+def test_probe_addresses_not_reachable(closed_port):
+    """Test that not reachable address has no latency"""
+    actual_result = probe.probe_addresses(addresses=['127.0.0.1'], port=closed_port, timeout=2)
+    assert actual_result == {'127.0.0.1': None}
+
+
+def test_probe_addresses_empty():
+    """Test that probing works without addresses"""
+    assert probe.probe_addresses(addresses=[]) == {}
+
+
+def test_probe_get_probe_address():
+    """Test that preferred address is used and public address is used as a fallback"""
+    instance = {'private_ip_address': '10.0.0.1', 'public_ip_address': '1.2.3.4'}
+    assert probe.get_probe_address(instance=instance) == '10.0.0.1'
+    assert probe.get_probe_address(instance=instance, address_field='public_ip_address') == '1.2.3.4'
+    assert probe.get_probe_address(instance={'private_ip_address': None, 'public_ip_address': '1.2.3.4'}) == '1.2.3.4'
+    assert probe.get_probe_address(instance={'private_ip_address': 'unknown'}) is None
+
+
+def test_probe_instances(listening_port):
+    """Test that reachable and latency columns are added to instances with concurrency limit"""
+    instances = [{'instance_id': f'i-{index}', 'private_ip_address': '127.0.0.1'} for index in range(20)]
+    instances.append({'instance_id': 'i-no-address', 'private_ip_address': None, 'public_ip_address': None})
+    actual_result = probe.probe_instances(instances=instances, app_config={'probe_port': listening_port,
+                                                                           'probe_concurrency': 5})
+    assert all(instance['reachable'] == 'yes' and instance['latency'].endswith(' ms')
+               for instance in actual_result[:-1])
+    assert actual_result[-1]['reachable'] == '' and actual_result[-1]['latency'] == ''
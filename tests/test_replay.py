@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for record/replay backend of AWS plugin"""
+
+import time
+
+import boto3
+import pytest
+
+from sshcld import inventory
+from sshcld.errors import AwsApiError
+from sshcld.plugins import aws
+from sshcld.plugins import replay
+
+
+@pytest.fixture(name='record_dir')
+def create_record_dir(aws_ec2_instances, tmp_path):  # pylint: disable=W0613
+    """Directory with recorded responses for us-east-1 region"""
+    session = replay.RecordingSession(session=boto3.Session(), directory=str(tmp_path))
+    aws.get_instances(region_name='us-east-1', session=session)
+    aws.get_instances(region_name='us-east-1', filters='environment=production', session=session)
+    instance_id = aws.get_instances(region_name='us-east-1', session=session)[0]['instance_id']
+    aws.get_instances(region_name='us-east-1', filters=f'FILTER_INSTANCE_ID={instance_id}', session=session)
+    session.client('ec2', region_name='us-east-1').describe_regions()
+    yield str(tmp_path)
+
+
+def test_replay_same_instances(record_dir):
+    """Test that replayed instances are the same as recorded ones"""
+    expected_result = aws.get_instances(region_name='us-east-1', filters='environment=production')
+    actual_result = aws.get_instances(region_name='us-east-1', filters='environment=production',
+                                      session=replay.ReplaySession(directory=record_dir))
+    assert actual_result == expected_result
+
+
+def test_replay_regions(record_dir):
+    """Test that recorded list of regions is replayed"""
+    session = replay.ReplaySession(directory=record_dir)
+    assert 'eu-central-1' in aws.get_regions(region_name='all', session=session)
+
+
+def test_replay_not_recorded_request(record_dir):
+    """Test that request which wasn't recorded fails"""
+    with pytest.raises(AwsApiError):
+        aws.get_instances(region_name='eu-west-3', session=replay.ReplaySession(directory=record_dir))
+
+
+def test_replay_latency(record_dir):
+    """Test that latency is injected for each call"""
+    session = replay.ReplaySession(directory=record_dir, options={'latency': 0.1, 'jitter': 0.01, 'seed': 1})
+    started_at = time.monotonic()
+    aws.get_instances(region_name='us-east-1', session=session)
+    assert time.monotonic() - started_at >= 0.09 and session.calls_count == 1
+
+
+def test_replay_throttling_retries(record_dir):
+    """Test that throttled calls are retried"""
+    session = replay.ReplaySession(directory=record_dir, options={'throttle_rate': 0.5, 'max_attempts': 50,
+                                                                  'backoff': 0, 'seed': 3})
+    for _ in range(5):
+        assert len(aws.get_instances(region_name='us-east-1', session=session)) == 63
+    assert session.calls_count > 5
+
+
+def test_replay_seeded_clients(record_dir):
+    """Test that seeded random values of each region don't depend on order of calls in other regions"""
+    def get_latencies(session=None, regions=None):
+        clients = {region: session.client('ec2', region_name=region) for region in regions}
+        return {region: [clients[region].get_latency() for _ in range(3)] for region in regions}
+
+    options = {'latency': 0.1, 'jitter': 0.05, 'seed': 7}
+    actual_result = get_latencies(session=replay.ReplaySession(directory=record_dir, options=options),
+                                  regions=['us-east-1', 'eu-west-3'])
+    assert actual_result == get_latencies(session=replay.ReplaySession(directory=record_dir, options=options),
+                                          regions=['eu-west-3', 'us-east-1'])
+    assert actual_result['us-east-1'] != actual_result['eu-west-3']
+
+
+def test_replay_throttling_failure(record_dir):
+    """Test that call fails if it is throttled too many times"""
+    session = replay.ReplaySession(directory=record_dir, options={'throttle_rate': 1, 'backoff': 0})
+    with pytest.raises(AwsApiError):
+        aws.get_instances(region_name='us-east-1', session=session)
+    assert session.calls_count == 3
+
+
+def test_replay_inventory_config(record_dir):
+    """Test that replay directory from configuration is used by inventory API"""
+    config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'aws_replay_dir': record_dir,
+              'aws_replay_options': {'latency': 0}}
+    session = inventory.InventorySession()
+    assert len(inventory.get_instances(config=config, session=session)) == 63
+    assert isinstance(session.get_aws_session(config=config), replay.ReplaySession)
+
+
+def test_replay_partial_results(record_dir):
+    """Test that failed region is recorded in statuses and instances of other regions are returned"""
+    statuses = {}
+    config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1,eu-west-3', 'aws_replay_dir': record_dir}
+    instances = inventory.get_instances(config=config, statuses=statuses)
+    assert len(instances) == 63
+    assert statuses['us-east-1']['status'] == 'ok' and statuses['us-east-1']['instances'] == 63
+    assert statuses['eu-west-3']['status'] == 'error'
+
+
+@pytest.mark.parametrize('limit', [5, None])
+def test_replay_partial_results_sequential(record_dir, tmp_path, limit):
+    """Test that limited lookups and lookups by ID skip failed region and request the next ones"""
+    config = {'default_cloud': 'aws', 'cloud_region': 'eu-west-3,us-east-1', 'aws_replay_dir': record_dir,
+              'cache_dir': str(tmp_path / 'cache')}
+    instance_id = aws.get_instances(region_name='us-east-1', session=replay.ReplaySession(directory=record_dir))[0][
+        'instance_id']
+    filters = 'environment=production' if limit else f'FILTER_INSTANCE_ID={instance_id}'
+    statuses = {}
+    instances = inventory.get_instances(config=config, filters=filters, limit=limit, statuses=statuses)
+    assert len(instances) == (limit or 1)
+    assert statuses['eu-west-3']['status'] == 'error' and statuses['us-east-1']['status'] == 'ok'
+
+
+def test_replay_region_timeout(record_dir):
+    """Test that slow region is abandoned after region timeout"""
+    statuses = {}
+    config = {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'aws_replay_dir': record_dir,
+              'aws_replay_options': {'latency': 1}, 'region_timeout': 0.1}
+    started_at = time.monotonic()
+    assert not inventory.get_instances(config=config, statuses=statuses)
+    assert time.monotonic() - started_at < 0.8
+    assert statuses['us-east-1']['status'] == 'timeout'
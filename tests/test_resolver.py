@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for resolver.py file"""
+
+import socket
+import struct
+import threading
+import types
+
+import pytest
+
+from sshcld import resolver
+from sshcld.errors import AwsApiError
+
+INSTANCES = [
+    {'instance_id': 'i-1', 'instance_name': 'web01', 'private_ip_address': '10.0.0.1'},
+    {'instance_id': 'i-2', 'instance_name': 'Web01', 'private_ip_address': '10.0.0.2'},
+    {'instance_id': 'i-3', 'instance_name': 'db01', 'private_ip_address': None},
+]
+
+
+def build_query(name=None, query_type=resolver.TYPE_A, query_id=0x1234):
+    """Build DNS query with recursion desired flag"""
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + resolver.encode_name(name=name) + \
+        struct.pack('!HH', query_type, resolver.CLASS_IN)
+
+
+def parse_response(data=None):
+    """Get response code and answer records data from DNS response"""
+    _, flags, _, answers_count = struct.unpack('!HHHH', data[:8])
+    _, _, _, _, _, offset = resolver.parse_query(data=data)
+    answers = []
+    for _ in range(answers_count):
+        data_length = struct.unpack('!H', data[offset + 10:offset + 12])[0]
+        answers.append(data[offset + 12:offset + 12 + data_length])
+        offset += 12 + data_length
+    return flags & 0x000F, answers
+
+
+def test_resolver_dns_index_resolve():
+    """Test that names are case-insensitive and several servers with the same name are all returned"""
+    index = resolver.DnsIndex(instances=INSTANCES)
+    assert index.resolve(name='web01.aws.internal') == (['10.0.0.1', '10.0.0.2'], 0)
+    assert index.resolve(name='i-2.aws.internal') == (['10.0.0.2'], 0)
+    assert index.resolve(name='1.0.0.10.in-addr.arpa', query_type=resolver.TYPE_PTR) == (['web01.aws.internal'], 0)
+    assert index.resolve(name='db01.aws.internal') == ([], resolver.RCODE_NAME_ERROR)
+    assert index.resolve(name='web01.aws.internal', query_type=28) == ([], 0)
+    assert index.resolve(name='example.com') == ([], resolver.RCODE_REFUSED)
+
+
+@pytest.mark.parametrize('data', [b'', b'\x12\x34', b'\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x05web'])
+def test_resolver_parse_query_malformed(data):
+    """Test that malformed queries are not parsed"""
+    with pytest.raises(ValueError):
+        resolver.parse_query(data=data)
+
+
+def test_resolver_build_response():
+    """Test that response contains question, flags and answers"""
+    index = resolver.DnsIndex(instances=INSTANCES)
+    response = resolver.build_response(data=build_query(name='WEB01.aws.internal.'), index=index)
+    assert response[:2] == b'\x12\x34' and struct.unpack('!H', response[2:4])[0] & 0x8500 == 0x8500
+    assert parse_response(data=response) == (0, [socket.inet_aton('10.0.0.1'), socket.inet_aton('10.0.0.2')])
+
+    response = resolver.build_response(data=build_query(name='missing.aws.internal'), index=index)
+    assert parse_response(data=response) == (resolver.RCODE_NAME_ERROR, [])
+
+
+def test_resolver_create_dns_server():
+    """Test that A and PTR queries are answered by local UDP server"""
+    server = resolver.create_dns_server(port=0, index=resolver.DnsIndex(instances=INSTANCES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client_socket:
+            client_socket.settimeout(5)
+            client_socket.sendto(build_query(name='i-1.aws.internal'), server.server_address)
+            assert parse_response(data=client_socket.recv(512)) == (0, [socket.inet_aton('10.0.0.1')])
+
+            server.index = resolver.DnsIndex(instances=INSTANCES[1:])
+            client_socket.sendto(build_query(name='2.0.0.10.in-addr.arpa', query_type=resolver.TYPE_PTR),
+                                 server.server_address)
+            assert parse_response(data=client_socket.recv(512)) == (0, [resolver.encode_name('web01.aws.internal')])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize('error', [AwsApiError('Throttling'), OSError('Permission denied')])
+def test_resolver_refresh_index_error(capsys, error):
+    """Test that refresh keeps previous index on any error"""
+    def build_index(previous_index):
+        raise error
+
+    server = types.SimpleNamespace(index='previous')
+    resolver.refresh_index(server=server, build_index=build_index)
+    assert server.index == 'previous' and 'DNS records cannot be refreshed' in capsys.readouterr().err
+
+    resolver.refresh_index(server=server, build_index=lambda previous_index: f'{previous_index}-refreshed')
+    assert server.index == 'previous-refreshed'
+
+
+@pytest.mark.parametrize('host, expected_result', [
+    ('Web 01', 'web-01.aws.internal'),
+    ('web_01.prod', 'web-01.prod.aws.internal'),
+    ('сервер', None),
+    ('a' * 70, None),
+    ('.'.join(['a' * 60] * 4), None),
+])
+def test_resolver_get_host_name(host, expected_result):
+    """Test that cloud server names are converted to valid host names or skipped"""
+    assert resolver.get_host_name(host=host) == expected_result
+
+
+def test_resolver_dns_index_invalid_names():
+    """Test that servers with names that can't be converted are resolved by ID only (including PTR)"""
+    index = resolver.DnsIndex(instances=[{'instance_id': 'i-4', 'instance_name': 'a' * 70,
+                                          'private_ip_address': '10.0.0.4'}])
+    assert list(index.addresses) == ['i-4.aws.internal']
+    assert index.resolve(name='4.0.0.10.in-addr.arpa', query_type=resolver.TYPE_PTR) == (['i-4.aws.internal'], 0)
+
+
+def test_resolver_dns_index_invalid_addresses():
+    """Test that cloud servers with address property which is not IPv4 address are skipped"""
+    index = resolver.DnsIndex(instances=INSTANCES + [
+        {'instance_id': 'i-4', 'instance_name': 'app01', 'private_ip_address': 'ip-10-0-0-4.ec2.internal'},
+        {'instance_id': 'i-5', 'instance_name': 'app02', 'private_ip_address': 'fd00::5'}])
+    assert index.resolve(name='web01.aws.internal') == (['10.0.0.1', '10.0.0.2'], 0)
+    assert index.resolve(name='app01.aws.internal') == ([], resolver.RCODE_NAME_ERROR)
+    assert index.resolve(name='app02.aws.internal') == ([], resolver.RCODE_NAME_ERROR)
+
+
+def test_resolver_build_response_truncated():
+    """Test that answers not fitting into UDP response are dropped and TC flag is set"""
+    instances = [{'instance_id': f'i-{index}', 'instance_name': 'web', 'private_ip_address': f'10.0.1.{index}'}
+                 for index in range(100)]
+    response = resolver.build_response(data=build_query(name='web.aws.internal'),
+                                       index=resolver.DnsIndex(instances=instances))
+    assert len(response) <= 512 and struct.unpack('!H', response[2:4])[0] & 0x0200
+    assert 0 < len(parse_response(data=response)[1]) < 100
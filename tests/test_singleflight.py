@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for singleflight.py file"""
+
+import concurrent.futures
+import os
+import time
+
+from sshcld import singleflight
+
+
+def get_app_config(tmp_path=None, **options):
+    """Configuration for tests"""
+    return {'default_cloud': 'aws', 'cloud_region': 'us-east-1', 'cache_dir': str(tmp_path), **options}
+
+
+def test_singleflight_acquire_lock(tmp_path):
+    """Test that lock can't be acquired twice and is released"""
+    lock_path = str(tmp_path / 'test.lock')
+    lock_file = singleflight.acquire_lock(path=lock_path)
+    assert lock_file is not None
+    assert singleflight.acquire_lock(path=lock_path) is None
+    singleflight.release_lock(lock_file=lock_file)
+    singleflight.release_lock(lock_file=singleflight.acquire_lock(path=lock_path))
+
+
+def test_singleflight_acquire_lock_closed(tmp_path):
+    """Test that lock is released when its file is closed without unlocking (e.g. the process crashed)"""
+    lock_path = str(tmp_path / 'test.lock')
+    singleflight.acquire_lock(path=lock_path).close()
+    assert os.path.exists(lock_path)
+    lock_file = singleflight.acquire_lock(path=lock_path)
+    assert lock_file is not None
+    singleflight.release_lock(lock_file=lock_file)
+
+
+def test_singleflight_run_single_flight_coalesced(tmp_path):
+    """Test that concurrent identical fetches are run once and all callers get the result"""
+    app_config = get_app_config(tmp_path=tmp_path)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.3)
+        return {'instances': [{'instance_id': 'i-1'}]}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as thread_pool:
+        futures = [thread_pool.submit(singleflight.run_single_flight, app_config=app_config, fetch=fetch)
+                   for _ in range(4)]
+        actual_results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert actual_results == [{'instances': [{'instance_id': 'i-1'}]}] * 4
+    lock_path, _ = singleflight.get_paths(app_config=app_config)
+    singleflight.release_lock(lock_file=singleflight.acquire_lock(path=lock_path))
+
+
+def test_singleflight_run_single_flight_sequential(tmp_path):
+    """Test that sequential fetches are not coalesced"""
+    app_config = get_app_config(tmp_path=tmp_path)
+    assert singleflight.run_single_flight(app_config=app_config, fetch=lambda: 1) == 1
+    assert singleflight.run_single_flight(app_config=app_config, fetch=lambda: 2) == 2
+
+
+def test_singleflight_run_single_flight_stale(tmp_path):
+    """Test that previous result is served while another process holds the lock"""
+    app_config = get_app_config(tmp_path=tmp_path, single_flight_stale_ttl=60)
+    lock_path, result_path = singleflight.get_paths(app_config=app_config)
+    singleflight.save_result(path=result_path, result='previous')
+    lock_file = singleflight.acquire_lock(path=lock_path)
+
+    assert singleflight.run_single_flight(app_config=app_config, fetch=lambda: 'new') == 'previous'
+    singleflight.release_lock(lock_file=lock_file)
+
+
+def test_singleflight_run_single_flight_wait_timeout(tmp_path):
+    """Test that process fetches inventory itself if the lock holder doesn't finish in time"""
+    app_config = get_app_config(tmp_path=tmp_path, single_flight_wait=0.3)
+    lock_path, _ = singleflight.get_paths(app_config=app_config)
+    lock_file = singleflight.acquire_lock(path=lock_path)
+
+    assert singleflight.run_single_flight(app_config=app_config, fetch=lambda: 'own') == 'own'
+    singleflight.release_lock(lock_file=lock_file)
+
+
+def test_singleflight_get_paths_result_options(tmp_path):
+    """Test that replayed and live fetches, and fetches with different time limits are not shared"""
+    app_config = get_app_config(tmp_path=tmp_path)
+    paths = singleflight.get_paths(app_config=app_config)
+    assert singleflight.get_paths(app_config=dict(app_config)) == paths
+    assert singleflight.get_paths(app_config={**app_config, 'aws_replay_dir': str(tmp_path)}) != paths
+    assert singleflight.get_paths(app_config={**app_config, 'fetch_deadline': 5}) != paths
+    assert singleflight.get_paths(app_config={**app_config, 'region_timeout': 5}) != paths
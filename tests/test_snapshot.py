@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for snapshot.py file"""
+
+import copy
+
+import pytest
+
+from sshcld import snapshot
+
+
+@pytest.fixture(name='instances_fake')
+def create_instances_fake():
+    """List of fake instances"""
+    instances = [{'instance_id': f'i-{index}', 'instance_name': f'webserver{index}', 'region': 'us-east-1',
+                  'instance_state': 'running', 'private_ip_address': f'10.0.0.{index}', 'public_ip_address': None,
+                  'launch_time': '2022-11-05T00:00:00+00:00', 'tags': {'environment': 'production'}}
+                 for index in range(5)]
+    yield instances
+
+
+def test_snapshot_record_hash_ignores_keys_order(instances_fake):
+    """Test that content hash doesn't depend on keys order"""
+    instance = instances_fake[0]
+    reordered_instance = dict(reversed(list(instance.items())))
+    assert snapshot.get_record_hash(instance) == snapshot.get_record_hash(reordered_instance)
+
+
+def test_snapshot_save_and_load(instances_fake, tmp_path):
+    """Test that saved snapshot is loaded without changes"""
+    snapshot_path = str(tmp_path / 'snapshot.json.gz')
+    current_snapshot = snapshot.build_snapshot(instances_fake)
+    snapshot.save_snapshot(path=snapshot_path, snapshot=current_snapshot)
+    assert snapshot.load_snapshot(path=snapshot_path) == current_snapshot
+
+
+def test_snapshot_load_non_existing(tmp_path):
+    """Test that non-existing or broken snapshot is handled correctly"""
+    assert snapshot.load_snapshot(path=str(tmp_path / 'does_not_exist.json.gz')) is None
+    broken_path = tmp_path / 'broken.json.gz'
+    broken_path.write_bytes(b'not a snapshot')
+    assert snapshot.load_snapshot(path=str(broken_path)) is None
+
+
+def test_snapshot_diff_no_changes(instances_fake):
+    """Test that identical snapshots have no changes"""
+    previous_snapshot = snapshot.build_snapshot(instances_fake)
+    current_snapshot = snapshot.build_snapshot(copy.deepcopy(instances_fake))
+    assert not snapshot.diff_snapshots(previous=previous_snapshot, current=current_snapshot)
+
+
+def test_snapshot_diff_changes(instances_fake):
+    """Test that added, removed and changed instances are found"""
+    previous_snapshot = snapshot.build_snapshot(instances_fake)
+    current_instances = copy.deepcopy(instances_fake[1:])
+    current_instances[0]['instance_state'] = 'stopped'
+    current_instances[1]['private_ip_address'] = '10.0.1.2'
+    current_instances[2]['tags']['environment'] = 'staging'
+    current_instances.append({**instances_fake[0], 'instance_id': 'i-new'})
+    changes = snapshot.diff_snapshots(previous=previous_snapshot, current=snapshot.build_snapshot(current_instances))
+    actual_result = {change['instance_id']: change['change'] for change in changes}
+    assert actual_result == {'i-1': 'changed: instance_state', 'i-2': 'changed: private_ip_address',
+                             'i-3': 'changed: tag_environment', 'i-new': 'added', 'i-0': 'removed'}
+
+
+def test_snapshot_diff_without_previous(instances_fake):
+    """Test that all instances are added if previous snapshot doesn't exist"""
+    changes = snapshot.diff_snapshots(previous=None, current=snapshot.build_snapshot(instances_fake))
+    assert [change['change'] for change in changes] == ['added'] * 5
+
+
+def test_snapshot_keep_failed_regions(instances_fake):
+    """Test that only instances of failed regions are copied from previous snapshot"""
+    previous_snapshot = snapshot.build_snapshot(instances_fake + [dict(instances_fake[0], instance_id='i-eu',
+                                                                       region='eu-west-1')])
+    statuses = {'us-east-1': {'status': 'ok'}, 'eu-west-1': {'status': 'error'}}
+    actual_result = snapshot.keep_failed_regions(previous=previous_snapshot, current={}, statuses=statuses)
+    assert list(actual_result) == ['i-eu']
+
+
+@pytest.mark.parametrize('failed_key', ['all', 'eu-west-1,us-east-1'])
+def test_snapshot_keep_failed_regions_not_single_region(instances_fake, failed_key):
+    """Test that all instances are kept if failure is not recorded for a single region"""
+    previous_snapshot = snapshot.build_snapshot(instances_fake)
+    statuses = {failed_key: {'status': 'error'}}
+    actual_result = snapshot.keep_failed_regions(previous=previous_snapshot, current={}, statuses=statuses)
+    assert actual_result == previous_snapshot
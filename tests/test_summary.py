@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for summary.py file"""
+
+import pytest
+
+from sshcld import summary
+
+
+@pytest.fixture(name='instances_fake')
+def create_instances_fake():
+    """List of fake instances from different regions"""
+    instances = []
+    for index in range(10):
+        instances.append({'instance_id': f'i-{index}', 'instance_name': f'webserver{index}',
+                          'region': 'us-east-1' if index % 3 else 'eu-west-1',
+                          'instance_state': 'running' if index % 2 else 'stopped',
+                          'launch_time': f'2022-11-{index + 10:02d}T00:00:00+00:00',
+                          'tags': {'environment': 'production' if index < 4 else 'staging'}})
+    yield instances
+
+
+def test_summary_parse_sort_key():
+    """Test that sort key parsing works for ascending and descending order"""
+    assert summary.parse_sort_key('launch_time') == ('launch_time', False)
+    assert summary.parse_sort_key('-launch_time') == ('launch_time', True)
+    assert summary.parse_sort_key('') == (None, False)
+
+
+def test_summary_select_instances_top_n(instances_fake):
+    """Test that top-N selection returns most recently launched instances"""
+    actual_result = summary.select_instances(instances=iter(instances_fake), sort_by='-launch_time', limit=3)
+    assert [instance['instance_id'] for instance in actual_result] == ['i-9', 'i-8', 'i-7']
+
+
+def test_summary_select_instances_sort_by_tag(instances_fake):
+    """Test that instances can be sorted by tag"""
+    actual_result = summary.select_instances(instances=instances_fake, sort_by='environment')
+    assert actual_result[0]['tags']['environment'] == 'production'
+    assert actual_result[-1]['tags']['environment'] == 'staging'
+    assert len(actual_result) == 10
+
+
+@pytest.mark.parametrize('sort_by, limit, expected_result', [
+    ('private_ip_address', None, ['i-9', 'i-10', 'i-none']),
+    ('-private_ip_address', None, ['i-10', 'i-9', 'i-none']),
+    ('private_ip_address', 2, ['i-9', 'i-10']),
+    ('-private_ip_address', 2, ['i-10', 'i-9']),
+])
+def test_summary_select_instances_sort_by_ip_address(sort_by, limit, expected_result):
+    """Test that IP addresses are sorted as addresses and instances without address go last"""
+    instances = [{'instance_id': 'i-none', 'private_ip_address': None},
+                 {'instance_id': 'i-10', 'private_ip_address': '10.0.0.10'},
+                 {'instance_id': 'i-9', 'private_ip_address': '10.0.0.9'}]
+    actual_result = summary.select_instances(instances=instances, sort_by=sort_by, limit=limit)
+    assert [instance['instance_id'] for instance in actual_result] == expected_result
+
+
+def test_summary_select_instances_limit_only(instances_fake):
+    """Test that limit without sorting keeps the original order"""
+    actual_result = summary.select_instances(instances=iter(instances_fake), limit=2)
+    assert [instance['instance_id'] for instance in actual_result] == ['i-0', 'i-1']
+
+
+def test_summary_group_instances(instances_fake):
+    """Test that instances are counted per group"""
+    actual_result = summary.group_instances(instances=iter(instances_fake), group_by='region,instance_state')
+    assert actual_result[0] == {'region': 'us-east-1', 'instance_state': 'running', 'count': 3}
+    assert sum(group['count'] for group in actual_result) == 10
+
+
+def test_summary_group_instances_by_tag(instances_fake):
+    """Test that instances are counted per tag value"""
+    actual_result = summary.group_instances(instances=instances_fake, group_by='environment')
+    assert actual_result == [{'environment': 'staging', 'count': 6}, {'environment': 'production', 'count': 4}]
+
+
+def test_summary_group_instances_count_only(instances_fake):
+    """Test that total number of instances is returned without groups"""
+    assert summary.group_instances(instances=instances_fake) == [{'count': 10}]
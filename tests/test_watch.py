@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for watch.py file"""
+
+from sshcld import watch
+
+
+def test_watch_render_updates_first_screen():
+    """Test that the first screen is drawn completely"""
+    actual_result = watch.render_updates(previous_lines=None, current_lines=['header', 'row1'])
+    assert actual_result == '\x1b[2J\x1b[Hheader\nrow1\n'
+
+
+def test_watch_render_updates_changed_lines_only():
+    """Test that only changed lines are redrawn"""
+    actual_result = watch.render_updates(previous_lines=['header', 'row1', 'row2'],
+                                         current_lines=['header', 'row1', 'row2 changed'])
+    assert actual_result == '\x1b[3;1H\x1b[2Krow2 changed\x1b[4;1H'
+
+
+def test_watch_render_updates_no_changes():
+    """Test that nothing is redrawn without changes"""
+    assert watch.render_updates(previous_lines=['header', 'row1'], current_lines=['header', 'row1']) == ''
+
+
+def test_watch_render_updates_removed_lines():
+    """Test that removed lines are cleared"""
+    actual_result = watch.render_updates(previous_lines=['header', 'row1', 'row2'], current_lines=['header'])
+    assert actual_result == '\x1b[2;1H\x1b[2K\x1b[3;1H\x1b[2K\x1b[2;1H'
+
+
+def test_watch_clip_lines():
+    """Test that lines are clipped to the terminal height with the hidden lines count"""
+    lines = [f'row{index}' for index in range(10)]
+    assert watch.clip_lines(lines=lines, height=11) == lines
+    assert watch.clip_lines(lines=lines, height=5) == ['row0', 'row1', 'row2',
+                                                       '... 7 more lines are hidden, enlarge the terminal']